@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Brand, Category, Product, Warehouse, 
-    Stock, Customer, Order, OrderItem, Payment
+    Stock, Customer, Order, OrderItem, Payment, ProductDailySales,
+    ProductStockSummary, StockMovement, OrderConfirmation
 )
 
 
@@ -43,7 +44,8 @@ class StockAdmin(admin.ModelAdmin):
     list_display = ['product', 'warehouse', 'qty', 'reserved', 'available_qty', 'updated_at']
     list_filter = ['warehouse', 'updated_at']
     search_fields = ['product__name', 'product__sku', 'warehouse__name']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'available_qty']
+    # Foto compactada del libro de movimientos: qty y reserved no se editan aquí
+    readonly_fields = ['id', 'created_at', 'updated_at', 'qty', 'reserved', 'available_qty']
     list_select_related = ['product', 'warehouse']
 
 
@@ -85,4 +87,47 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ['method', 'status', 'created_at']
     search_fields = ['order__customer__full_name']
     readonly_fields = ['id', 'created_at']
-    list_select_related = ['order'] 
\ No newline at end of file
+    list_select_related = ['order'] 
+
+@admin.register(ProductDailySales)
+class ProductDailySalesAdmin(admin.ModelAdmin):
+    list_display = ['product', 'day', 'quantity_sold', 'order_count', 'revenue']
+    list_filter = ['day']
+    search_fields = ['product__name', 'product__sku']
+    readonly_fields = ['id', 'created_at']
+    list_select_related = ['product']
+
+
+@admin.register(ProductStockSummary)
+class ProductStockSummaryAdmin(admin.ModelAdmin):
+    list_display = ['product', 'total_qty', 'total_reserved', 'warehouse_count', 'updated_at']
+    search_fields = ['product__name', 'product__sku']
+    readonly_fields = ['id', 'created_at', 'updated_at']
+    list_select_related = ['product']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'kind', 'product', 'warehouse', 'qty_delta', 'reserved_delta', 'compacted_at']
+    list_filter = ['kind', 'warehouse', 'created_at']
+    search_fields = ['product__name', 'product__sku', 'note']
+    readonly_fields = [field.name for field in StockMovement._meta.fields]
+    list_select_related = ['product', 'warehouse']
+    
+    # Libro append-only: los movimientos se registran por la API, que valida la posición
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderConfirmation)
+class OrderConfirmationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'status', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order__id']
+    readonly_fields = ['id', 'created_at', 'processed_at']
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
-    verbose_name = 'Sistema de Inventario' 
\ No newline at end of file
+    verbose_name = 'Sistema de Inventario'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,200 @@
+"""
+Vistas asíncronas de solo lectura para despliegues ASGI (/api/v1/async/)
+
+DRF solo ejecuta vistas síncronas, así que los caminos de lectura más usados
+(listado y detalle de productos, stock y órdenes, get_related y reportes)
+también se exponen como vistas async de Django sobre el ORM asíncrono
+(acount, aget, aiterator). Reutilizan los querysets, planes de get_related
+y serializers de los ViewSets, por lo que las respuestas tienen el mismo
+formato, y un cliente lento no ocupa un hilo del worker.
+"""
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import REPORT_CACHE_CONTROL, cached_report
+from .pagination import keyset_filter
+from .query_plans import parse_query_shape, plan_cache
+from .reports import REPORT_TABLES, build_report
+from .views import OrderViewSet, ProductViewSet, StockViewSet
+
+
+# ViewSets con versión async, con el mismo prefijo de URL que en el router
+RESOURCES = {
+    'products': ProductViewSet,
+    'stocks': StockViewSet,
+    'orders': OrderViewSet,
+}
+
+PAGE_SIZE = settings.REST_FRAMEWORK['PAGE_SIZE']
+MAX_PAGE_SIZE = 500
+GET_RELATED_DEFAULT_LIMIT = 100
+GET_RELATED_MAX_LIMIT = 1000
+ITERATOR_CHUNK_SIZE = 500
+
+
+class InvalidPage(Exception):
+    pass
+
+
+def _json(data, status=200):
+    return JsonResponse(data, encoder=JSONEncoder, safe=False, status=status)
+
+
+def _get_viewset(resource, request, action):
+    """Instancia del ViewSet sin despacharlo: aporta queryset, serializer y contexto"""
+    return RESOURCES[resource](request=Request(request), action=action, format_kwarg=None, kwargs={})
+
+
+async def _fetch(queryset):
+    # chunk_size permite que aiterator() aplique los prefetch_related del queryset
+    return [obj async for obj in queryset.aiterator(chunk_size=ITERATOR_CHUNK_SIZE)]
+
+
+async def _page_number_page(request, queryset, serialize):
+    """Misma forma que PageNumberPagination: count, next, previous y results"""
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        raise InvalidPage('Página inválida.')
+
+    count = await queryset.acount()
+    offset = (page - 1) * PAGE_SIZE
+    if page < 1 or (page > 1 and offset >= count):
+        raise InvalidPage('Página inválida.')
+
+    rows = await _fetch(queryset[offset:offset + PAGE_SIZE])
+    url = request.build_absolute_uri()
+    if page == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page - 1) if page > 1 else None
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + PAGE_SIZE < count else None,
+        'previous': previous_link,
+        'results': serialize(rows),
+    }
+
+
+async def _cursor_page(request, queryset, ordering, serialize):
+    """
+    Paginación por keyset hacia adelante sobre el ordering del paginador
+    por cursor del ViewSet. El cursor es propio de estas vistas: no se
+    puede intercambiar con el de la API síncrona.
+    """
+    try:
+        page_size = max(1, min(int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        page_size = PAGE_SIZE
+
+    queryset = queryset.order_by(*ordering)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        except (ValueError, TypeError, IndexError, ValidationError):
+            raise InvalidPage('Cursor inválido')
+
+    rows = await _fetch(queryset[:page_size + 1])
+    next_link = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        position = [getattr(rows[-1], field.lstrip('-')) for field in ordering]
+        token = base64.urlsafe_b64encode(json.dumps(position, default=str).encode()).decode()
+        next_link = replace_query_param(request.build_absolute_uri(), 'cursor', token)
+    return {'next': next_link, 'previous': None, 'results': serialize(rows)}
+
+
+@require_GET
+async def resource_list(request, resource):
+    """Listado paginado como el del ViewSet (por página o por cursor)"""
+    viewset = _get_viewset(resource, request, 'list')
+
+    serializer_class = viewset.get_serializer_class()
+    context = viewset.get_serializer_context()
+
+    def serialize(rows):
+        return serializer_class(rows, many=True, context=context).data
+
+    pagination_class = viewset.pagination_class
+    try:
+        if pagination_class and issubclass(pagination_class, CursorPagination):
+            data = await _cursor_page(request, viewset.get_queryset(), pagination_class.ordering, serialize)
+        else:
+            data = await _page_number_page(request, viewset.get_queryset(), serialize)
+    except InvalidPage as error:
+        return _json({'detail': str(error)}, status=404)
+    return _json(data)
+
+
+@require_GET
+async def resource_detail(request, resource, pk):
+    viewset = _get_viewset(resource, request, 'retrieve')
+
+    queryset = viewset.get_queryset()
+    try:
+        obj = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        return _json({'detail': 'No encontrado.'}, status=404)
+
+    serializer = viewset.get_serializer_class()(obj, context=viewset.get_serializer_context())
+    return _json(serializer.data)
+
+
+@require_GET
+async def get_related(request, resource):
+    """
+    get_related con los mismos parámetros que la versión síncrona, salvo que
+    siempre se limita: limit por defecto 100, máximo 1000
+    """
+    viewset = _get_viewset(resource, request, 'get_related')
+
+    try:
+        shape, filter_values = parse_query_shape(request.GET)
+        plan = plan_cache.get_plan(viewset.serializer_class.Meta.model, shape)
+        queryset = plan.apply(viewset.get_queryset(), filter_values)
+
+        limit = int(request.GET.get('limit') or GET_RELATED_DEFAULT_LIMIT)
+        queryset = queryset[:max(1, min(limit, GET_RELATED_MAX_LIMIT))]
+        sql_query = str(queryset.query)
+
+        rows = await _fetch(queryset)
+        serialized_data = viewset._serialize_related_data(rows, plan.fields)
+    except Exception as e:
+        return _json({'error': str(e)}, status=400)
+
+    return _json({
+        'count': len(serialized_data),
+        'results': serialized_data,
+        'sql_query': sql_query,
+    })
+
+
+@require_GET
+async def report(request, name):
+    """Reportes de /reports/ con el mismo caché por parámetros"""
+    if name not in REPORT_TABLES:
+        return _json({'detail': 'No encontrado.'}, status=404)
+
+    try:
+        params, compute = build_report(name, request.GET)
+    except ValueError as error:
+        return _json({'error': str(error)}, status=400)
+
+    # Las funciones SQL no tienen API async en Django: se ejecutan en el hilo del ORM
+    results, cache_status = await sync_to_async(cached_report)(name, params, REPORT_TABLES[name], compute)
+    response = _json({'count': len(results), 'results': results})
+    response['X-Cache'] = cache_status
+    response['Cache-Control'] = REPORT_CACHE_CONTROL
+    return response
@@ -0,0 +1,100 @@
+"""
+Utilidades comunes de los comandos de benchmark: estadísticas y comparación de resultados
+"""
+import statistics
+import subprocess
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values, percent):
+    """Percentil con interpolación lineal entre las muestras ordenadas"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = percent / 100 * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples):
+    """Resumen de una serie de tiempos en milisegundos"""
+    if not samples:
+        return {}
+    return {
+        'min': round(min(samples), 3),
+        'mean': round(statistics.mean(samples), 3),
+        'p50': round(percentile(samples, 50), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'p99': round(percentile(samples, 99), 3),
+        'max': round(max(samples), 3),
+        'stdev': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+@contextmanager
+def capture_queries():
+    """
+    Captura las consultas de todos los alias de base de datos: con réplica
+    configurada las lecturas de una petición no pasan por la conexión
+    default. La lista entregada se completa al salir del bloque.
+    """
+    captured = []
+    with ExitStack() as stack:
+        contexts = [
+            stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+        ]
+        yield captured
+    for context in contexts:
+        captured.extend(context.captured_queries)
+
+
+def git_revision():
+    """Commit actual del repositorio, o None si no está disponible"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare_results(baseline, current, metric='p95', threshold=0.2):
+    """
+    Compara dos resultados {nombre: {'latency_ms': {...}, 'queries': {...}}}.
+
+    Retorna una lista de regresiones: la latencia creció más que threshold
+    (fracción) o aumentó el número de consultas por petición.
+    """
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+
+        before = previous.get('latency_ms', {}).get(metric)
+        after = result.get('latency_ms', {}).get(metric)
+        if before and after and after > before * (1 + threshold):
+            regressions.append({
+                'name': name,
+                'metric': f'latency_ms.{metric}',
+                'baseline': before,
+                'current': after,
+                'change': round(after / before - 1, 3),
+            })
+
+        before = previous.get('queries', {}).get('max')
+        after = result.get('queries', {}).get('max')
+        if before is not None and after is not None and after > before:
+            regressions.append({
+                'name': name,
+                'metric': 'queries.max',
+                'baseline': before,
+                'current': after,
+                'change': after - before,
+            })
+    return regressions
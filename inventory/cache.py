@@ -0,0 +1,176 @@
+"""
+Caché de reportes con versiones por tabla y stale-while-revalidate
+
+Cada tabla tiene un contador de versión en el caché de Django que se
+incrementa al confirmar cualquier escritura sobre ella: vía señales para
+el ORM y con bump_tables() explícito en las rutas de SQL crudo (motor de
+reservas, importaciones, inserciones en bloque). Una entrada de reporte
+guarda las versiones de sus tablas al calcularse; si cambiaron o venció su
+frescura, se sirve la copia anterior mientras un hilo la recalcula.
+
+Las mismas versiones dan el ETag y Last-Modified de los endpoints de
+catálogo (ConditionalGetMixin en views.py), que responden 304 o el cuerpo
+cacheado sin consultar la base de datos.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from .db_routers import consistent_reads, mark_written
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'inventory:version:{}'
+MODIFIED_KEY = 'inventory:modified:{}'
+RESPONSE_KEY = 'inventory:response:{}'
+ENTRY_KEY = 'inventory:report:{}:{}'
+LOCK_KEY = 'inventory:report-lock:{}:{}'
+
+FRESH_SECONDS = getattr(settings, 'REPORT_CACHE_FRESH_SECONDS', 60)
+STALE_SECONDS = getattr(settings, 'REPORT_CACHE_STALE_SECONDS', 600)
+REFRESH_LOCK_SECONDS = 30
+REPORT_CACHE_CONTROL = f'max-age={FRESH_SECONDS}, stale-while-revalidate={STALE_SECONDS}'
+RESPONSE_SECONDS = getattr(settings, 'CONDITIONAL_GET_CACHE_SECONDS', 3600)
+
+# Backends cuyo contenido es propio de cada proceso
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Si todos los workers ven las mismas versiones (Redis, Memcached, base de datos, archivos)"""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+# Con un caché por proceso, un worker que no vio la escritura respondería 304
+# o el cuerpo cacheado con datos viejos: por defecto solo con caché compartido
+CONDITIONAL_GET_ENABLED = getattr(settings, 'CONDITIONAL_GET_ENABLED', None)
+if CONDITIONAL_GET_ENABLED is None:
+    CONDITIONAL_GET_ENABLED = cache_is_shared()
+
+
+def _new_version():
+    # Un contador perdido (reinicio, expulsión de LocMem) no puede volver a un
+    # valor ya usado: repetiría ETags y entradas emitidos para otros datos
+    return time.time_ns()
+
+
+def get_versions(tables):
+    """Versión actual de cada tabla (las que no existen arrancan en un valor nuevo)"""
+    keys = [VERSION_KEY.format(table) for table in tables]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    seed = None
+    if missing:
+        # add: si otro proceso la creó primero, gana su valor
+        seed = _new_version()
+        for key in missing:
+            cache.add(key, seed, timeout=None)
+        found.update(cache.get_many(missing))
+    return [found.get(key, seed) for key in keys]
+
+
+def get_last_modified(tables):
+    """Último momento (epoch) en que se escribió alguna de las tablas, o None si no se conoce"""
+    found = cache.get_many([MODIFIED_KEY.format(table) for table in tables])
+    return max(found.values()) if found else None
+
+
+def _bump(tables):
+    now = int(time.time())
+    for table in tables:
+        key = VERSION_KEY.format(table)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+    cache.set_many({MODIFIED_KEY.format(table): now for table in tables}, timeout=None)
+
+
+def bump_tables(*tables):
+    """Invalida los reportes que leen estas tablas, al confirmar la transacción actual"""
+    # Las rutas de SQL crudo llaman aquí: sus escrituras también fijan el primario
+    mark_written()
+    transaction.on_commit(lambda: _bump(tables))
+
+
+def normalize_params(params):
+    """Clave estable de los parámetros: sin vacíos y con las claves ordenadas"""
+    normalized = {key: value for key, value in params.items() if value not in (None, '')}
+    encoded = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def response_etag(*parts):
+    """ETag fuerte a partir de las versiones de tablas y lo que identifica la respuesta"""
+    encoded = json.dumps(parts, default=str)
+    return '"{}"'.format(hashlib.sha1(encoded.encode()).hexdigest())
+
+
+def get_cached_response(etag):
+    return cache.get(RESPONSE_KEY.format(etag.strip('"')))
+
+
+def store_response(etag, data):
+    # La clave incluye las versiones: una escritura deja la entrada huérfana hasta que expira
+    cache.set(RESPONSE_KEY.format(etag.strip('"')), data, timeout=RESPONSE_SECONDS)
+
+
+def _store(entry_key, data, versions):
+    now = time.time()
+    entry = {
+        'data': data,
+        'versions': versions,
+        'fresh_until': now + FRESH_SECONDS,
+    }
+    cache.set(entry_key, entry, timeout=FRESH_SECONDS + STALE_SECONDS)
+    return entry
+
+
+def _refresh_in_background(lock_key, entry_key, compute, tables):
+    def refresh():
+        try:
+            versions = get_versions(tables)
+            _store(entry_key, compute(), versions)
+        except Exception:
+            logger.exception('Error recalculando el reporte en caché %s', entry_key)
+        finally:
+            cache.delete(lock_key)
+            connections.close_all()
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def cached_report(name, params, tables, compute):
+    """
+    Resultado de compute() cacheado por nombre y parámetros normalizados.
+
+    Retorna (data, estado) donde estado es 'HIT' (fresco), 'STALE' (copia
+    anterior mientras se recalcula en segundo plano) o 'MISS' (calculado ahora).
+    """
+    params_key = normalize_params(params)
+    entry_key = ENTRY_KEY.format(name, params_key)
+    versions = get_versions(tables)
+    entry = cache.get(entry_key)
+
+    if entry is not None:
+        if entry['versions'] == versions and time.time() < entry['fresh_until']:
+            return entry['data'], 'HIT'
+
+        # Solo un proceso recalcula cada entrada; el resto sigue sirviendo la copia anterior
+        lock_key = LOCK_KEY.format(name, params_key)
+        if cache.add(lock_key, 1, timeout=REFRESH_LOCK_SECONDS):
+            _refresh_in_background(lock_key, entry_key, compute, tables)
+        return entry['data'], 'STALE'
+
+    with consistent_reads(get_last_modified(tables)):
+        data = compute()
+    return _store(entry_key, data, versions)['data'], 'MISS'
@@ -0,0 +1,21 @@
+from django.core.checks import Warning, register
+
+from .cache import CONDITIONAL_GET_ENABLED, cache_is_shared
+
+
+@register()
+def conditional_get_cache_check(app_configs, **kwargs):
+    """El GET condicional con un caché por proceso sirve datos viejos con varios workers"""
+    if CONDITIONAL_GET_ENABLED and not cache_is_shared():
+        return [
+            Warning(
+                'CONDITIONAL_GET_ENABLED está activo con un caché por proceso.',
+                hint=(
+                    'Cada worker lleva sus propias versiones por tabla: los que no vieron '
+                    'una escritura responden 304 o X-Cache: HIT con datos viejos. Configure '
+                    'REDIS_URL o desactive CONDITIONAL_GET_ENABLED si hay más de un proceso.'
+                ),
+                id='inventory.W001',
+            )
+        ]
+    return []
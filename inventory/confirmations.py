@@ -0,0 +1,145 @@
+"""
+Cola de confirmaciones de órdenes respaldada por la base de datos
+
+En modo asíncrono, POST /orders/{id}/confirm/ solo inserta una fila QUEUED
+en inventory_orderconfirmation y responde 202. El worker
+(process_order_confirmations) toma lotes con FOR UPDATE SKIP LOCKED, de modo
+que varios workers nunca procesan la misma solicitud, y confirma el lote
+completo en una transacción: agrupa la demanda por producto, acepta las
+órdenes en orden de llegada mientras alcance el disponible, las reserva con
+una sola sentencia (allocate_orders) y actualiza los estados en bloque. Si
+esa asignación conjunta falla se reintenta orden por orden y se rechazan las
+que no alcanzan, para que el lote no quede en cola indefinidamente.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import bump_tables
+from .ledger import get_available_by_product, lock_products
+from .models import Order, OrderConfirmation, OrderItem, Product
+from .reports import record_confirmed_sales
+from .reservations import (
+    InsufficientStockError,
+    OrderNotPendingError,
+    allocate_orders,
+    shortage_message,
+)
+
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def enqueue_confirmation(order):
+    """
+    Encola la confirmación de una orden pendiente; si ya está en cola
+    retorna la solicitud existente. Lanza OrderNotPendingError si la orden
+    ya no está pendiente.
+    """
+    while True:
+        if order.status != 'PENDING':
+            raise OrderNotPendingError('Solo se pueden confirmar órdenes pendientes')
+
+        try:
+            with transaction.atomic():
+                return OrderConfirmation.objects.create(order=order)
+        except IntegrityError:
+            # Otra petición la encoló primero (restricción unique_queued_order_confirmation)
+            pass
+        try:
+            return OrderConfirmation.objects.get(order=order, status='QUEUED')
+        except OrderConfirmation.DoesNotExist:
+            # Un worker la procesó entre el INSERT y la lectura: si la
+            # rechazó la orden sigue pendiente y se vuelve a encolar
+            order.refresh_from_db(fields=['status'])
+
+
+def process_confirmation_batch(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Procesa hasta batch_size solicitudes en cola en una transacción.
+    Retorna {'confirmed': n, 'rejected': n}; ambos en cero si la cola está
+    vacía (o el resto de solicitudes están tomadas por otros workers).
+    """
+    with transaction.atomic():
+        requests = list(
+            OrderConfirmation.objects.select_for_update(skip_locked=True)
+            .filter(status='QUEUED')
+            .order_by('created_at')[:batch_size]
+        )
+        if not requests:
+            return {'confirmed': 0, 'rejected': 0}
+
+        # Mismo bloqueo de orden que confirm_order: una orden no se confirma dos veces
+        pending = set(
+            Order.objects.select_for_update()
+            .filter(pk__in=[request.order_id for request in requests], status='PENDING')
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+        items = defaultdict(dict)
+        for order_id, product_id, qty in OrderItem.objects.filter(order_id__in=pending).values_list(
+            'order_id', 'product_id', 'qty'
+        ):
+            items[order_id][product_id] = qty
+
+        products = {product_id for order_items in items.values() for product_id in order_items}
+        lock_products(products)
+        available = get_available_by_product(products)
+        names = dict(Product.objects.filter(pk__in=products).values_list('id', 'name'))
+
+        # Órdenes en orden de llegada mientras el disponible alcance
+        accepted = []
+        errors = {}
+        for request in requests:
+            order_items = items.get(request.order_id, {})
+            if request.order_id not in pending:
+                errors[request.pk] = 'Solo se pueden confirmar órdenes pendientes'
+                continue
+            shortages = {
+                product_id: qty - available.get(product_id, 0)
+                for product_id, qty in order_items.items()
+                if qty > available.get(product_id, 0)
+            }
+            if shortages:
+                errors[request.pk] = shortage_message(shortages, names)
+                continue
+            for product_id, qty in order_items.items():
+                available[product_id] -= qty
+            accepted.append(request)
+
+        def demand_rows(order_ids):
+            return [
+                (order_id, product_id, qty)
+                for order_id in order_ids
+                for product_id, qty in items[order_id].items()
+            ]
+
+        try:
+            allocate_orders(demand_rows([request.order_id for request in accepted]))
+        except InsufficientStockError:
+            # El disponible por producto no garantiza el reparto entre bodegas:
+            # cada orden se asigna en su propio savepoint, en orden de llegada
+            for request in list(accepted):
+                try:
+                    allocate_orders(demand_rows([request.order_id]))
+                except InsufficientStockError as error:
+                    errors[request.pk] = str(error)
+                    accepted.remove(request)
+
+        accepted_orders = [request.order_id for request in accepted]
+        if accepted_orders:
+            Order.objects.filter(pk__in=accepted_orders).update(status='CONFIRMED')
+            record_confirmed_sales(accepted_orders)
+            # update() no emite señales
+            bump_tables('inventory_order')
+
+        now = timezone.now()
+        for request in requests:
+            request.status = 'REJECTED' if request.pk in errors else 'CONFIRMED'
+            request.error = errors.get(request.pk, '')
+            request.processed_at = now
+        OrderConfirmation.objects.bulk_update(requests, ['status', 'error', 'processed_at'])
+
+    return {'confirmed': len(accepted), 'rejected': len(errors)}
@@ -0,0 +1,339 @@
+"""
+Generación determinística de datasets sintéticos a distintas escalas
+
+Todas las filas se derivan de la semilla y del índice de la entidad, por lo
+que cualquier rango de órdenes o productos puede generarse de forma
+independiente (y en paralelo) produciendo siempre los mismos datos.
+Las filas son tuplas en el orden de columnas de TABLE_COLUMNS.
+
+load_dataset inserta con bulk_create (cualquier motor); copy_dataset reparte
+la generación en un pool de procesos y carga con COPY de PostgreSQL.
+"""
+import csv
+import io
+import os
+import random
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection
+
+from .cache import bump_tables
+
+
+# Cantidad de items de orden por preset de escala
+SCALE_PRESETS = {
+    'small': 10_000,
+    'medium': 1_000_000,
+    'large': 10_000_000,
+}
+
+ID_NAMESPACE = uuid.UUID('6f1c2f9e-7d55-4c1e-9a3b-2b6a4f0d8e11')
+
+# Tablas en orden de carga (respetando dependencias)
+TABLE_COLUMNS = {
+    'inventory_brand': ('id', 'created_at', 'name', 'is_active'),
+    'inventory_category': ('id', 'created_at', 'name', 'is_active'),
+    'inventory_product': (
+        'id', 'created_at', 'name', 'sku', 'price', 'is_active', 'brand_id', 'category_id'
+    ),
+    'inventory_warehouse': ('id', 'created_at', 'name', 'city'),
+    'inventory_stock': (
+        'id', 'created_at', 'qty', 'reserved', 'updated_at', 'product_id', 'warehouse_id'
+    ),
+    'inventory_customer': ('id', 'created_at', 'full_name', 'email'),
+    'inventory_order': (
+        'id', 'created_at', 'status', 'total_amount', 'total_items', 'customer_id'
+    ),
+    'inventory_orderitem': (
+        'id', 'created_at', 'qty', 'unit_price', 'order_id', 'product_id'
+    ),
+    'inventory_payment': (
+        'id', 'created_at', 'method', 'amount', 'status', 'order_id'
+    ),
+}
+
+CITIES = ['Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Cartagena', 'Bucaramanga', 'Pereira']
+ORDER_STATUSES = ['CONFIRMED'] * 6 + ['PENDING'] * 3 + ['CANCELED']
+PAYMENT_METHODS = ['CARD', 'TRANSFER', 'COD']
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class DatasetSpec:
+    """Cantidades de cada entidad derivadas del número objetivo de items de orden"""
+
+    def __init__(self, order_items, seed=42):
+        self.seed = seed
+        self.order_items = order_items
+        self.orders = max(1, order_items // 3)
+        self.customers = max(10, self.orders // 10)
+        self.products = max(20, min(order_items // 200, 200_000))
+        self.brands = 20
+        self.categories = 10
+        self.warehouses = max(4, min(50, order_items // 100_000))
+        self.items_per_order = 5
+
+    def as_dict(self):
+        return {
+            'seed': self.seed,
+            'order_items': self.order_items,
+            'orders': self.orders,
+            'customers': self.customers,
+            'products': self.products,
+            'brands': self.brands,
+            'categories': self.categories,
+            'warehouses': self.warehouses,
+            'stock': self.products * self.warehouses,
+        }
+
+    def make_id(self, table, index):
+        """UUID determinístico por tabla, semilla e índice"""
+        base = uuid.uuid5(ID_NAMESPACE, f'{table}:{self.seed}').int >> 48 << 48
+        return uuid.UUID(int=base + index)
+
+    def rng(self, *key):
+        return random.Random(f'{self.seed}:' + ':'.join(str(part) for part in key))
+
+    def product_price(self, index):
+        return Decimal((index * 7919) % 200_000 + 1_000) / 100
+
+    def timestamp(self, rng):
+        return EPOCH + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+
+def generate_catalog(spec):
+    """Filas de marcas, categorías, bodegas y clientes: {tabla: [filas]}"""
+    rng = spec.rng('catalog')
+    return {
+        'inventory_brand': [
+            (spec.make_id('brand', i), spec.timestamp(rng), f'Marca {i:03d}', True)
+            for i in range(spec.brands)
+        ],
+        'inventory_category': [
+            (spec.make_id('category', i), spec.timestamp(rng), f'Categoría {i:03d}', True)
+            for i in range(spec.categories)
+        ],
+        'inventory_warehouse': [
+            (spec.make_id('warehouse', i), spec.timestamp(rng), f'Bodega {i:03d}', CITIES[i % len(CITIES)])
+            for i in range(spec.warehouses)
+        ],
+        'inventory_customer': [
+            (spec.make_id('customer', i), spec.timestamp(rng), f'Cliente {i}', f'cliente{i}@example.com')
+            for i in range(spec.customers)
+        ],
+    }
+
+
+def generate_products(spec, start, end):
+    """Productos [start, end) con su stock en cada bodega: {tabla: [filas]}"""
+    products = []
+    stocks = []
+    for i in range(start, end):
+        rng = spec.rng('product', i)
+        product_id = spec.make_id('product', i)
+        created_at = spec.timestamp(rng)
+        products.append((
+            product_id, created_at, f'Producto {i}', f'SKU-{spec.seed}-{i:08d}',
+            spec.product_price(i), rng.random() > 0.05,
+            spec.make_id('brand', i % spec.brands),
+            spec.make_id('category', rng.randrange(spec.categories)),
+        ))
+        for w in range(spec.warehouses):
+            qty = rng.randrange(0, 500)
+            reserved = rng.randrange(0, qty // 4 + 1)
+            stocks.append((
+                spec.make_id('stock', i * spec.warehouses + w), created_at, qty, reserved,
+                created_at, product_id, spec.make_id('warehouse', w),
+            ))
+    return {'inventory_product': products, 'inventory_stock': stocks}
+
+
+def generate_orders(spec, start, end):
+    """Órdenes [start, end) con sus items y pagos: {tabla: [filas]}"""
+    orders = []
+    items = []
+    payments = []
+    for i in range(start, end):
+        rng = spec.rng('order', i)
+        order_id = spec.make_id('order', i)
+        created_at = spec.timestamp(rng)
+        status = rng.choice(ORDER_STATUSES)
+
+        count = rng.randint(1, spec.items_per_order)
+        total_amount = Decimal('0.00')
+        total_items = 0
+        for n, product_index in enumerate(rng.sample(range(spec.products), min(count, spec.products))):
+            qty = rng.randint(1, 5)
+            unit_price = spec.product_price(product_index)
+            items.append((
+                spec.make_id('orderitem', i * spec.items_per_order + n), created_at, qty,
+                unit_price, order_id, spec.make_id('product', product_index),
+            ))
+            total_amount += qty * unit_price
+            total_items += qty
+
+        orders.append((
+            order_id, created_at, status, total_amount, total_items,
+            spec.make_id('customer', rng.randrange(spec.customers)),
+        ))
+        if status == 'CONFIRMED':
+            payments.append((
+                spec.make_id('payment', i), created_at + timedelta(minutes=rng.randint(1, 600)),
+                rng.choice(PAYMENT_METHODS), total_amount, 'CONFIRMED', order_id,
+            ))
+    return {
+        'inventory_order': orders,
+        'inventory_orderitem': items,
+        'inventory_payment': payments,
+    }
+
+
+def iter_ranges(total, chunk_size):
+    """Rangos [start, end) de tamaño chunk_size que cubren total"""
+    for start in range(0, total, chunk_size):
+        yield start, min(start + chunk_size, total)
+
+
+def has_inventory_data():
+    """
+    True si alguna tabla del dataset tiene filas: los ids determinísticos
+    chocarían con los existentes, así que solo se carga sobre tablas vacías
+    """
+    exists = ' OR '.join(f'EXISTS (SELECT 1 FROM {table})' for table in TABLE_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {exists}')
+        return bool(cursor.fetchone()[0])
+
+
+def truncate_inventory():
+    """Vacía todas las tablas del inventario con TRUNCATE (sin recorrer cascadas en Python)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(reversed(TABLE_COLUMNS))} RESTART IDENTITY CASCADE")
+    bump_tables(*TABLE_COLUMNS, 'inventory_productdailysales', 'inventory_stockmovement')
+
+
+def bulk_insert_rows(table_rows, batch_size=5000):
+    """Inserta filas de datagen con bulk_create, tabla por tabla en orden de dependencias"""
+    from django.apps import apps
+
+    models = {model._meta.db_table: model for model in apps.get_app_config('inventory').get_models()}
+    for table in TABLE_COLUMNS:
+        rows = table_rows.get(table)
+        if not rows:
+            continue
+        model = models[table]
+        columns = TABLE_COLUMNS[table]
+        model.objects.bulk_create(
+            (model(**dict(zip(columns, row))) for row in rows),
+            batch_size=batch_size
+        )
+
+
+def rows_to_csv(rows):
+    """Serializa filas de datagen en CSV para COPY (None = NULL, booleanos t/f)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow(
+            ('t' if value else 'f') if isinstance(value, bool)
+            else '' if value is None
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for value in row
+        )
+    return buffer.getvalue()
+
+
+def copy_csv(cursor, table, data, columns=None):
+    """Carga CSV en la tabla con COPY FROM STDIN (por defecto con las columnas de TABLE_COLUMNS)"""
+    columns = columns or TABLE_COLUMNS[table]
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    if hasattr(cursor, 'copy_expert'):
+        # psycopg2
+        cursor.copy_expert(sql, io.StringIO(data))
+    else:
+        # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(data)
+
+
+def _generate_chunk(kind, order_items, seed, start, end):
+    """Tarea del pool: genera un bloque y lo retorna como {tabla: CSV}"""
+    spec = DatasetSpec(order_items, seed=seed)
+    generate = generate_products if kind == 'products' else generate_orders
+    return kind, end - start, {
+        table: rows_to_csv(rows) for table, rows in generate(spec, start, end).items()
+    }
+
+
+def _bounded_map(executor, tasks, max_pending):
+    """Envía tareas al pool manteniendo a lo sumo max_pending resultados en memoria"""
+    tasks = iter(tasks)
+    pending = set()
+    while True:
+        for task in tasks:
+            pending.add(executor.submit(_generate_chunk, *task))
+            if len(pending) >= max_pending:
+                break
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def copy_dataset(spec, workers=None, product_chunk=5_000, order_chunk=20_000, progress=None):
+    """
+    Genera el dataset en paralelo y lo carga con COPY (solo PostgreSQL).
+
+    Cada bloque se confirma por separado para no acumular millones de
+    verificaciones de llaves foráneas diferidas en una sola transacción;
+    los productos se cargan completos antes que las órdenes que los usan.
+    """
+    workers = workers or os.cpu_count() or 1
+    with connection.cursor() as cursor:
+        cursor.execute('SET synchronous_commit TO off')
+        try:
+            for table, rows in generate_catalog(spec).items():
+                copy_csv(cursor, table, rows_to_csv(rows))
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for kind, total, chunk_size in (
+                    ('products', spec.products, product_chunk),
+                    ('orders', spec.orders, order_chunk),
+                ):
+                    tasks = (
+                        (kind, spec.order_items, spec.seed, start, end)
+                        for start, end in iter_ranges(total, chunk_size)
+                    )
+                    done = 0
+                    for _, count, chunk in _bounded_map(executor, tasks, workers * 2):
+                        for table in TABLE_COLUMNS:
+                            if table in chunk:
+                                copy_csv(cursor, table, chunk[table])
+                        done += count
+                        if progress:
+                            progress(kind, done, total)
+
+            cursor.execute(f"ANALYZE {', '.join(TABLE_COLUMNS)}")
+        finally:
+            cursor.execute('RESET synchronous_commit')
+    bump_tables(*TABLE_COLUMNS)
+
+
+def load_dataset(spec, chunk_size=10_000, progress=None):
+    """Carga el dataset completo con bulk_create, por bloques de productos y órdenes"""
+    bulk_insert_rows(generate_catalog(spec))
+
+    for start, end in iter_ranges(spec.products, chunk_size):
+        bulk_insert_rows(generate_products(spec, start, end))
+        if progress:
+            progress('products', end, spec.products)
+
+    for start, end in iter_ranges(spec.orders, chunk_size):
+        bulk_insert_rows(generate_orders(spec, start, end))
+        if progress:
+            progress('orders', end, spec.orders)
+    bump_tables(*TABLE_COLUMNS)
@@ -0,0 +1,154 @@
+"""
+Enrutamiento de lecturas a una réplica de PostgreSQL
+
+ReplicaRoutingMiddleware decide por petición: las lecturas seguras (GET,
+HEAD, OPTIONS) van a la réplica configurada en REPLICA_DATABASE_ALIAS y el
+resto (creaciones, confirmaciones, importaciones) al primario. Una escritura
+fija el resto de la petición al primario, y la respuesta exitosa a una
+escritura o a cualquier petición no segura deja una cookie que mantiene en
+el primario las lecturas del mismo cliente durante REPLICA_STICKY_SECONDS,
+mientras la réplica se pone al día.
+
+Fuera de una petición (comandos, hilos en segundo plano) todo va al primario.
+"""
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+REPLICA_ALIAS = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+STICKY_COOKIE = 'inventory_read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """Decisión de enrutamiento de una petición"""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        # Se marca en db_for_write; el objeto se comparte con el hilo del ORM async
+        self.wrote = False
+
+
+_state = ContextVar('inventory_db_routing', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def read_alias():
+    """Alias para las lecturas del contexto actual"""
+    state = _state.get()
+    if state is not None and state.use_replica and not state.wrote and replica_configured():
+        return REPLICA_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+def mark_written():
+    """
+    Registra una escritura hecha fuera del ORM (cursor crudo, COPY) en la
+    petición actual, como lo hace db_for_write con las del ORM
+    """
+    state = _state.get()
+    if state is not None:
+        state.wrote = True
+
+
+@contextmanager
+def route_reads(use_replica):
+    state = RoutingState(use_replica)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def consistent_reads(last_modified):
+    """
+    Lee del primario si las tablas se escribieron (last_modified, epoch) hace
+    menos de REPLICA_STICKY_SECONDS. Lo usan las respuestas que se cachean
+    por versión de tabla, para no guardar datos de la réplica aún atrasados
+    bajo la versión nueva.
+    """
+    if (
+        read_alias() == REPLICA_ALIAS
+        and last_modified is not None
+        and time.time() - last_modified < STICKY_SECONDS
+    ):
+        return route_reads(False)
+    return nullcontext()
+
+
+class PrimaryReplicaRouter:
+    """Lecturas a la réplica según la petición actual; escrituras y migraciones al primario"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        mark_written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db != REPLICA_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Fija el enrutamiento de lecturas de cada petición y la cookie de read-your-writes"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _use_replica(self, request):
+        return request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with route_reads(self._use_replica(request)) as state:
+            response = self.get_response(request)
+        return self._finish(request, state, response)
+
+    async def __acall__(self, request):
+        with route_reads(self._use_replica(request)) as state:
+            response = await self.get_response(request)
+        return self._finish(request, state, response)
+
+    def _finish(self, request, state, response):
+        if response.streaming and not response.is_async:
+            # El contenido se consulta al iterarlo, fuera de esta llamada
+            response.streaming_content = self._stream(state, response.streaming_content)
+
+        # Toda petición no segura puede haber escrito sin pasar por el router
+        # (COPY de importaciones, UPDATE crudos): también fija la cookie
+        wrote = state.wrote or request.method not in SAFE_METHODS
+        if wrote and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def _stream(self, state, content):
+        token = _state.set(state)
+        try:
+            yield from content
+        finally:
+            _state.reset(token)
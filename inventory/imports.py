@@ -0,0 +1,392 @@
+"""
+Importación masiva de productos y stock desde CSV o NDJSON
+
+El archivo se recorre en streaming y se copia por bloques (COPY) a una tabla
+temporal de staging con todas las columnas como texto, de modo que ninguna
+línea inválida aborta la carga. La validación se hace por conjuntos con
+UPDATE ... SET error = ... y las filas válidas se fusionan con
+INSERT ... ON CONFLICT (productos) o se registran como ajustes en el libro de
+movimientos (existencias). El resultado incluye el error de cada línea rechazada.
+"""
+import codecs
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+
+from .cache import bump_tables
+from .datagen import copy_csv
+
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_MAX_ERRORS = 1_000
+
+TRUE_VALUES = "('true', 't', '1', 'yes', 'si', 'sí')"
+BOOLEAN_VALUES = "('true', 't', '1', 'yes', 'si', 'sí', 'false', 'f', '0', 'no')"
+PRICE_RE = r"'^[0-9]{1,8}(\.[0-9]{1,2})?$'"
+QTY_RE = r"'^[0-9]{1,9}$'"
+
+INVALID_ENCODING_ERROR = 'Codificación inválida: se esperaba UTF-8'
+NUL_ERROR = 'La línea contiene caracteres NUL'
+
+# Una bodega se identifica por su id o por su nombre
+WAREHOUSE_MATCH = "(w.name = s.warehouse OR w.id::text = s.warehouse)"
+
+# Posición actual (foto + movimientos pendientes) del producto p en la bodega w
+STOCK_POSITION = """
+    SELECT COALESCE(SUM(qty), 0) AS qty, COALESCE(SUM(reserved), 0) AS reserved, COUNT(*) > 0 AS known
+    FROM (
+        SELECT st.qty, st.reserved FROM inventory_stock st
+        WHERE st.product_id = p.id AND st.warehouse_id = w.id
+        UNION ALL
+        SELECT m.qty_delta, m.reserved_delta FROM inventory_stockmovement m
+        WHERE m.product_id = p.id AND m.warehouse_id = w.id AND m.compacted_at IS NULL
+    ) position
+"""
+
+
+class CatalogImport:
+    """Definición de una importación: columnas de staging, reglas y sentencia de fusión"""
+
+    def __init__(self, name, target_table, columns, rules, unique_key, merge_sql, resolve_sql=None,
+                 lock_sql=None):
+        self.name = name
+        self.target_table = target_table
+        self.columns = columns
+        # (condición sobre la fila s, expresión SQL del mensaje); gana la primera que falla
+        self.rules = rules
+        self.unique_key = unique_key
+        self.merge_sql = merge_sql
+        # Normalización de las filas válidas antes de buscar claves duplicadas
+        self.resolve_sql = resolve_sql
+        # Locks que se toman antes de validar contra los datos actuales
+        self.lock_sql = lock_sql
+
+    @property
+    def staging_table(self):
+        return f'import_{self.name}'
+
+
+PRODUCT_IMPORT = CatalogImport(
+    name='products',
+    target_table='inventory_product',
+    columns=('sku', 'name', 'price', 'brand', 'category', 'is_active'),
+    rules=(
+        (
+            "s.sku IS NULL OR s.name IS NULL OR s.price IS NULL OR s.brand IS NULL OR s.category IS NULL",
+            "'Faltan campos obligatorios (sku, name, price, brand, category)'",
+        ),
+        ("length(s.sku) > 50", "'El SKU supera 50 caracteres'"),
+        ("length(s.name) > 200", "'El nombre supera 200 caracteres'"),
+        (
+            f"CASE WHEN s.price ~ {PRICE_RE} THEN s.price::numeric <= 0 ELSE true END",
+            "'Precio inválido: ' || s.price",
+        ),
+        (
+            f"s.is_active IS NOT NULL AND lower(s.is_active) NOT IN {BOOLEAN_VALUES}",
+            "'Valor de is_active inválido: ' || s.is_active",
+        ),
+        (
+            "NOT EXISTS (SELECT 1 FROM inventory_brand b WHERE b.name = s.brand)",
+            "'Marca inexistente: ' || s.brand",
+        ),
+        (
+            "NOT EXISTS (SELECT 1 FROM inventory_category c WHERE c.name = s.category)",
+            "'Categoría inexistente: ' || s.category",
+        ),
+    ),
+    unique_key=('sku',),
+    merge_sql=f"""
+        INSERT INTO inventory_product (id, created_at, sku, name, price, is_active, brand_id, category_id)
+        SELECT gen_random_uuid(), now(), s.sku, s.name, s.price::numeric,
+               s.is_active IS NULL OR lower(s.is_active) IN {TRUE_VALUES}, b.id, c.id
+        FROM import_products s
+        JOIN inventory_brand b ON b.name = s.brand
+        JOIN inventory_category c ON c.name = s.category
+        WHERE s.error IS NULL
+        ON CONFLICT (sku) DO UPDATE SET
+            name = EXCLUDED.name,
+            price = EXCLUDED.price,
+            is_active = EXCLUDED.is_active,
+            brand_id = EXCLUDED.brand_id,
+            category_id = EXCLUDED.category_id
+        RETURNING (xmax = 0) AS inserted
+    """,
+)
+
+# El feed del ERP solo trae existencias; reserved lo administra la aplicación.
+# Cada línea se registra como un movimiento ADJUSTMENT por la diferencia con
+# la posición actual, bajo el lock de sus productos (ver ledger.py).
+STOCK_IMPORT = CatalogImport(
+    name='stock',
+    target_table='inventory_stockmovement',
+    columns=('sku', 'warehouse', 'qty'),
+    rules=(
+        (
+            "s.sku IS NULL OR s.warehouse IS NULL OR s.qty IS NULL",
+            "'Faltan campos obligatorios (sku, warehouse, qty)'",
+        ),
+        (f"s.qty !~ {QTY_RE}", "'Cantidad inválida: ' || s.qty"),
+        (
+            "NOT EXISTS (SELECT 1 FROM inventory_product p WHERE p.sku = s.sku)",
+            "'Producto inexistente: ' || s.sku",
+        ),
+        (
+            f"(SELECT count(*) FROM inventory_warehouse w WHERE {WAREHOUSE_MATCH}) = 0",
+            "'Bodega inexistente: ' || s.warehouse",
+        ),
+        (
+            f"(SELECT count(*) FROM inventory_warehouse w WHERE {WAREHOUSE_MATCH}) > 1",
+            "'Nombre de bodega ambiguo, use el id: ' || s.warehouse",
+        ),
+        (
+            f"""EXISTS (
+                SELECT 1 FROM inventory_product p
+                JOIN inventory_warehouse w ON {WAREHOUSE_MATCH}
+                CROSS JOIN LATERAL ({STOCK_POSITION}) pos
+                WHERE p.sku = s.sku
+                  AND pos.reserved > CASE WHEN s.qty ~ {QTY_RE} THEN s.qty::integer END
+            )""",
+            "'La cantidad es menor que lo ya reservado: ' || s.qty",
+        ),
+    ),
+    unique_key=('sku', 'warehouse'),
+    lock_sql="""
+        SELECT pg_advisory_xact_lock(hashtextextended(p.id::text, 0))
+        FROM (
+            SELECT DISTINCT p.id FROM import_stock s
+            JOIN inventory_product p ON p.sku = s.sku
+            ORDER BY p.id
+        ) p
+    """,
+    resolve_sql=f"""
+        UPDATE import_stock s SET warehouse = w.id::text
+        FROM inventory_warehouse w
+        WHERE s.error IS NULL AND {WAREHOUSE_MATCH}
+    """,
+    # Las líneas sin cambios en posiciones existentes no generan movimiento.
+    # RETURNING ve el estado previo a la sentencia: la posición es nueva si
+    # no tenía foto ni movimientos pendientes.
+    merge_sql=f"""
+        INSERT INTO inventory_stockmovement AS moved
+            (id, created_at, kind, qty_delta, reserved_delta, note, product_id, warehouse_id)
+        SELECT
+            gen_random_uuid(), now(), 'ADJUSTMENT', s.qty::integer - pos.qty, 0,
+            'Importación de existencias', p.id, w.id
+        FROM import_stock s
+        JOIN inventory_product p ON p.sku = s.sku
+        JOIN inventory_warehouse w ON w.id::text = s.warehouse
+        CROSS JOIN LATERAL ({STOCK_POSITION}) pos
+        WHERE s.error IS NULL
+          AND (s.qty::integer <> pos.qty OR NOT pos.known)
+        RETURNING (
+            NOT EXISTS (
+                SELECT 1 FROM inventory_stock st
+                WHERE st.product_id = moved.product_id AND st.warehouse_id = moved.warehouse_id
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM inventory_stockmovement m
+                WHERE m.product_id = moved.product_id AND m.warehouse_id = moved.warehouse_id
+                  AND m.compacted_at IS NULL
+            )
+        ) AS inserted
+    """,
+)
+
+IMPORTS = {
+    PRODUCT_IMPORT.name: PRODUCT_IMPORT,
+    STOCK_IMPORT.name: STOCK_IMPORT,
+}
+
+
+def get_import_format(filename, requested=None):
+    """Formato explícito, o inferido de la extensión del archivo"""
+    if requested:
+        return requested.lower()
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    value = str(value).strip()
+    return value or None
+
+
+def _decode_lines(stream, line_errors):
+    """
+    Decodifica el archivo línea por línea como UTF-8 estricto. Las líneas
+    que no lo son (p. ej. una exportación Latin-1) se anotan en line_errors
+    y siguen con caracteres de reemplazo para no detener la lectura.
+    """
+    for line_number, line in enumerate(stream, 1):
+        if isinstance(line, str):
+            yield line
+            continue
+        if line_number == 1 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            line_errors[line_number] = INVALID_ENCODING_ERROR
+            yield line.decode('utf-8', errors='replace')
+
+
+def iter_records(stream, file_format):
+    """Recorre el archivo produciendo (línea, dict o None, error de parseo o None)"""
+    line_errors = {}
+    lines = _decode_lines(stream, line_errors)
+
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        # Leer la cabecera para que line_num apunte a su última línea
+        reader.fieldnames
+        previous = reader.line_num
+        while True:
+            try:
+                record = next(reader)
+                error = None
+            except StopIteration:
+                return
+            except csv.Error as e:
+                record, error = None, f'CSV inválido: {e}'
+            # Un registro puede ocupar varias líneas físicas (campos entre comillas)
+            encoding_errors = [
+                line_errors.pop(number) for number in range(previous + 1, reader.line_num + 1)
+                if number in line_errors
+            ]
+            previous = reader.line_num
+            yield reader.line_num, record, error or next(iter(encoding_errors), None)
+        return
+
+    for line_number, line in enumerate(lines, 1):
+        if line_number in line_errors:
+            yield line_number, None, line_errors.pop(line_number)
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'JSON inválido'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Se esperaba un objeto JSON'
+            continue
+        yield line_number, record, None
+
+
+def _stage(cursor, spec, records, batch_size):
+    """Copia los registros a la tabla de staging por bloques; retorna el total de líneas"""
+    columns = ('line', *spec.columns, 'error')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    total = pending = 0
+
+    for line_number, record, error in records:
+        record = record or {}
+        values = [_normalize(record.get(column)) for column in spec.columns]
+        if any(value and '\x00' in value for value in values):
+            # PostgreSQL no admite NUL en columnas de texto: abortaría el COPY
+            values = [value and value.replace('\x00', '') for value in values]
+            error = error or NUL_ERROR
+        writer.writerow([line_number, *values, error])
+        total += 1
+        pending += 1
+        if pending >= batch_size:
+            copy_csv(cursor, spec.staging_table, buffer.getvalue(), columns)
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        copy_csv(cursor, spec.staging_table, buffer.getvalue(), columns)
+    return total
+
+
+def _validate(cursor, spec):
+    """Marca el primer error de cada fila con una sentencia por regla"""
+    for condition, message in spec.rules:
+        cursor.execute(f"""
+            UPDATE {spec.staging_table} s SET error = {message}
+            WHERE s.error IS NULL AND ({condition})
+        """)
+
+    if spec.resolve_sql:
+        cursor.execute(spec.resolve_sql)
+
+    # Claves repetidas dentro del archivo: se conserva la primera aparición
+    key = ', '.join(spec.unique_key)
+    cursor.execute(f"""
+        UPDATE {spec.staging_table} s
+        SET error = 'Registro duplicado en el archivo (primera aparición en la línea ' || d.first_line || ')'
+        FROM (
+            SELECT line, min(line) OVER (PARTITION BY {key}) AS first_line
+            FROM {spec.staging_table}
+            WHERE error IS NULL
+        ) d
+        WHERE s.line = d.line AND d.line <> d.first_line
+    """)
+
+
+def import_catalog(kind, stream, file_format='csv', batch_size=DEFAULT_BATCH_SIZE,
+                   max_errors=DEFAULT_MAX_ERRORS):
+    """
+    Importa productos ('products') o existencias ('stock') desde un archivo.
+
+    Retorna {'total', 'inserted', 'updated', 'error_count', 'errors'} donde
+    errors lista hasta max_errors filas rechazadas (None = todas) con su línea y motivo.
+    """
+    spec = IMPORTS[kind]
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f'Formato no soportado: {file_format}')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TEMP TABLE {spec.staging_table} (
+                line integer PRIMARY KEY,
+                {', '.join(f'{column} text' for column in spec.columns)},
+                error text
+            ) ON COMMIT DROP
+        """)
+        total = _stage(cursor, spec, iter_records(stream, file_format), batch_size)
+        cursor.execute(f'ANALYZE {spec.staging_table}')
+
+        if spec.lock_sql:
+            cursor.execute(spec.lock_sql)
+        _validate(cursor, spec)
+
+        cursor.execute(f"""
+            WITH merged AS ({spec.merge_sql})
+            SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+            FROM merged
+        """)
+        inserted, updated = cursor.fetchone()
+        if inserted or updated:
+            bump_tables(spec.target_table)
+
+        cursor.execute(f'SELECT count(*) FROM {spec.staging_table} WHERE error IS NOT NULL')
+        error_count = cursor.fetchone()[0]
+        cursor.execute(
+            f"""
+            SELECT line, sku, error FROM {spec.staging_table}
+            WHERE error IS NOT NULL ORDER BY line LIMIT %s
+            """,
+            [max_errors]
+        )
+        errors = [
+            {'line': line, 'sku': sku, 'error': error}
+            for line, sku, error in cursor.fetchall()
+        ]
+
+    return {
+        'total': total,
+        'inserted': inserted,
+        'updated': updated,
+        'error_count': error_count,
+        'errors': errors,
+    }
@@ -0,0 +1,320 @@
+"""
+Libro de movimientos de stock (append-only) y foto compactada
+
+Cada cambio de existencias es una fila de inventory_stockmovement con sus
+deltas de qty y reserved: recepciones, reservas, liberaciones, despachos y
+ajustes. inventory_stock pasa a ser una foto: compact_movements() suma
+periódicamente los movimientos pendientes a sus filas y los marca con
+compacted_at, sin borrarlos. La posición actual de un producto en una bodega
+es la foto más los movimientos pendientes, y la de un momento anterior resta
+además los movimientos registrados después de ese momento.
+
+Los movimientos que pueden dejar disponible negativo (reservas, despachos,
+liberaciones, ajustes negativos) se serializan por producto con un advisory
+lock de transacción: una reserva es un INSERT y la fila caliente de stock
+solo se reescribe al compactar. El resumen por producto
+(ProductStockSummary) lo mantiene un trigger sobre los movimientos, así que
+refleja la posición actual sin esperar a la compactación.
+"""
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .cache import bump_tables
+from .models import Product, Stock, StockMovement, Warehouse
+
+
+# Delta de (qty, reserved) por unidad de cada tipo de movimiento
+MOVEMENT_DELTAS = {
+    'RECEIPT': (1, 0),
+    'RESERVATION': (0, 1),
+    'RELEASE': (0, -1),
+    'SHIPMENT': (-1, -1),
+    'ADJUSTMENT': (1, 0),
+}
+
+# Tipos que se registran directamente; las reservas solo las crea allocate_stock
+MANUAL_KINDS = ('RECEIPT', 'RELEASE', 'SHIPMENT', 'ADJUSTMENT')
+
+DEFAULT_COMPACT_BATCH_SIZE = 1000
+
+# Advisory locks por producto, en orden de id para evitar deadlocks
+LOCK_PRODUCTS_SQL = """
+SELECT pg_advisory_xact_lock(hashtextextended(product_id, 0))
+FROM unnest(%s::text[]) AS product_id
+"""
+
+# Suma a la foto los movimientos pendientes de hasta batch_size posiciones
+# (producto, bodega) completas, para que cada fila compactada cumpla
+# reserved <= qty. Un solo proceso compacta a la vez.
+COMPACT_MOVEMENTS_SQL = """
+WITH compactor AS (
+    SELECT pg_try_advisory_xact_lock(hashtextextended('inventory_stock_compaction', 0)) AS acquired
+),
+batch AS (
+    SELECT DISTINCT m.product_id, m.warehouse_id
+    FROM inventory_stockmovement m, compactor
+    WHERE m.compacted_at IS NULL AND compactor.acquired
+    LIMIT %s
+),
+applied AS (
+    UPDATE inventory_stockmovement m
+    SET compacted_at = NOW()
+    FROM batch b
+    WHERE
+        m.product_id = b.product_id
+        AND m.warehouse_id = b.warehouse_id
+        AND m.compacted_at IS NULL
+    RETURNING m.product_id, m.warehouse_id, m.qty_delta, m.reserved_delta
+),
+deltas AS (
+    SELECT product_id, warehouse_id, SUM(qty_delta) AS qty, SUM(reserved_delta) AS reserved
+    FROM applied
+    GROUP BY product_id, warehouse_id
+),
+upserted AS (
+    INSERT INTO inventory_stock (id, created_at, updated_at, qty, reserved, product_id, warehouse_id)
+    SELECT gen_random_uuid(), NOW(), NOW(), d.qty, d.reserved, d.product_id, d.warehouse_id
+    FROM deltas d
+    ORDER BY d.product_id, d.warehouse_id
+    ON CONFLICT ON CONSTRAINT unique_product_warehouse_stock DO UPDATE SET
+        qty = inventory_stock.qty + EXCLUDED.qty,
+        reserved = inventory_stock.reserved + EXCLUDED.reserved,
+        updated_at = EXCLUDED.updated_at
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM applied), (SELECT COUNT(*) FROM upserted)
+"""
+
+
+# La compactación solo pasa movimientos pendientes a la foto: los triggers de
+# inventory_stock no la aplican al resumen, que ya incluye esos movimientos
+SET_COMPACTING_SQL = "SELECT set_config('inventory.compacting_movements', %s, true)"
+
+
+class InvalidMovementError(Exception):
+    """El movimiento dejaría la posición con reservado negativo o mayor que la cantidad"""
+
+
+def lock_products(product_ids):
+    """Serializa hasta el fin de la transacción los movimientos que reducen stock de estos productos"""
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_PRODUCTS_SQL, [sorted(str(product_id) for product_id in product_ids)])
+
+
+def _subquery_sum(queryset, group_field, field):
+    sums = queryset.order_by().values(group_field).annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(sums), 0)
+
+
+def position_expressions(outer_filter, group_field, at=None):
+    """
+    qty y reserved de una posición como subconsultas correlacionadas: foto
+    más movimientos pendientes y, con at, menos los registrados después.
+    outer_filter relaciona Stock y StockMovement con la consulta externa
+    (OuterRef) y group_field es el campo por el que se agrupa la suma.
+    """
+    stocks = Stock.objects.filter(**outer_filter)
+    pending = StockMovement.objects.filter(compacted_at__isnull=True, **outer_filter)
+    qty = _subquery_sum(stocks, group_field, 'qty') + _subquery_sum(pending, group_field, 'qty_delta')
+    reserved = (
+        _subquery_sum(stocks, group_field, 'reserved')
+        + _subquery_sum(pending, group_field, 'reserved_delta')
+    )
+
+    if at is not None:
+        later = StockMovement.objects.filter(created_at__gt=at, **outer_filter)
+        qty = qty - _subquery_sum(later, group_field, 'qty_delta')
+        reserved = reserved - _subquery_sum(later, group_field, 'reserved_delta')
+    return {'qty': qty, 'reserved': reserved}
+
+
+def with_positions(stocks):
+    """
+    Filas de stock anotadas con su posición actual (foto + movimientos
+    pendientes) en position_qty y position_reserved
+    """
+    related = {'product': OuterRef('product'), 'warehouse': OuterRef('warehouse')}
+    pending = StockMovement.objects.filter(compacted_at__isnull=True, **related)
+    return stocks.annotate(
+        position_qty=F('qty') + _subquery_sum(pending, 'product', 'qty_delta'),
+        position_reserved=F('reserved') + _subquery_sum(pending, 'product', 'reserved_delta'),
+    )
+
+
+def get_available_by_product(product_ids):
+    """Disponible (foto + pendientes) por producto con una sola consulta"""
+    positions = Product.objects.filter(pk__in=product_ids).annotate(
+        **position_expressions({'product': OuterRef('pk')}, 'product')
+    )
+    return {
+        product_id: qty - reserved
+        for product_id, qty, reserved in positions.values_list('pk', 'qty', 'reserved')
+    }
+
+
+def get_availability(product, at=None):
+    """
+    Posición del producto por bodega, actual o en el momento at. Solo
+    incluye bodegas con foto o movimientos del producto.
+    """
+    related = {'product': product.pk, 'warehouse': OuterRef('pk')}
+    warehouses = Warehouse.objects.annotate(
+        **position_expressions(related, 'warehouse', at)
+    ).filter(
+        Exists(Stock.objects.filter(**related)) | Exists(StockMovement.objects.filter(**related))
+    ).order_by('name')
+
+    rows = [
+        {
+            'warehouse': warehouse_id,
+            'warehouse_name': name,
+            'qty': qty,
+            'reserved': reserved,
+            'available': qty - reserved,
+        }
+        for warehouse_id, name, qty, reserved in warehouses.values_list('id', 'name', 'qty', 'reserved')
+    ]
+    qty = sum(row['qty'] for row in rows)
+    reserved = sum(row['reserved'] for row in rows)
+    return {
+        'product': product.pk,
+        'sku': product.sku,
+        'at': at,
+        'qty': qty,
+        'reserved': reserved,
+        'available': qty - reserved,
+        'warehouses': rows,
+    }
+
+
+def record_movement(product, warehouse, kind, quantity, order=None, note=''):
+    """
+    Registra un movimiento de quantity unidades (negativas solo en ajustes).
+    Los que reducen stock validan la posición bajo el lock del producto y
+    lanzan InvalidMovementError si la dejarían inconsistente.
+    """
+    qty_sign, reserved_sign = MOVEMENT_DELTAS[kind]
+    qty_delta, reserved_delta = qty_sign * quantity, reserved_sign * quantity
+
+    with transaction.atomic():
+        if qty_delta < 0 or reserved_delta != 0:
+            lock_products([product.pk])
+            position = Warehouse.objects.filter(pk=warehouse.pk).annotate(
+                **position_expressions({'product': product.pk, 'warehouse': OuterRef('pk')}, 'warehouse')
+            ).values('qty', 'reserved').get()
+
+            new_qty = position['qty'] + qty_delta
+            new_reserved = position['reserved'] + reserved_delta
+            if kind == 'RELEASE':
+                # Solo se libera lo que la orden tiene reservado; una
+                # liberación suelta dejaría su reserva sin respaldo
+                held = _held_by_order(order, product, warehouse) if order is not None else 0
+                if quantity > held:
+                    raise InvalidMovementError(
+                        f"La orden solo tiene {held} unidades reservadas en {warehouse.name}"
+                    )
+            if new_reserved < 0:
+                raise InvalidMovementError(
+                    f"Reservado insuficiente en {warehouse.name}: {position['reserved']}"
+                )
+            if new_qty < new_reserved:
+                raise InvalidMovementError(
+                    f"Stock disponible insuficiente en {warehouse.name}: "
+                    f"{position['qty'] - position['reserved']}"
+                )
+
+        return StockMovement.objects.create(
+            product=product,
+            warehouse=warehouse,
+            order=order,
+            kind=kind,
+            qty_delta=qty_delta,
+            reserved_delta=reserved_delta,
+            note=note,
+        )
+
+
+def _held_by_order(order, product, warehouse):
+    """Unidades que la orden mantiene reservadas en la posición"""
+    return StockMovement.objects.filter(
+        order=order, product=product, warehouse=warehouse
+    ).aggregate(net=Coalesce(Sum('reserved_delta'), 0))['net']
+
+
+def _reserved_positions(product_ids, warehouse_ids):
+    """Reservado actual (foto + pendientes) por (producto, bodega)"""
+    positions = {}
+    filters = {'product_id__in': product_ids, 'warehouse_id__in': warehouse_ids}
+    for product_id, warehouse_id, reserved in Stock.objects.filter(**filters).values_list(
+        'product_id', 'warehouse_id', 'reserved'
+    ):
+        positions[product_id, warehouse_id] = reserved
+    pending = StockMovement.objects.filter(compacted_at__isnull=True, **filters).values(
+        'product_id', 'warehouse_id'
+    ).annotate(net=Sum('reserved_delta')).values_list('product_id', 'warehouse_id', 'net')
+    for product_id, warehouse_id, net in pending:
+        key = (product_id, warehouse_id)
+        positions[key] = positions.get(key, 0) + net
+    return positions
+
+
+def release_reservations(order_ids, note=''):
+    """
+    Libera lo que sigue reservado para las órdenes indicadas; retorna los
+    movimientos creados. Cada liberación se limita al reservado actual de la
+    posición, para que nunca quede negativo aunque otro movimiento (un
+    despacho sin orden, por ejemplo) ya haya consumido parte de la reserva.
+    """
+    movements = StockMovement.objects.filter(order_id__in=order_ids)
+    with transaction.atomic():
+        lock_products(set(movements.values_list('product_id', flat=True).distinct()))
+        held = list(
+            movements.values('order_id', 'product_id', 'warehouse_id')
+            .annotate(net=Sum('reserved_delta'))
+            .filter(net__gt=0)
+            .order_by('order_id', 'product_id', 'warehouse_id')
+        )
+        if not held:
+            return []
+
+        reserved = _reserved_positions(
+            {row['product_id'] for row in held}, {row['warehouse_id'] for row in held}
+        )
+        releases = []
+        for row in held:
+            key = (row['product_id'], row['warehouse_id'])
+            quantity = min(row['net'], reserved.get(key, 0))
+            if quantity <= 0:
+                continue
+            reserved[key] -= quantity
+            releases.append(StockMovement(
+                order_id=row['order_id'],
+                product_id=row['product_id'],
+                warehouse_id=row['warehouse_id'],
+                kind='RELEASE',
+                reserved_delta=-quantity,
+                note=note,
+            ))
+        if not releases:
+            return []
+
+        movements = StockMovement.objects.bulk_create(releases)
+        bump_tables('inventory_stockmovement')
+    return movements
+
+
+def compact_movements(batch_size=DEFAULT_COMPACT_BATCH_SIZE):
+    """
+    Compacta un lote de posiciones en la foto. Retorna (movimientos
+    compactados, filas de stock escritas); (0, 0) si no quedan pendientes
+    o si otro proceso está compactando.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(SET_COMPACTING_SQL, ['on'])
+        cursor.execute(COMPACT_MOVEMENTS_SQL, [batch_size])
+        movements, stocks = cursor.fetchone()
+        cursor.execute(SET_COMPACTING_SQL, ['off'])
+        if movements:
+            bump_tables('inventory_stock', 'inventory_stockmovement')
+    return movements, stocks
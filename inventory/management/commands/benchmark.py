@@ -0,0 +1,394 @@
+import json
+import platform
+import re
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import Resolver404, resolve
+from inventory import datagen
+from inventory.benchmarking import capture_queries, compare_results, git_revision, summarize
+from inventory.models import OrderItem
+from inventory.query_plans import RELATION_PATHS
+from inventory.reports import rebuild_daily_sales
+from inventory.urls import router
+
+from .benchmark_get_related import SHAPES
+
+
+API_PREFIX = '/api/v1'
+SERVER_TIMING_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Recorre todos los endpoints del router y las formas de get_related, '
+        'reportando latencia p50/p95/p99, consultas por petición y memoria pico'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            choices=sorted(datagen.SCALE_PRESETS),
+            help='Dataset sintético a cargar antes de medir (small=10k, medium=1M, large=10M items)'
+        )
+        parser.add_argument(
+            '--items',
+            type=int,
+            help='Cantidad exacta de items de orden del dataset (en lugar de --scale)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Semilla del generador de datos'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Vaciar las tablas del inventario antes de cargar el dataset (requerido si tienen datos)'
+        )
+        parser.add_argument(
+            '--skip-load',
+            action='store_true',
+            help='Medir sobre los datos ya cargados sin regenerar el dataset'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Peticiones medidas por endpoint'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Peticiones previas no medidas por endpoint'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Filas del modelo base en get_related'
+        )
+        parser.add_argument(
+            '--only',
+            help='Medir solo los endpoints cuyo nombre contiene este texto'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Servidor local a medir (ej: http://localhost:8000); por defecto se usa el cliente de pruebas'
+        )
+        parser.add_argument(
+            '--api-prefix',
+            default=API_PREFIX,
+            help=f'Prefijo de la API a medir ({API_PREFIX} o {API_PREFIX}/async para las vistas async)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Peticiones simultáneas contra --base-url (prueba de carga del pool de conexiones)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Archivo JSON donde guardar los resultados'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Archivo JSON de una corrida anterior contra el cual detectar regresiones'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Aumento relativo de p95 considerado regresión (0.2 = 20%%)'
+        )
+
+    def handle(self, *args, **options):
+        # Sin peticiones medidas no hay percentiles que reportar
+        if options['iterations'] < 1:
+            raise CommandError('--iterations debe ser al menos 1')
+        if options['warmup'] < 0:
+            raise CommandError('--warmup no puede ser negativo')
+
+        items = options['items'] or datagen.SCALE_PRESETS.get(options['scale'])
+        spec = datagen.DatasetSpec(items, seed=options['seed']) if items else None
+
+        if spec and not options['skip_load']:
+            if not options['clear'] and datagen.has_inventory_data():
+                # La carga vacía las tablas con TRUNCATE: no hacerlo sin pedirlo
+                raise CommandError(
+                    'Las tablas del inventario tienen datos: use --clear para reemplazarlos '
+                    'por el dataset o --skip-load para medir sobre ellos'
+                )
+            self.load(spec)
+
+        endpoints = self.collect_endpoints(options['limit'], options['api_prefix'].rstrip('/'))
+        if options['only']:
+            endpoints = [endpoint for endpoint in endpoints if options['only'] in endpoint[0]]
+        if not endpoints:
+            raise CommandError('No hay endpoints para medir (¿la base de datos está vacía?)')
+
+        if options['concurrency'] > 1 and not options['base_url']:
+            # El cliente de pruebas no cierra la conexión al terminar cada petición
+            raise CommandError(
+                '--concurrency requiere --base-url: con el cliente de pruebas no se mide '
+                'la apertura de conexiones ni la espera en el pool'
+            )
+
+        if options['base_url']:
+            fetch = self.http_fetch(options['base_url'].rstrip('/'))
+        else:
+            fetch = self.client_fetch(Client(HTTP_HOST='localhost', raise_request_exception=False))
+
+        results = {}
+        failures = {}
+        for name, url, params in endpoints:
+            result = self.measure(
+                fetch, url, params, options['iterations'], options['warmup'],
+                track_memory=not options['base_url'], concurrency=options['concurrency']
+            )
+            # Una respuesta de error no mide el endpoint: no entra en el reporte
+            if not 200 <= result['status'] < 300:
+                failures[name] = result['status']
+                self.stdout.write(self.style.ERROR(f'{name:<45} respondió {result["status"]}'))
+                continue
+
+            results[name] = result
+            latency = result['latency_ms']
+            max_queries = result['queries']['max']
+            throughput = result['throughput_rps']
+            self.stdout.write(
+                f'{name:<45} p50 {latency["p50"]:>9.2f} ms  p95 {latency["p95"]:>9.2f} ms  '
+                f'p99 {latency["p99"]:>9.2f} ms  '
+                f'{"-" if max_queries is None else max_queries:>4} consultas  '
+                f'{"-" if throughput is None else f"{throughput:.1f}":>8} req/s'
+            )
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'git_revision': git_revision(),
+                'dataset': spec.as_dict() if spec else None,
+                'row_counts': self.row_counts(),
+                'database': connection.vendor,
+                'transport': options['base_url'] or 'test-client',
+                'api_prefix': options['api_prefix'],
+                'iterations': options['iterations'],
+                'concurrency': options['concurrency'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["output"]}'))
+
+        if failures:
+            raise CommandError(
+                f'{len(failures)} endpoints respondieron con error: '
+                + ', '.join(f'{name} ({status})' for name, status in failures.items())
+            )
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'])
+
+    def load(self, spec):
+        self.stdout.write(f'Generando dataset {spec.as_dict()}...')
+        start_time = time.perf_counter()
+
+        def progress(table, done, total):
+            self.stdout.write(f'  {table}: {done}/{total}')
+
+        datagen.truncate_inventory()
+        if connection.vendor == 'postgresql':
+            datagen.copy_dataset(spec, progress=progress)
+        else:
+            with transaction.atomic():
+                datagen.load_dataset(spec, progress=progress)
+        rebuild_daily_sales()
+        self.stdout.write(
+            self.style.SUCCESS(f'Dataset cargado en {time.perf_counter() - start_time:.1f} s')
+        )
+
+    def collect_endpoints(self, limit, api_prefix=API_PREFIX):
+        """
+        (nombre, url, params) de list, retrieve, acciones GET y get_related por
+        ViewSet. Con otro prefijo se conservan las rutas que existen bajo él.
+        """
+        endpoints = []
+        action_params = self.action_params()
+        for prefix, viewset, basename in router.registry:
+            # Los ViewSets de reportes no tienen modelo: solo sus acciones de lista
+            queryset = getattr(viewset, 'queryset', None)
+            model = queryset.model if queryset is not None else None
+            pk = model.objects.order_by('pk').values_list('pk', flat=True).first() if model else None
+
+            if model:
+                endpoints.append((f'{basename}-list', f'{API_PREFIX}/{prefix}/', {}))
+            if pk is not None:
+                endpoints.append((f'{basename}-detail', f'{API_PREFIX}/{prefix}/{pk}/', {}))
+
+            for extra_action in viewset.get_extra_actions():
+                if 'get' not in extra_action.mapping or extra_action.url_path == 'get_related':
+                    continue
+                params = action_params.get(extra_action.url_path, {})
+                if params is None:
+                    continue
+                if extra_action.detail:
+                    if pk is None:
+                        continue
+                    url = f'{API_PREFIX}/{prefix}/{pk}/{extra_action.url_path}/'
+                else:
+                    url = f'{API_PREFIX}/{prefix}/{extra_action.url_path}/'
+                endpoints.append((f'{basename}-{extra_action.url_path}', url, params))
+
+            # get_related con las relaciones directas del modelo
+            joins = [
+                path for path in RELATION_PATHS.get(model._meta.model_name if model else '', {}).values()
+                if '__' not in path
+            ]
+            if joins:
+                endpoints.append((
+                    f'{basename}-get_related',
+                    f'{API_PREFIX}/{prefix}/get_related/',
+                    {'join': ','.join(joins), 'limit': str(limit)}
+                ))
+
+        for name, (url, params) in SHAPES.items():
+            endpoints.append((f'get_related-{name}', url, dict(params, limit=str(limit))))
+
+        if api_prefix == API_PREFIX:
+            return endpoints
+        prefixed = []
+        for name, url, params in endpoints:
+            url = api_prefix + url[len(API_PREFIX):]
+            try:
+                resolve(url)
+            except Resolver404:
+                continue
+            prefixed.append((name, url, params))
+        return prefixed
+
+    def action_params(self):
+        """
+        Parámetros requeridos por las acciones de reportes, tomados de un item
+        de orden de los datos cargados. None omite la acción: sin ventas no hay
+        marca, cliente ni SKU con los que llamarla.
+        """
+        sample = OrderItem.objects.order_by('pk').values(
+            'product__brand__name', 'product__sku', 'order__customer__email'
+        ).first()
+        if sample is None:
+            return {'products_by_brand_customer': None, 'payments_by_product_quantity': None}
+        return {
+            'products_by_brand_customer': {
+                'brand': sample['product__brand__name'],
+                'customer_email': sample['order__customer__email'],
+            },
+            'payments_by_product_quantity': {'sku': sample['product__sku']},
+        }
+
+    def client_fetch(self, client):
+        def fetch(url, params):
+            with capture_queries() as captured:
+                response = client.get(url, params)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+            return response.status_code, len(body), len(captured)
+        return fetch
+
+    def http_fetch(self, base_url):
+        def fetch(url, params):
+            query = f'?{urllib.parse.urlencode(params)}' if params else ''
+            try:
+                with urllib.request.urlopen(f'{base_url}{url}{query}') as response:
+                    status, body, headers = response.status, response.read(), response.headers
+            except urllib.error.HTTPError as error:
+                status, body, headers = error.code, error.read(), error.headers
+            # Sin acceso a la conexión del servidor, las consultas salen del header Server-Timing
+            match = SERVER_TIMING_QUERIES_RE.search(headers.get('Server-Timing', ''))
+            return status, len(body), int(match.group(1)) if match else None
+        return fetch
+
+    def measure(self, fetch, url, params, iterations, warmup, track_memory, concurrency=1):
+        for _ in range(warmup):
+            fetch(url, params)
+
+        def timed_fetch(_):
+            start_time = time.perf_counter()
+            status, size, query_count = fetch(url, params)
+            return (time.perf_counter() - start_time) * 1000, status, size, query_count
+
+        start_time = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                samples = list(executor.map(timed_fetch, range(iterations)))
+        else:
+            samples = [timed_fetch(index) for index in range(iterations)]
+        elapsed = time.perf_counter() - start_time
+
+        timings = [sample[0] for sample in samples]
+        queries = [sample[3] for sample in samples if sample[3] is not None]
+        size = samples[-1][2] if samples else None
+        # Basta una muestra con error para descartar la medición
+        statuses = [sample[1] for sample in samples]
+        status = next((code for code in statuses if not 200 <= code < 300), statuses[-1])
+
+        # La memoria se mide en una petición aparte: tracemalloc distorsiona la latencia
+        peak_memory_kb = None
+        if track_memory:
+            tracemalloc.start()
+            try:
+                fetch(url, params)
+                peak_memory_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            finally:
+                tracemalloc.stop()
+
+        return {
+            'url': url,
+            'params': params,
+            'status': status,
+            'response_bytes': size,
+            'latency_ms': summarize(timings),
+            'throughput_rps': round(iterations / elapsed, 1) if elapsed else None,
+            'queries': {
+                'min': min(queries) if queries else None,
+                'max': max(queries) if queries else None,
+            },
+            'peak_memory_kb': peak_memory_kb,
+        }
+
+    def row_counts(self):
+        counts = {}
+        for _, viewset, basename in router.registry:
+            if getattr(viewset, 'queryset', None) is not None:
+                counts[basename] = viewset.queryset.model.objects.count()
+        return counts
+
+    def compare(self, path, results, threshold):
+        with open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare_results(baseline.get('results', {}), results, threshold=threshold)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f'Sin regresiones respecto a {path}'))
+            return
+
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'{regression["name"]}: {regression["metric"]} '
+                f'{regression["baseline"]} -> {regression["current"]}'
+            ))
+        raise CommandError(f'{len(regressions)} regresiones respecto a {path}')
@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F, Sum
+from inventory.ledger import get_availability, release_reservations
+from inventory.models import Customer, Order, OrderItem, Product, StockMovement
+from inventory.reservations import confirm_order, InsufficientStockError
+
+
+class Command(BaseCommand):
+    help = 'Mide confirmaciones de órdenes concurrentes sobre SKUs calientes y verifica que no haya sobreventa'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=200,
+            help='Cantidad de órdenes pendientes a confirmar'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Confirmaciones simultáneas'
+        )
+        parser.add_argument(
+            '--hot-products',
+            type=int,
+            default=3,
+            help='Cantidad de productos con más stock sobre los que compiten las órdenes'
+        )
+        parser.add_argument(
+            '--qty',
+            type=int,
+            default=1,
+            help='Unidades por item de orden'
+        )
+
+    def handle(self, *args, **options):
+        customer = Customer.objects.first()
+        products = list(
+            Product.objects.annotate(
+                available=Sum(F('stocks__qty') - F('stocks__reserved'))
+            ).filter(available__gt=0).order_by('-available')[:options['hot_products']]
+        )
+        if customer is None or not products:
+            raise CommandError('Se requieren clientes y productos con stock (ejecute load_sample_data)')
+
+        orders = self.create_orders(customer, products, options['orders'], options['qty'])
+
+        try:
+            self.stdout.write(
+                f'Confirmando {len(orders)} órdenes sobre {len(products)} productos '
+                f'con {options["threads"]} hilos...'
+            )
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                outcomes = list(executor.map(self.confirm, orders))
+            elapsed = time.perf_counter() - start_time
+
+            confirmed = outcomes.count('confirmed')
+            rejected = outcomes.count('rejected')
+            self.stdout.write(f'Confirmadas: {confirmed}')
+            self.stdout.write(f'Rechazadas por stock insuficiente: {rejected}')
+            self.stdout.write(f'Tiempo total: {elapsed:.4f} segundos')
+            self.stdout.write(f'Confirmaciones por segundo: {len(orders) / elapsed:.1f}')
+
+            self.check_oversell(products, orders)
+        finally:
+            self.cleanup(orders)
+
+    def create_orders(self, customer, products, count, qty):
+        """Crea órdenes pendientes que compiten por los mismos productos"""
+        orders = Order.objects.bulk_create(
+            [Order(customer=customer, status='PENDING') for _ in range(count)]
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, qty=qty, unit_price=product.price)
+            for order in orders
+            for product in products
+        ])
+        return orders
+
+    def confirm(self, order):
+        try:
+            confirm_order(order)
+            return 'confirmed'
+        except InsufficientStockError:
+            return 'rejected'
+        finally:
+            connections.close_all()
+
+    def check_oversell(self, products, orders):
+        """Verifica que lo reservado coincida exactamente con lo confirmado"""
+        reserved = StockMovement.objects.filter(order__in=orders).aggregate(
+            total=Sum('reserved_delta')
+        )['total'] or 0
+        confirmed_demand = OrderItem.objects.filter(
+            order__in=orders, order__status='CONFIRMED'
+        ).aggregate(total=Sum('qty'))['total'] or 0
+        oversold = sum(
+            1
+            for product in products
+            for position in get_availability(product)['warehouses']
+            if position['available'] < 0
+        )
+
+        if oversold or reserved != confirmed_demand:
+            raise CommandError(
+                f'Sobreventa detectada: {oversold} bodegas con reservado > cantidad, '
+                f'reservado {reserved} vs confirmado {confirmed_demand}'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Sin sobreventa: reservado == demanda confirmada'))
+
+    def cleanup(self, orders):
+        """Libera las reservas de las órdenes de prueba y las elimina"""
+        order_ids = [order.pk for order in orders]
+        release_reservations(order_ids, note='benchmark_confirm')
+        Order.objects.filter(pk__in=order_ids).delete()
@@ -0,0 +1,91 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from inventory.benchmarking import capture_queries
+from inventory.query_plans import plan_cache
+
+
+# Consultas anchas sobre Product y Order con proyección explícita de campos
+SHAPES = {
+    'products_wide': (
+        '/api/v1/products/get_related/',
+        {
+            'join': 'brand,category,stocks__warehouse',
+            'fields[product]': 'name,sku,price',
+            'fields[brand]': 'name',
+            'fields[stocks]': 'qty,reserved',
+        }
+    ),
+    'orders_wide': (
+        '/api/v1/orders/get_related/',
+        {
+            'join': 'customer,items__product',
+            'fields[order]': 'status,created_at',
+            'fields[customer]': 'email',
+            'fields[items]': 'qty,unit_price',
+        }
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compara get_related con y sin proyección de columnas (fields[...] -> .only())'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Repeticiones por consulta'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=500,
+            help='Filas del modelo base por consulta'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations debe ser al menos 1')
+
+        client = Client(HTTP_HOST='localhost')
+
+        for name, (url, params) in SHAPES.items():
+            params = dict(params, limit=str(options['limit']))
+            self.stdout.write(self.style.SUCCESS(f'\n=== {name} ==='))
+
+            for projection in (False, True):
+                with override_settings(GET_RELATED_PROJECTION=projection):
+                    plan_cache.clear()
+                    timings, queries, size = self.run(client, url, params, options['iterations'])
+
+                label = 'con proyección' if projection else 'filas completas'
+                self.stdout.write(
+                    f'{label:>16}: media {statistics.mean(timings):.2f} ms, '
+                    f'p95 {self.percentile(timings, 95):.2f} ms, '
+                    f'{queries} consultas, {size} bytes'
+                )
+
+        plan_cache.clear()
+
+    def run(self, client, url, params, iterations):
+        timings = []
+        queries = 0
+        size = 0
+        for _ in range(iterations):
+            with capture_queries() as captured:
+                start_time = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - start_time) * 1000)
+            queries = len(captured)
+            size = len(response.content)
+        return timings, queries, size
+
+    def percentile(self, values, percent):
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+        return ordered[index]
@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from inventory.models import Brand, Product, Warehouse
+
+
+# Filtros de subcadena tal como los generan la API, el admin y las funciones SQL
+def search_queries(term):
+    return {
+        'product_name_icontains': Product.objects.filter(name__icontains=term),
+        'product_search': Product.objects.filter(Q(name__icontains=term) | Q(sku__icontains=term)),
+        'brand_name_icontains': Brand.objects.filter(name__icontains=term),
+        'warehouse_name_icontains': Warehouse.objects.filter(name__icontains=term),
+    }
+
+
+# Predicados de get_products_by_brand_and_customer y get_stock_analysis
+FUNCTION_PREDICATES = {
+    'function_brand_predicate': (
+        "SELECT id FROM inventory_brand b WHERE UPPER(b.name) LIKE UPPER('%%' || %s || '%%')"
+    ),
+    'function_warehouse_predicate': (
+        "SELECT id FROM inventory_warehouse w WHERE UPPER(w.name) LIKE UPPER('%%' || %s || '%%')"
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Muestra los planes de las búsquedas por subcadena con y sin los índices '
+        'de trigramas (Seq Scan vs Bitmap Index Scan)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--term',
+            default='Samsung',
+            help='Texto a buscar'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Los índices de trigramas requieren PostgreSQL')
+
+        term = options['term']
+        statements = {
+            name: queryset.query.sql_with_params()
+            for name, queryset in search_queries(term).items()
+        }
+        statements.update({
+            name: (sql, [term]) for name, sql in FUNCTION_PREDICATES.items()
+        })
+
+        for name, (sql, params) in statements.items():
+            self.stdout.write(self.style.SUCCESS(f'\n=== {name} ==='))
+            for use_indexes in (False, True):
+                nodes, execution_time = self.explain(sql, params, use_indexes)
+                label = 'con índices' if use_indexes else 'sin índices'
+                self.stdout.write(f'{label:>12}: {execution_time:8.3f} ms  {" > ".join(nodes)}')
+
+    def explain(self, sql, params, use_indexes):
+        """Nodos del plan y tiempo de ejecución; sin índices se desactivan los index/bitmap scans"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not use_indexes:
+                cursor.execute('SET LOCAL enable_indexscan = off')
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return self.node_types(plan[0]['Plan']), plan[0]['Execution Time']
+
+    def node_types(self, node):
+        """Tipos de nodo del plan en recorrido en profundidad, con el índice usado"""
+        label = node['Node Type']
+        if 'Index Name' in node:
+            label += f' ({node["Index Name"]})'
+        nodes = [label]
+        for child in node.get('Plans', []):
+            nodes.extend(self.node_types(child))
+        return nodes
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.ledger import DEFAULT_COMPACT_BATCH_SIZE, compact_movements
+
+
+class Command(BaseCommand):
+    help = 'Suma los movimientos de stock pendientes a la foto de inventory_stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_COMPACT_BATCH_SIZE,
+            help='Posiciones (producto, bodega) compactadas por transacción'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Segundos entre pasadas; sin este parámetro se compacta una vez y termina'
+        )
+
+    def handle(self, *args, **options):
+        if options['interval'] is None:
+            if not self.compact(options['batch_size']):
+                self.stdout.write('No hay movimientos pendientes')
+            return
+
+        while True:
+            self.compact(options['batch_size'])
+            time.sleep(options['interval'])
+
+    def compact(self, batch_size):
+        """Compacta por lotes hasta que no quedan movimientos pendientes; retorna los compactados"""
+        start_time = time.perf_counter()
+        total_movements = total_stocks = 0
+        while True:
+            movements, stocks = compact_movements(batch_size)
+            if not movements:
+                break
+            total_movements += movements
+            total_stocks += stocks
+
+        if total_movements:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{total_movements} movimientos compactados en {total_stocks} filas de stock '
+                    f'({time.perf_counter() - start_time:.2f} s)'
+                )
+            )
+        return total_movements
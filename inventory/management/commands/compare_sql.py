@@ -1,18 +1,58 @@
+import json
+import sys
 import time
-from django.core.management.base import BaseCommand
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
-from django.db.models import Q
-from inventory.models import Product, Brand, Customer, Order, OrderItem, Payment
+from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, Sum
+from inventory.benchmarking import git_revision, summarize
+from inventory.ledger import with_positions
+from inventory.models import Payment, Product, Stock
+from inventory.reports import top_selling_queryset
+
+
+CASES = ['products_by_brand_customer', 'payments_by_quantity', 'stock_analysis', 'top_selling']
+
+
+class Contender:
+    """Una forma de resolver un caso: queryset del ORM o función SQL"""
+
+    def __init__(self, name, sql, params, run):
+        self.name = name
+        self.sql = sql
+        self.params = params
+        # Ejecuta la consulta completa (incluida la materialización) y retorna las filas
+        self.run = run
+
+    @classmethod
+    def from_queryset(cls, name, queryset):
+        sql, params = queryset.query.sql_with_params()
+        return cls(name, sql, params, lambda: list(queryset.all()))
+
+    @classmethod
+    def from_function(cls, name, function, params):
+        sql = f'SELECT * FROM {function}({", ".join(["%s"] * len(params))})'
+
+        def run():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+
+        return cls(name, sql, params, run)
 
 
 class Command(BaseCommand):
-    help = 'Compara el SQL generado por Django ORM con funciones SQL de PostgreSQL'
+    help = (
+        'Compara consultas del Django ORM con las funciones SQL de PostgreSQL: '
+        'iteraciones en caliente y en frío, percentiles y planes EXPLAIN (ANALYZE, BUFFERS)'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--case',
             type=str,
-            choices=['products_by_brand_customer', 'payments_by_quantity', 'all'],
+            choices=CASES + ['all'],
             default='all',
             help='Caso de uso específico a comparar'
         )
@@ -40,170 +80,272 @@ class Command(BaseCommand):
             default=5,
             help='Cantidad mínima para la consulta'
         )
+        parser.add_argument(
+            '--warehouse-name',
+            type=str,
+            help='Filtro por nombre de bodega del análisis de stock'
+        )
+        parser.add_argument(
+            '--min-stock',
+            type=int,
+            default=0,
+            help='Stock mínimo del análisis de stock'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Productos del top de más vendidos'
+        )
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            help='Inicio del rango del top de más vendidos (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            help='Fin del rango del top de más vendidos (YYYY-MM-DD, inclusive)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Ejecuciones en caliente medidas por consulta'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Ejecuciones previas no medidas'
+        )
+        parser.add_argument(
+            '--cold-iterations',
+            type=int,
+            default=5,
+            help='Ejecuciones en frío (cada una en una conexión nueva, sin planes ni catálogo en caché)'
+        )
+        parser.add_argument(
+            '--json',
+            dest='json_path',
+            help="Archivo donde escribir los resultados en JSON ('-' para stdout)"
+        )
+        parser.add_argument(
+            '--fail-if-slower-than',
+            action='append',
+            default=[],
+            metavar='[CASO=]MS',
+            help='Falla si el p95 en caliente de alguna consulta (o de un caso) supera MS milisegundos'
+        )
 
     def handle(self, *args, **options):
-        case = options['case']
-        
-        if case in ['products_by_brand_customer', 'all']:
-            self.compare_products_by_brand_customer(
-                options['brand_name'], 
-                options['customer_email']
-            )
-        
-        if case in ['payments_by_quantity', 'all']:
-            self.compare_payments_by_quantity(
-                options['product_sku'], 
-                options['min_quantity']
-            )
-
-    def compare_products_by_brand_customer(self, brand_name, customer_email):
-        """
-        Compara consulta: Productos de una marca que aparecen en órdenes de un cliente
-        """
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\n=== COMPARACIÓN: Productos de marca "{brand_name}" en órdenes de "{customer_email}" ==='
-            )
-        )
-        
-        # 1. CONSULTA CON DJANGO ORM
-        self.stdout.write('\n1. CONSULTA CON DJANGO ORM:')
-        
-        start_time = time.time()
-        
-        # Consulta equivalente usando el método get_related
-        django_queryset = Product.objects.select_related(
-            'brand', 'category'
-        ).prefetch_related(
-            'order_items__order__customer'
-        ).filter(
-            brand__name__icontains=brand_name,
-            order_items__order__customer__email=customer_email,
-            is_active=True,
-            brand__is_active=True
-        ).distinct()
-        
-        # Forzar evaluación del queryset
-        django_results = list(django_queryset)
-        django_time = time.time() - start_time
-        
-        # Mostrar SQL generado
-        self.stdout.write(f'SQL Generado por Django ORM:')
-        self.stdout.write(f'{str(django_queryset.query)}')
-        self.stdout.write(f'Resultados: {len(django_results)} productos')
-        self.stdout.write(f'Tiempo de ejecución: {django_time:.4f} segundos')
-        
-        # 2. FUNCIÓN SQL DE POSTGRESQL
-        self.stdout.write('\n2. FUNCIÓN SQL DE POSTGRESQL:')
-        
-        start_time = time.time()
-        
-        with connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM get_products_by_brand_and_customer(%s, %s)",
-                [brand_name, customer_email]
-            )
-            sql_results = cursor.fetchall()
-            
-        sql_time = time.time() - start_time
-        
-        self.stdout.write(f'Función SQL: get_products_by_brand_and_customer()')
-        self.stdout.write(f'Resultados: {len(sql_results)} filas')
-        self.stdout.write(f'Tiempo de ejecución: {sql_time:.4f} segundos')
-        
-        # 3. ANÁLISIS DE DIFERENCIAS
-        self.stdout.write('\n3. ANÁLISIS DE DIFERENCIAS:')
-        
-        self.stdout.write(f'• Diferencia en cantidad de resultados: {len(django_results) - len(sql_results)}')
-        self.stdout.write(f'• Diferencia en tiempo: {(django_time - sql_time):.4f} segundos')
-        
-        if django_time > sql_time:
-            percentage = ((django_time - sql_time) / sql_time) * 100
-            self.stdout.write(f'• Función SQL es {percentage:.1f}% más rápida')
-        else:
-            percentage = ((sql_time - django_time) / django_time) * 100
-            self.stdout.write(f'• Django ORM es {percentage:.1f}% más rápido')
-        
-        # 4. COMPLEJIDADES
-        self.stdout.write('\n4. ANÁLISIS DE COMPLEJIDAD:')
-        self.stdout.write('Django ORM:')
-        self.stdout.write('  - Temporal: O(n) + overhead de ORM + múltiples queries (sin optimización)')
-        self.stdout.write('  - Espacial: O(n) + objetos Python + cache del ORM')
-        self.stdout.write('  - Ventajas: Abstracción, seguridad, portabilidad')
-        self.stdout.write('  - Desventajas: Overhead de conversión, posible N+1')
-        
-        self.stdout.write('Función PostgreSQL:')
-        self.stdout.write('  - Temporal: O(n) optimizada por motor de BD')
-        self.stdout.write('  - Espacial: O(n) solo resultados, sin overhead')
-        self.stdout.write('  - Ventajas: Velocidad, optimización del motor DB')
-        self.stdout.write('  - Desventajas: Acoplamiento a PostgreSQL, mantenimiento manual')
-
-    def compare_payments_by_quantity(self, product_sku, min_quantity):
+        # Sin ejecuciones en caliente no hay percentiles que reportar
+        if options['iterations'] < 1:
+            raise CommandError('--iterations debe ser al menos 1')
+        if options['warmup'] < 0 or options['cold_iterations'] < 0:
+            raise CommandError('--warmup y --cold-iterations no pueden ser negativos')
+        if connection.vendor != 'postgresql':
+            raise CommandError('Las funciones SQL comparadas requieren PostgreSQL')
+
+        thresholds = self.parse_thresholds(options['fail_if_slower_than'])
+        cases = CASES if options['case'] == 'all' else [options['case']]
+        # Con --json - la salida legible va a stderr para no mezclarse con el JSON
+        self.log = self.stderr if options['json_path'] == '-' else self.stdout
+
+        results = {}
+        for case in cases:
+            self.log.write(self.style.SUCCESS(f'\n=== {case} ==='))
+            results[case] = {}
+            for contender in self.build_case(case, options):
+                results[case][contender.name] = self.measure(contender, options)
+                self.report(contender.name, results[case][contender.name])
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'git_revision': git_revision(),
+                'iterations': options['iterations'],
+                'cold_iterations': options['cold_iterations'],
+                'server_version': connection.pg_version,
+            },
+            'cases': results,
+        }
+        if options['json_path'] == '-':
+            json.dump(report, sys.stdout, indent=2, default=str)
+            sys.stdout.write('\n')
+        elif options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, default=str)
+            self.log.write(f'Resultados guardados en {options["json_path"]}')
+
+        self.check_thresholds(results, thresholds)
+
+    def build_case(self, case, options):
+        """Consulta del ORM y función SQL equivalentes para el caso"""
+        if case == 'products_by_brand_customer':
+            queryset = Product.objects.select_related(
+                'brand', 'category'
+            ).prefetch_related(
+                'order_items__order__customer'
+            ).filter(
+                brand__name__icontains=options['brand_name'],
+                order_items__order__customer__email=options['customer_email'],
+                is_active=True,
+                brand__is_active=True
+            ).distinct()
+            return [
+                Contender.from_queryset('orm', queryset),
+                Contender.from_function(
+                    'function', 'get_products_by_brand_and_customer',
+                    [options['brand_name'], options['customer_email']]
+                ),
+            ]
+
+        if case == 'payments_by_quantity':
+            queryset = Payment.objects.select_related(
+                'order__customer'
+            ).prefetch_related(
+                'order__items__product'
+            ).filter(
+                order__items__product__sku=options['product_sku'],
+                order__items__qty__gte=options['min_quantity'],
+                status='CONFIRMED'
+            ).distinct()
+            return [
+                Contender.from_queryset('orm', queryset),
+                Contender.from_function(
+                    'function', 'get_payments_by_product_quantity',
+                    [options['product_sku'], options['min_quantity']]
+                ),
+            ]
+
+        if case == 'stock_analysis':
+            queryset = with_positions(Stock.objects.select_related(
+                'warehouse', 'product__brand', 'product__category'
+            )).filter(
+                position_qty__gte=options['min_stock'],
+                product__is_active=True
+            ).order_by('warehouse__name', '-position_qty', 'product__name')
+            if options['warehouse_name']:
+                queryset = queryset.filter(warehouse__name__icontains=options['warehouse_name'])
+            return [
+                Contender.from_queryset('orm', queryset),
+                Contender.from_function(
+                    'function', 'get_stock_analysis',
+                    [options['warehouse_name'], options['min_stock']]
+                ),
+            ]
+
+        # top_selling: agregación sobre items, función SQL y resumen diario
+        start_date, end_date = options['start_date'], options['end_date']
+        items_filter = {'order_items__order__status': 'CONFIRMED'}
+        if start_date:
+            items_filter['order_items__order__created_at__date__gte'] = start_date
+        if end_date:
+            items_filter['order_items__order__created_at__date__lte'] = end_date
+        queryset = Product.objects.filter(is_active=True, **items_filter).values(
+            'id', 'name', 'sku', 'brand__name', 'category__name'
+        ).annotate(
+            total_quantity_sold=Sum('order_items__qty'),
+            total_orders=Count('order_items__order', distinct=True),
+            total_revenue=Sum(ExpressionWrapper(
+                F('order_items__qty') * F('order_items__unit_price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )),
+            avg_unit_price=Avg('order_items__unit_price'),
+        ).order_by('-total_quantity_sold', '-total_revenue')[:options['limit']]
+        return [
+            Contender.from_queryset('orm', queryset),
+            Contender.from_function(
+                'function', 'get_top_selling_products',
+                [options['limit'], start_date, end_date]
+            ),
+            Contender.from_queryset(
+                'summary', top_selling_queryset(start_date, end_date)[:options['limit']]
+            ),
+        ]
+
+    def measure(self, contender, options):
+        for _ in range(options['warmup']):
+            contender.run()
+
+        warm = []
+        rows = 0
+        for _ in range(options['iterations']):
+            start_time = time.perf_counter_ns()
+            rows = len(contender.run())
+            warm.append((time.perf_counter_ns() - start_time) / 1e6)
+
+        cold = []
+        for _ in range(options['cold_iterations']):
+            connection.close()
+            if connection.pool is not None:
+                # Con pool, close() solo devuelve la conexión: se recrea el pool para abrir una nueva
+                connection.close_pool()
+            connection.ensure_connection()
+            start_time = time.perf_counter_ns()
+            contender.run()
+            cold.append((time.perf_counter_ns() - start_time) / 1e6)
+
+        return {
+            'sql': contender.sql,
+            'params': contender.params,
+            'rows': rows,
+            'warm_ms': summarize(warm),
+            'cold_ms': summarize(cold),
+            'explain': self.explain(contender.sql, contender.params),
+        }
+
+    def explain(self, sql, params):
         """
-        Compara consulta: Pagos donde se facturó un producto por más de X unidades
+        Plan real con EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). Para las
+        funciones plpgsql solo se ve el Function Scan: el plan interno
+        requiere auto_explain con log_nested_statements.
         """
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\n=== COMPARACIÓN: Pagos del producto "{product_sku}" con cantidad >= {min_quantity} ==='
-            )
-        )
-        
-        # 1. CONSULTA CON DJANGO ORM
-        self.stdout.write('\n1. CONSULTA CON DJANGO ORM:')
-        
-        start_time = time.time()
-        
-        django_queryset = Payment.objects.select_related(
-            'order__customer'
-        ).prefetch_related(
-            'order__items__product'
-        ).filter(
-            order__items__product__sku=product_sku,
-            order__items__qty__gte=min_quantity,
-            status='CONFIRMED'
-        ).distinct()
-        
-        django_results = list(django_queryset)
-        django_time = time.time() - start_time
-        
-        self.stdout.write(f'SQL Generado por Django ORM:')
-        self.stdout.write(f'{str(django_queryset.query)}')
-        self.stdout.write(f'Resultados: {len(django_results)} pagos')
-        self.stdout.write(f'Tiempo de ejecución: {django_time:.4f} segundos')
-        
-        # 2. FUNCIÓN SQL DE POSTGRESQL
-        self.stdout.write('\n2. FUNCIÓN SQL DE POSTGRESQL:')
-        
-        start_time = time.time()
-        
         with connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM get_payments_by_product_quantity(%s, %s)",
-                [product_sku, min_quantity]
-            )
-            sql_results = cursor.fetchall()
-            
-        sql_time = time.time() - start_time
-        
-        self.stdout.write(f'Función SQL: get_payments_by_product_quantity()')
-        self.stdout.write(f'Resultados: {len(sql_results)} filas')
-        self.stdout.write(f'Tiempo de ejecución: {sql_time:.4f} segundos')
-        
-        # 3. ANÁLISIS DE DIFERENCIAS
-        self.stdout.write('\n3. ANÁLISIS DE DIFERENCIAS:')
-        
-        self.stdout.write(f'• Diferencia en cantidad de resultados: {len(django_results) - len(sql_results)}')
-        self.stdout.write(f'• Diferencia en tiempo: {(django_time - sql_time):.4f} segundos')
-        
-        if django_time > sql_time:
-            percentage = ((django_time - sql_time) / sql_time) * 100
-            self.stdout.write(f'• Función SQL es {percentage:.1f}% más rápida')
-        else:
-            percentage = ((sql_time - django_time) / django_time) * 100
-            self.stdout.write(f'• Django ORM es {percentage:.1f}% más rápido')
-
-    def get_query_plan(self, query):
-        """Obtiene el plan de ejecución de una consulta"""
-        with connection.cursor() as cursor:
-            cursor.execute(f"EXPLAIN ANALYZE {query}")
-            return cursor.fetchall() 
\ No newline at end of file
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def report(self, name, result):
+        plan = result['explain'][0]
+        root = plan['Plan']
+        warm, cold = result['warm_ms'], result['cold_ms']
+        self.log.write(
+            f'{name:>9}: {result["rows"]} filas | caliente p50 {warm["p50"]:.3f} ms, '
+            f'p95 {warm["p95"]:.3f} ms, p99 {warm["p99"]:.3f} ms, desv {warm["stdev"]:.3f} ms'
+            + (f' | frío p50 {cold["p50"]:.3f} ms' if cold else '')
+        )
+        self.log.write(
+            f'{"":>9}  plan: {root["Node Type"]}, planificación {plan.get("Planning Time", 0):.3f} ms, '
+            f'ejecución {plan.get("Execution Time", 0):.3f} ms, '
+            f'buffers hit {root.get("Shared Hit Blocks", 0)} / read {root.get("Shared Read Blocks", 0)}'
+        )
+
+    def parse_thresholds(self, values):
+        """'50' aplica a todos los casos; 'top_selling=20' solo a ese caso"""
+        thresholds = {}
+        for value in values:
+            case, _, limit = value.rpartition('=')
+            if case and case not in CASES:
+                raise CommandError(f'Caso desconocido en --fail-if-slower-than: {case}')
+            try:
+                thresholds[case or None] = float(limit)
+            except ValueError:
+                raise CommandError(f'Umbral inválido en --fail-if-slower-than: {value}')
+        return thresholds
+
+    def check_thresholds(self, results, thresholds):
+        failures = []
+        for case, contenders in results.items():
+            limit = thresholds.get(case, thresholds.get(None))
+            if limit is None:
+                continue
+            for name, result in contenders.items():
+                if result['warm_ms']['p95'] > limit:
+                    failures.append(f'{case}/{name}: p95 {result["warm_ms"]["p95"]:.3f} ms > {limit} ms')
+
+        if failures:
+            for failure in failures:
+                self.log.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(failures)} consultas superan el umbral')
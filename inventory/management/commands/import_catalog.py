@@ -0,0 +1,69 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory.imports import (
+    IMPORTS, IMPORT_FORMATS, DEFAULT_BATCH_SIZE, get_import_format, import_catalog
+)
+
+
+class Command(BaseCommand):
+    help = 'Importa productos o stock desde un archivo CSV/NDJSON vía COPY a tablas de staging'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kind',
+            choices=sorted(IMPORTS),
+            help='Tipo de registros del archivo'
+        )
+        parser.add_argument(
+            'path',
+            help='Archivo a importar'
+        )
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help='Formato del archivo (por defecto se infiere de la extensión)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Líneas por bloque copiado a staging'
+        )
+        parser.add_argument(
+            '--errors-file',
+            help='CSV donde escribir todas las líneas rechazadas'
+        )
+
+    def handle(self, *args, **options):
+        file_format = get_import_format(options['path'], options['format'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_catalog(
+                    options['kind'],
+                    stream,
+                    file_format=file_format,
+                    batch_size=options['batch_size'],
+                    max_errors=None if options['errors_file'] else 20
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {options["path"]}: {e}')
+
+        self.stdout.write(
+            f'{result["total"]} líneas: {result["inserted"]} insertadas, '
+            f'{result["updated"]} actualizadas, {result["error_count"]} con errores'
+        )
+        for error in result['errors'][:20]:
+            self.stdout.write(self.style.WARNING(f'  línea {error["line"]}: {error["error"]}'))
+
+        if options['errors_file'] and result['errors']:
+            with open(options['errors_file'], 'w', newline='', encoding='utf-8') as errors_file:
+                writer = csv.DictWriter(errors_file, fieldnames=['line', 'sku', 'error'])
+                writer.writeheader()
+                writer.writerows(result['errors'])
+            self.stdout.write(f'Errores guardados en {options["errors_file"]}')
+
+        if result['error_count']:
+            self.stdout.write(self.style.WARNING('Importación completada con errores'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Importación completada'))
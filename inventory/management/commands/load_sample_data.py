@@ -1,6 +1,9 @@
+import time
 from decimal import Decimal
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from inventory import datagen
+from inventory.reports import rebuild_daily_sales
 from inventory.models import (
     Brand, Category, Product, Warehouse, 
     Stock, Customer, Order, OrderItem, Payment
@@ -16,12 +19,46 @@ class Command(BaseCommand):
             action='store_true',
             help='Eliminar todos los datos existentes antes de cargar'
         )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            help='Generar un dataset sintético con esta cantidad de items de orden (COPY, solo PostgreSQL)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Semilla del generador con --scale'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Procesos generadores con --scale (por defecto, uno por CPU)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20000,
+            help='Órdenes por bloque generado con --scale'
+        )
 
     def handle(self, *args, **options):
+        if options['scale'] and connection.vendor != 'postgresql':
+            raise CommandError('--scale carga con COPY y requiere PostgreSQL')
+        if options['scale'] and not options['clear'] and datagen.has_inventory_data():
+            # Los ids del dataset son determinísticos: chocarían con los de una carga anterior
+            raise CommandError('Las tablas del inventario tienen datos: use --clear para reemplazarlos')
+
         if options['clear']:
             self.clear_data()
         
-        self.load_sample_data()
+        if options['scale']:
+            self.load_scaled_data(options)
+        else:
+            self.load_sample_data()
+        
+        # Las órdenes se cargan ya confirmadas: recalcular el resumen de ventas
+        rebuild_daily_sales()
         self.stdout.write(
             self.style.SUCCESS('Datos de prueba cargados exitosamente!')
         )
@@ -30,16 +67,27 @@ class Command(BaseCommand):
         """Elimina todos los datos existentes"""
         self.stdout.write('Eliminando datos existentes...')
         
-        # Eliminar en orden correcto (respetando dependencias)
-        Payment.objects.all().delete()
-        OrderItem.objects.all().delete()
-        Order.objects.all().delete()
-        Stock.objects.all().delete()
-        Product.objects.all().delete()
-        Customer.objects.all().delete()
-        Warehouse.objects.all().delete()
-        Category.objects.all().delete()
-        Brand.objects.all().delete()
+        # TRUNCATE de todas las tablas en una sentencia, sin el collector de cascadas del ORM
+        datagen.truncate_inventory()
+    
+    def load_scaled_data(self, options):
+        """Genera un dataset sintético en paralelo y lo carga con COPY"""
+        spec = datagen.DatasetSpec(options['scale'], seed=options['seed'])
+        self.stdout.write(f'Generando dataset {spec.as_dict()}...')
+        start_time = time.perf_counter()
+        
+        def progress(kind, done, total):
+            self.stdout.write(f'  {kind}: {done}/{total} ({time.perf_counter() - start_time:.1f} s)')
+        
+        datagen.copy_dataset(
+            spec,
+            workers=options['workers'],
+            order_chunk=options['chunk_size'],
+            progress=progress
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Dataset cargado en {time.perf_counter() - start_time:.1f} s')
+        )
 
     @transaction.atomic
     def load_sample_data(self):
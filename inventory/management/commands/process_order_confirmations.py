@@ -0,0 +1,67 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from inventory.confirmations import DEFAULT_BATCH_SIZE, process_confirmation_batch
+
+
+logger = logging.getLogger(__name__)
+
+# Espera máxima entre reintentos cuando un lote falla
+MAX_BACKOFF_SECONDS = 30
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de confirmaciones de órdenes por lotes (FOR UPDATE SKIP LOCKED)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Solicitudes confirmadas por transacción'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='Segundos de espera cuando la cola está vacía'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Vaciar la cola una vez y terminar'
+        )
+
+    def handle(self, *args, **options):
+        failures = 0
+        while True:
+            try:
+                result = process_confirmation_batch(options['batch_size'])
+            except Exception:
+                if options['once']:
+                    raise
+                # La transacción del lote se revirtió: sus solicitudes siguen
+                # en cola. Se descarta la conexión (puede haber quedado rota)
+                # y se reintenta con espera exponencial.
+                delay = min(max(options['interval'], 1) * 2 ** failures, MAX_BACKOFF_SECONDS)
+                failures += 1
+                logger.exception('Error procesando un lote de confirmaciones; reintento en %.1f s', delay)
+                connections.close_all()
+                time.sleep(delay)
+                continue
+            failures = 0
+
+            processed = result['confirmed'] + result['rejected']
+            if processed:
+                self.stdout.write(
+                    f'Lote: {result["confirmed"]} confirmadas, {result["rejected"]} rechazadas'
+                )
+                continue
+
+            if options['once']:
+                return
+            # Cola vacía: no retener una conexión del pool mientras se espera
+            connections.close_all()
+            time.sleep(options['interval'])
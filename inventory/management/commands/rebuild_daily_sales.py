@@ -0,0 +1,77 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from inventory.reports import get_top_selling_products, rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen de ventas diarias por producto y lo verifica contra get_top_selling_products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            help='Primer día a reconstruir (YYYY-MM-DD); por defecto toda la tabla'
+        )
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            help='Último día a reconstruir (YYYY-MM-DD, inclusive)'
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Comparar el top del resumen con la función SQL sin reconstruir'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Productos del top comparados con --verify'
+        )
+
+    def handle(self, *args, **options):
+        start_date, end_date = options['start_date'], options['end_date']
+
+        if options['verify']:
+            self.verify(options['limit'], start_date, end_date)
+            return
+
+        start_time = time.perf_counter()
+        rows = rebuild_daily_sales(start_date, end_date)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{rows} filas de resumen generadas en {time.perf_counter() - start_time:.2f} s'
+            )
+        )
+
+    def verify(self, limit, start_date, end_date):
+        """Falla si el top del resumen no coincide con el de la función SQL"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT product_id, total_quantity_sold, total_orders, total_revenue '
+                'FROM get_top_selling_products(%s, %s, %s)',
+                [limit, start_date, end_date]
+            )
+            expected = [tuple(row) for row in cursor.fetchall()]
+
+        actual = [
+            (row['product_id'], row['total_quantity_sold'], row['total_orders'], row['total_revenue'])
+            for row in get_top_selling_products(limit, start_date, end_date)
+        ]
+
+        # Los empates pueden salir en distinto orden: se comparan como conjuntos
+        mismatches = set(expected) ^ set(actual)
+        if mismatches:
+            for product_id, quantity, orders, revenue in sorted(mismatches, key=str):
+                self.stdout.write(
+                    self.style.ERROR(f'  {product_id}: {quantity} unidades, {orders} órdenes, {revenue}')
+                )
+            raise CommandError(
+                f'El resumen difiere de get_top_selling_products en {len(mismatches)} filas '
+                '(ejecute rebuild_daily_sales)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Top {len(actual)} coincide con get_top_selling_products'))
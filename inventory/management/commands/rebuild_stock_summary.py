@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory.reports import rebuild_stock_summary, stock_summary_mismatches
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen de stock por producto o lo verifica contra inventory_stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Comparar el resumen con la suma de las filas de stock sin reconstruir'
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+            return
+
+        start_time = time.perf_counter()
+        rows = rebuild_stock_summary()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{rows} filas de resumen generadas en {time.perf_counter() - start_time:.2f} s'
+            )
+        )
+
+    def verify(self):
+        """Falla si algún producto tiene totales distintos a los de sus filas de stock"""
+        mismatches = stock_summary_mismatches()
+        if mismatches:
+            for product_id, (expected, actual) in sorted(mismatches.items(), key=str):
+                self.stdout.write(self.style.ERROR(f'  {product_id}: esperado {expected}, resumen {actual}'))
+            raise CommandError(
+                f'El resumen de stock difiere en {len(mismatches)} productos (ejecute rebuild_stock_summary)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('El resumen de stock coincide con inventory_stock'))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o verifica los totales desnormalizados de las órdenes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Solo verificar consistencia, sin modificar datos'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Órdenes recalculadas por sentencia UPDATE'
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=10,
+            help='Cantidad de órdenes inconsistentes a listar'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_totals(options['show'])
+        else:
+            self.backfill(options['batch_size'])
+
+    def backfill(self, batch_size):
+        """Recalcula los totales de todas las órdenes por lotes de ids"""
+        self.stdout.write('Recalculando totales de órdenes...')
+
+        total = 0
+        last_id = None
+        while True:
+            batch = Order.objects.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            ids = list(batch.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            total += Order.objects.filter(id__in=ids).recalculate_totals()
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Totales recalculados para {total} órdenes'))
+
+    def check_totals(self, show):
+        """Reporta las órdenes cuyos totales no coinciden con sus items"""
+        inconsistent = Order.objects.order_by().with_inconsistent_totals()
+        count = inconsistent.count()
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS('✓ Todos los totales de órdenes son consistentes'))
+            return
+
+        for order in inconsistent[:show]:
+            self.stdout.write(
+                f'  - Orden {order.id}: almacenado {order.total_amount} / {order.total_items} items, '
+                f'real {order.computed_amount} / {order.computed_items} items'
+            )
+        raise CommandError(
+            f'{count} órdenes con totales inconsistentes (ejecute sync_order_totals para corregir)'
+        )
@@ -0,0 +1,191 @@
+"""
+Métricas por ruta en memoria del proceso, expuestas en formato de texto Prometheus
+"""
+import threading
+from collections import defaultdict
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def render(self, name, labels):
+        lines = [
+            f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RouteMetrics:
+    """Métricas acumuladas de una ruta (vista + método HTTP)"""
+
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.serialize_time = Histogram(LATENCY_BUCKETS)
+        self.render_time = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.n_plus_one = 0
+        self.responses = defaultdict(int)
+
+
+# (nombre, ayuda, atributo de RouteMetrics)
+ROUTE_HISTOGRAMS = (
+    ('inventory_http_request_duration_seconds', 'Duración total de la petición', 'duration'),
+    ('inventory_http_request_db_seconds', 'Tiempo en base de datos por petición', 'db_time'),
+    ('inventory_http_request_serialize_seconds', 'Tiempo de vista fuera de la base de datos', 'serialize_time'),
+    ('inventory_http_request_render_seconds', 'Tiempo de renderizado de la respuesta', 'render_time'),
+    ('inventory_http_request_queries', 'Consultas SQL por petición', 'queries'),
+)
+
+
+class MetricsRegistry:
+    """Registro thread-safe de métricas por ruta y de colectores adicionales"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(RouteMetrics)
+        self._collectors = []
+
+    def register_collector(self, collector):
+        """Agrega una función que retorna líneas extra en formato Prometheus"""
+        self._collectors.append(collector)
+        return collector
+
+    def observe(self, view, method, status_code, duration, db_time, queries,
+                serialize_time, render_time, n_plus_one):
+        with self._lock:
+            route = self._routes[(view, method)]
+            route.duration.observe(duration)
+            route.db_time.observe(db_time)
+            route.queries.observe(queries)
+            route.serialize_time.observe(serialize_time)
+            route.render_time.observe(render_time)
+            route.n_plus_one += n_plus_one
+            route.responses[status_code] += 1
+
+    def render(self):
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+
+            for name, help_text, attr in ROUTE_HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (view, method), route in routes:
+                    labels = f'view="{view}",method="{method}"'
+                    lines.extend(getattr(route, attr).render(name, labels))
+
+            lines.append('# HELP inventory_http_n_plus_one_total Sentencias repetidas sospechosas de N+1')
+            lines.append('# TYPE inventory_http_n_plus_one_total counter')
+            for (view, method), route in routes:
+                lines.append(
+                    f'inventory_http_n_plus_one_total{{view="{view}",method="{method}"}} {route.n_plus_one}'
+                )
+
+            lines.append('# HELP inventory_http_responses_total Respuestas por código de estado')
+            lines.append('# TYPE inventory_http_responses_total counter')
+            for (view, method), route in routes:
+                for status_code, count in sorted(route.responses.items()):
+                    lines.append(
+                        f'inventory_http_responses_total{{view="{view}",method="{method}",'
+                        f'status="{status_code}"}} {count}'
+                    )
+
+        for collector in self._collectors:
+            lines.extend(collector())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+@registry.register_collector
+def plan_cache_metrics():
+    """Estadísticas del LRU de planes de get_related"""
+    from .query_plans import plan_cache
+
+    stats = plan_cache.stats()
+    return [
+        '# TYPE inventory_get_related_plan_cache_hits_total counter',
+        f'inventory_get_related_plan_cache_hits_total {stats["hits"]}',
+        '# TYPE inventory_get_related_plan_cache_misses_total counter',
+        f'inventory_get_related_plan_cache_misses_total {stats["misses"]}',
+        '# TYPE inventory_get_related_plan_cache_evictions_total counter',
+        f'inventory_get_related_plan_cache_evictions_total {stats["evictions"]}',
+        '# TYPE inventory_get_related_plan_cache_size gauge',
+        f'inventory_get_related_plan_cache_size {stats["size"]}',
+    ]
+
+
+# (métrica, tipo, clave de psycopg_pool get_stats(), divisor, ayuda)
+DB_POOL_STATS = (
+    ('inventory_db_pool_size', 'gauge', 'pool_size', 1, 'Conexiones abiertas por el pool'),
+    ('inventory_db_pool_available', 'gauge', 'pool_available', 1, 'Conexiones libres en el pool'),
+    ('inventory_db_pool_max', 'gauge', 'pool_max', 1, 'Tamaño máximo del pool'),
+    ('inventory_db_pool_requests_waiting', 'gauge', 'requests_waiting', 1, 'Peticiones esperando una conexión'),
+    ('inventory_db_pool_checkouts_total', 'counter', 'requests_num', 1, 'Conexiones entregadas por el pool'),
+    ('inventory_db_pool_checkouts_queued_total', 'counter', 'requests_queued', 1,
+     'Entregas que tuvieron que esperar una conexión libre'),
+    ('inventory_db_pool_wait_seconds_total', 'counter', 'requests_wait_ms', 1000,
+     'Tiempo total esperando una conexión'),
+    ('inventory_db_pool_checkout_errors_total', 'counter', 'requests_errors', 1,
+     'Entregas fallidas (timeout o pool cerrado)'),
+    ('inventory_db_pool_usage_seconds_total', 'counter', 'usage_ms', 1000,
+     'Tiempo total con conexiones prestadas'),
+    ('inventory_db_pool_connections_opened_total', 'counter', 'connections_num', 1,
+     'Conexiones nuevas abiertas contra PostgreSQL'),
+    ('inventory_db_pool_connections_lost_total', 'counter', 'connections_lost', 1,
+     'Conexiones descartadas por el health check'),
+)
+
+
+@registry.register_collector
+def db_pool_metrics():
+    """Estado del pool de conexiones de psycopg de cada base de datos (por proceso)"""
+    from django.db import connections
+
+    pools = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            pools[alias] = pool.get_stats()
+    if not pools:
+        return []
+
+    lines = []
+    for name, metric_type, key, divisor, help_text in DB_POOL_STATS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for alias, stats in pools.items():
+            # get_stats() omite los contadores que siguen en cero
+            value = stats.get(key, 0)
+            lines.append(f'{name}{{database="{alias}"}} {value / divisor if divisor != 1 else value}')
+
+    lines.append('# HELP inventory_db_pool_utilization Fracción del pool en uso')
+    lines.append('# TYPE inventory_db_pool_utilization gauge')
+    for alias, stats in pools.items():
+        in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+        lines.append(f'inventory_db_pool_utilization{{database="{alias}"}} {in_use / stats["pool_max"]:.3f}')
+    return lines
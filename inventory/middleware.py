@@ -0,0 +1,225 @@
+"""
+Instrumentación por petición: consultas SQL, tiempos y detector de N+1
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Listas de parámetros de largo variable (IN (%s, %s, ...)) colapsadas a un solo marcador
+PLACEHOLDER_LIST_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def fingerprint(sql):
+    """Huella de una sentencia: el SQL con parámetros, normalizado"""
+    return PLACEHOLDER_LIST_RE.sub('%s, ...', sql)
+
+
+_current_tracker = ContextVar('inventory_query_tracker', default=None)
+
+
+def _dispatch(execute, sql, params, many, context):
+    """execute_wrapper permanente de cada conexión: delega en el tracker de la petición actual"""
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+def install_dispatcher(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install_dispatcher(connection)
+
+
+@receiver(request_started)
+def _install_on_request(sender, **kwargs):
+    # Bajo ASGI la señal se envía desde el hilo del ORM, el que usa las conexiones
+    for connection in connections.all(initialized_only=True):
+        install_dispatcher(connection)
+
+
+class QueryTracker:
+    """execute_wrapper que cuenta consultas, tiempo en BD y sentencias repetidas"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @contextmanager
+    def track(self):
+        """
+        Activa el tracker en el contexto actual. Bajo ASGI las consultas
+        corren en el hilo compartido del ORM, con conexiones de ese hilo: el
+        tracker viaja en una ContextVar que asgiref propaga a ese hilo.
+        """
+        for connection in connections.all(initialized_only=True):
+            install_dispatcher(connection)
+        token = _current_tracker.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracker.reset(token)
+
+    def repeated(self, threshold):
+        """Sentencias ejecutadas al menos threshold veces (candidatas a N+1)"""
+        return {sql: count for sql, count in self.fingerprints.items() if count >= threshold}
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Registra por petición el número de consultas, el tiempo en BD, las
+    sentencias repetidas, el tiempo de vista fuera de la BD (principalmente
+    serialización) y el de renderizado. Los expone en el header Server-Timing
+    y los agrega por ruta en el registro servido en /metrics.
+    """
+
+    # Bajo ASGI un middleware solo síncrono haría pasar cada petición por un hilo
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_INSTRUMENTATION_ENABLED', True)
+        self.n_plus_one_threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        tracker = QueryTracker()
+        request._instrumentation = {'tracker': tracker}
+        start = time.perf_counter()
+
+        with tracker.track():
+            response = self.get_response(request)
+        return self._finish(request, response, tracker, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        tracker = QueryTracker()
+        request._instrumentation = {'tracker': tracker}
+        start = time.perf_counter()
+
+        # Las conexiones son locales al contexto de la petición, también en el hilo del ORM async
+        with tracker.track():
+            response = await self.get_response(request)
+        return self._finish(request, response, tracker, start)
+
+    def _finish(self, request, response, tracker, start):
+        if response.streaming and not response.is_async:
+            # Las consultas del streaming ocurren al iterar el contenido
+            response.streaming_content = self._track_stream(
+                request, response, tracker, start, response.streaming_content
+            )
+            self._add_server_timing(request, response, tracker, time.perf_counter() - start)
+            return response
+
+        duration = time.perf_counter() - start
+        self._add_server_timing(request, response, tracker, duration)
+        self._observe(request, response, tracker, duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_instrumentation'):
+            state = request._instrumentation
+            state['view_start'] = time.perf_counter()
+            state['view_db_start'] = state['tracker'].db_time
+
+    def process_template_response(self, request, response):
+        # Las respuestas de DRF se renderizan después de la vista
+        if hasattr(request, '_instrumentation'):
+            state = request._instrumentation
+            state['view_end'] = time.perf_counter()
+            state['view_db_end'] = state['tracker'].db_time
+            response.add_post_render_callback(
+                lambda rendered: state.update(render_end=time.perf_counter())
+            )
+        return response
+
+    def _phases(self, request, tracker):
+        """Tiempos de vista fuera de la BD y de renderizado"""
+        state = request._instrumentation
+        if 'view_start' not in state:
+            return 0.0, 0.0
+
+        view_end = state.get('view_end', time.perf_counter())
+        view_db = state.get('view_db_end', tracker.db_time) - state['view_db_start']
+        serialize_time = max(0.0, view_end - state['view_start'] - view_db)
+        render_time = state['render_end'] - view_end if 'render_end' in state else 0.0
+        return serialize_time, render_time
+
+    def _add_server_timing(self, request, response, tracker, duration):
+        serialize_time, render_time = self._phases(request, tracker)
+        repeated = tracker.repeated(self.n_plus_one_threshold)
+        metrics = [
+            f'db;dur={tracker.db_time * 1000:.2f};desc="{tracker.count} queries"',
+            f'serialize;dur={serialize_time * 1000:.2f}',
+            f'render;dur={render_time * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ]
+        if repeated:
+            metrics.append(f'n-plus-one;desc="{len(repeated)} repeated statements"')
+        response['Server-Timing'] = ', '.join(metrics)
+
+    def _observe(self, request, response, tracker, duration):
+        serialize_time, render_time = self._phases(request, tracker)
+        repeated = tracker.repeated(self.n_plus_one_threshold)
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else 'unmatched'
+
+        if repeated:
+            sql, count = max(repeated.items(), key=lambda item: item[1])
+            logger.warning(
+                "Posible N+1 en %s %s: %s ejecutada %s veces", request.method, view, sql, count
+            )
+
+        registry.observe(
+            view=view,
+            method=request.method,
+            status_code=response.status_code,
+            duration=duration,
+            db_time=tracker.db_time,
+            queries=tracker.count,
+            serialize_time=serialize_time,
+            render_time=render_time,
+            n_plus_one=len(repeated),
+        )
+
+    def _track_stream(self, request, response, tracker, start, content):
+        with tracker.track():
+            yield from content
+        self._observe(request, response, tracker, time.perf_counter() - start)
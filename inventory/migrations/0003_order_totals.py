@@ -0,0 +1,43 @@
+from decimal import Decimal
+from django.db import migrations, models
+
+
+BACKFILL_ORDER_TOTALS_SQL = """
+UPDATE inventory_order o
+SET
+    total_amount = t.total_amount,
+    total_items = t.total_items
+FROM (
+    SELECT
+        order_id,
+        SUM(qty * unit_price) AS total_amount,
+        SUM(qty) AS total_items
+    FROM inventory_orderitem
+    GROUP BY order_id
+) t
+WHERE o.id = t.order_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_create_sql_functions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            sql=BACKFILL_ORDER_TOTALS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_order_totals'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='inventory_p_created_0bd134_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stock',
+            name='inventory_s_updated_1e6d45_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='inventory_o_created_9f0ff5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['created_at', 'id'], name='inventory_o_created_65edc4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at', 'id'], name='inventory_p_created_c0017f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['updated_at', 'id'], name='inventory_s_updated_deee56_idx'),
+        ),
+    ]
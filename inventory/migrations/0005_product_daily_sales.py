@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:44
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from decimal import Decimal
+from django.db import migrations, models
+from inventory.sql_functions import GET_TOP_SELLING_PRODUCTS_SQL
+
+
+BACKFILL_PRODUCT_DAILY_SALES_SQL = """
+INSERT INTO inventory_productdailysales
+    (id, created_at, product_id, day, quantity_sold, order_count, revenue, unit_price_sum)
+SELECT
+    gen_random_uuid(), now(), oi.product_id, o.created_at::DATE,
+    SUM(oi.qty), COUNT(DISTINCT o.id), SUM(oi.qty * oi.unit_price), SUM(oi.unit_price)
+FROM inventory_orderitem oi
+INNER JOIN inventory_order o ON o.id = oi.order_id
+WHERE o.status = 'CONFIRMED'
+GROUP BY oi.product_id, o.created_at::DATE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('day', models.DateField()),
+                ('quantity_sold', models.BigIntegerField(default=0)),
+                ('order_count', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('unit_price_sum', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Ventas Diarias de Producto',
+                'verbose_name_plural': 'Ventas Diarias de Productos',
+                'indexes': [models.Index(fields=['day', 'product'], name='inventory_p_day_d5b710_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_day_sales')],
+            },
+        ),
+        migrations.RunSQL(
+            sql=BACKFILL_PRODUCT_DAILY_SALES_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Filtro de fechas por rango (sargable) en lugar de created_at::DATE
+        migrations.RunSQL(
+            sql=GET_TOP_SELLING_PRODUCTS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:46
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from inventory.sql_functions import (
+    GET_PRODUCTS_BY_BRAND_AND_CUSTOMER_SQL,
+    GET_STOCK_ANALYSIS_SQL,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_product_daily_sales'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='brand',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='brand_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='product_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('sku'), name='gin_trgm_ops'), name='product_sku_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='warehouse',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='warehouse_name_trgm'),
+        ),
+        # Filtros por nombre con UPPER(...) LIKE en lugar de ILIKE para usar los índices
+        migrations.RunSQL(
+            sql=GET_PRODUCTS_BY_BRAND_AND_CUSTOMER_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql=GET_STOCK_ANALYSIS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
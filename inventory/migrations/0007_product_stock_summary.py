@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:51
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+from inventory.sql_functions import DROP_STOCK_SUMMARY_TRIGGERS_SQL, STOCK_SUMMARY_TRIGGERS_SQL
+
+
+# Antes del libro de movimientos (0008) la foto de stock es la posición completa
+BACKFILL_STOCK_SUMMARY_SQL = """
+INSERT INTO inventory_productstocksummary
+    (id, created_at, updated_at, product_id, total_qty, total_reserved, warehouse_count)
+SELECT
+    gen_random_uuid(), now(), now(), product_id,
+    SUM(qty), SUM(reserved), COUNT(*) FILTER (WHERE qty > 0)
+FROM inventory_stock
+GROUP BY product_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStockSummary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('total_qty', models.BigIntegerField(default=0)),
+                ('total_reserved', models.BigIntegerField(default=0)),
+                ('warehouse_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summary', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Stock',
+                'verbose_name_plural': 'Resúmenes de Stock',
+                'indexes': [models.Index(fields=['total_qty', 'product'], name='inventory_p_total_q_e653fd_idx')],
+            },
+        ),
+        migrations.RunSQL(
+            sql=STOCK_SUMMARY_TRIGGERS_SQL,
+            reverse_sql=DROP_STOCK_SUMMARY_TRIGGERS_SQL,
+        ),
+        # Backfill con el stock existente
+        migrations.RunSQL(
+            sql=BACKFILL_STOCK_SUMMARY_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:05
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_product_stock_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('kind', models.CharField(choices=[('RECEIPT', 'Recepción'), ('RESERVATION', 'Reserva'), ('RELEASE', 'Liberación'), ('SHIPMENT', 'Despacho'), ('ADJUSTMENT', 'Ajuste')], max_length=20)),
+                ('qty_delta', models.IntegerField(default=0)),
+                ('reserved_delta', models.IntegerField(default=0)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('compacted_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.warehouse')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock',
+                'verbose_name_plural': 'Movimientos de Stock',
+                'indexes': [models.Index(fields=['product', 'created_at'], name='inventory_s_product_5919a9_idx'), models.Index(condition=models.Q(('compacted_at__isnull', True)), fields=['product', 'warehouse'], name='stockmovement_pending_idx'), models.Index(fields=['created_at', 'id'], name='inventory_s_created_36aee8_idx')],
+            },
+        ),
+    ]
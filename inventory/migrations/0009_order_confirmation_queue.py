@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:08
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stock_movement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderConfirmation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status', models.CharField(choices=[('QUEUED', 'En cola'), ('CONFIRMED', 'Confirmada'), ('REJECTED', 'Rechazada')], default='QUEUED', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='confirmations', to='inventory.order')),
+            ],
+            options={
+                'verbose_name': 'Confirmación de Orden',
+                'verbose_name_plural': 'Confirmaciones de Órdenes',
+                'indexes': [models.Index(condition=models.Q(('status', 'QUEUED')), fields=['created_at'], name='orderconfirmation_queue_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'QUEUED')), fields=('order',), name='unique_queued_order_confirmation')],
+            },
+        ),
+    ]
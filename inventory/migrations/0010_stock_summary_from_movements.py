@@ -0,0 +1,50 @@
+from django.db import migrations
+from inventory.sql_functions import (
+    DROP_STOCK_MOVEMENT_SUMMARY_TRIGGERS_SQL,
+    GET_STOCK_ANALYSIS_SQL,
+    REBUILD_STOCK_SUMMARY_SQL,
+    STOCK_MOVEMENT_SUMMARY_TRIGGERS_SQL,
+    STOCK_SUMMARY_TRIGGERS_SQL,
+)
+
+
+# Fila de foto en cero para las posiciones que hasta ahora solo tenían movimientos
+BACKFILL_STOCK_POSITIONS_SQL = """
+INSERT INTO inventory_stock (id, created_at, updated_at, qty, reserved, product_id, warehouse_id)
+SELECT gen_random_uuid(), now(), now(), 0, 0, product_id, warehouse_id
+FROM (SELECT DISTINCT product_id, warehouse_id FROM inventory_stockmovement) positions
+ON CONFLICT ON CONSTRAINT unique_product_warehouse_stock DO NOTHING;
+"""
+
+
+# El resumen de stock y get_stock_analysis pasan a leer la posición actual
+# (foto + movimientos pendientes) en lugar de solo la foto compactada
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_order_confirmation_queue'),
+    ]
+
+    operations = [
+        # Los triggers de inventory_stock ignoran la compactación
+        migrations.RunSQL(
+            sql=STOCK_SUMMARY_TRIGGERS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql=BACKFILL_STOCK_POSITIONS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql=STOCK_MOVEMENT_SUMMARY_TRIGGERS_SQL,
+            reverse_sql=DROP_STOCK_MOVEMENT_SUMMARY_TRIGGERS_SQL,
+        ),
+        migrations.RunSQL(
+            sql=REBUILD_STOCK_SUMMARY_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql=GET_STOCK_ANALYSIS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
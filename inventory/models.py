@@ -1,10 +1,22 @@
 import uuid
 from decimal import Decimal
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Upper
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
 
+def trigram_index(field, name):
+    """
+    Índice GIN de trigramas sobre UPPER(campo): es la expresión que Django
+    genera para __icontains (UPPER(campo::text) LIKE UPPER('%...%')), así que
+    los filtros icontains, la búsqueda del admin y get_related lo usan.
+    """
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name)
+
+
 class BaseModel(models.Model):
     """Modelo base con campos comunes"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -23,6 +35,9 @@ class Brand(BaseModel):
         verbose_name = "Marca"
         verbose_name_plural = "Marcas"
         ordering = ['name']
+        indexes = [
+            trigram_index('name', 'brand_name_trgm'),
+        ]
     
     def __str__(self):
         return self.name
@@ -72,6 +87,8 @@ class Product(BaseModel):
         indexes = [
             models.Index(fields=['sku']),
             models.Index(fields=['brand', 'category']),
+            trigram_index('name', 'product_name_trgm'),
+            trigram_index('sku', 'product_sku_trgm'),
         ]
     
     def __str__(self):
@@ -87,6 +104,9 @@ class Warehouse(BaseModel):
         verbose_name = "Bodega"
         verbose_name_plural = "Bodegas"
         ordering = ['city', 'name']
+        indexes = [
+            trigram_index('name', 'warehouse_name_trgm'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.city}"
@@ -131,7 +151,7 @@ class Stock(BaseModel):
         ]
         indexes = [
             models.Index(fields=['product', 'warehouse']),
-            models.Index(fields=['updated_at']),
+            models.Index(fields=['updated_at', 'id']),
         ]
     
     def __str__(self):
@@ -143,6 +163,103 @@ class Stock(BaseModel):
         return self.qty - self.reserved
 
 
+class ProductStockSummary(BaseModel):
+    """
+    Totales de stock por producto sobre la posición actual (foto + movimientos
+    pendientes). Los mantienen los triggers de inventory_stock y de
+    inventory_stockmovement (ver sql_functions.py) en la misma transacción
+    que cada escritura, incluidas las de SQL crudo y COPY.
+    """
+    
+    total_qty = models.BigIntegerField(default=0)
+    total_reserved = models.BigIntegerField(default=0)
+    # Bodegas con existencias (qty > 0)
+    warehouse_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Relaciones
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_summary'
+    )
+    
+    class Meta:
+        verbose_name = "Resumen de Stock"
+        verbose_name_plural = "Resúmenes de Stock"
+        indexes = [
+            # Umbral de stock bajo como rango sobre el índice
+            models.Index(fields=['total_qty', 'product']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.total_qty}"
+    
+    @property
+    def available_qty(self):
+        """Cantidad disponible (no reservada) en todas las bodegas"""
+        return self.total_qty - self.total_reserved
+
+
+class StockMovement(BaseModel):
+    """
+    Movimiento del libro de stock (append-only). inventory_stock es la foto
+    compactada: los movimientos con compacted_at nulo aún no están sumados
+    a ella (ver ledger.py).
+    """
+    
+    KIND_CHOICES = [
+        ('RECEIPT', 'Recepción'),
+        ('RESERVATION', 'Reserva'),
+        ('RELEASE', 'Liberación'),
+        ('SHIPMENT', 'Despacho'),
+        ('ADJUSTMENT', 'Ajuste'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    qty_delta = models.IntegerField(default=0)
+    reserved_delta = models.IntegerField(default=0)
+    note = models.CharField(max_length=200, blank=True)
+    compacted_at = models.DateTimeField(null=True, blank=True)
+    
+    # Relaciones
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_movements'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='stock_movements'
+    )
+    order = models.ForeignKey(
+        'Order',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_movements'
+    )
+    
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+        indexes = [
+            # Historial y disponibilidad a una fecha
+            models.Index(fields=['product', 'created_at']),
+            # Movimientos pendientes de compactar, por posición
+            models.Index(
+                fields=['product', 'warehouse'],
+                condition=models.Q(compacted_at__isnull=True),
+                name='stockmovement_pending_idx'
+            ),
+            models.Index(fields=['created_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.product_id} @ {self.warehouse_id}: {self.qty_delta}/{self.reserved_delta}"
+
+
 class Customer(BaseModel):
     """Modelo para los clientes"""
     full_name = models.CharField(max_length=200)
@@ -160,6 +277,40 @@ class Customer(BaseModel):
         return f"{self.full_name} ({self.email})"
 
 
+class OrderQuerySet(models.QuerySet):
+    """QuerySet de órdenes con mantenimiento de los totales desnormalizados"""
+    
+    def _items_totals(self):
+        """Subconsultas con los totales reales calculados desde los items"""
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        amount = items.annotate(
+            total=Sum(F('qty') * F('unit_price'), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        ).values('total')
+        qty = items.annotate(total=Sum('qty')).values('total')
+        return {
+            'computed_amount': Coalesce(
+                Subquery(amount), Decimal('0.00'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2)
+            ),
+            'computed_items': Coalesce(Subquery(qty), 0),
+        }
+    
+    def recalculate_totals(self):
+        """Recalcula total_amount y total_items con una sola sentencia UPDATE"""
+        totals = self._items_totals()
+        return self.update(
+            total_amount=totals['computed_amount'],
+            total_items=totals['computed_items'],
+        )
+    
+    def with_inconsistent_totals(self):
+        """Órdenes cuyos totales almacenados no coinciden con sus items"""
+        return self.annotate(**self._items_totals()).exclude(
+            total_amount=F('computed_amount'),
+            total_items=F('computed_items'),
+        )
+
+
 class Order(BaseModel):
     """Modelo para las órdenes de compra"""
     
@@ -175,6 +326,15 @@ class Order(BaseModel):
         default='PENDING'
     )
     
+    # Totales desnormalizados, mantenidos al escribir OrderItem (ver signals.py)
+    total_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    total_items = models.PositiveIntegerField(default=0, editable=False)
+    
     # Relaciones
     customer = models.ForeignKey(
         Customer, 
@@ -182,6 +342,8 @@ class Order(BaseModel):
         related_name='orders'
     )
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Orden"
         verbose_name_plural = "Órdenes"
@@ -189,20 +351,17 @@ class Order(BaseModel):
         indexes = [
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['customer', 'status']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"Orden {self.id} - {self.customer.full_name}"
     
-    @property
-    def total_amount(self):
-        """Calcula el monto total de la orden"""
-        return sum(item.total_price for item in self.items.all())
-    
-    @property
-    def total_items(self):
-        """Calcula el total de items en la orden"""
-        return sum(item.qty for item in self.items.all())
+    def update_totals(self):
+        """Recalcula los totales almacenados de la orden desde sus items"""
+        updated = Order.objects.filter(pk=self.pk).recalculate_totals()
+        if updated:
+            self.refresh_from_db(fields=['total_amount', 'total_items'])
 
 
 class OrderItem(BaseModel):
@@ -237,6 +396,7 @@ class OrderItem(BaseModel):
         ]
         indexes = [
             models.Index(fields=['order', 'product']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
@@ -294,8 +454,93 @@ class Payment(BaseModel):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'method']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Pago {self.method} - ${self.amount} - Orden {self.order.id}" 
+
+class ProductDailySales(BaseModel):
+    """Ventas confirmadas por producto y día, mantenidas al confirmar órdenes (ver reports.py)"""
+    
+    day = models.DateField()
+    quantity_sold = models.BigIntegerField(default=0)
+    order_count = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    # Suma de precios unitarios, para calcular el precio promedio de cualquier rango
+    unit_price_sum = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    # Relaciones
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+    
+    class Meta:
+        verbose_name = "Ventas Diarias de Producto"
+        verbose_name_plural = "Ventas Diarias de Productos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'day'],
+                name='unique_product_day_sales'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['day', 'product']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} {self.day}: {self.quantity_sold}"
+
+
+class OrderConfirmation(BaseModel):
+    """
+    Solicitud de confirmación asíncrona de una orden. La cola es la propia
+    tabla: el worker toma lotes QUEUED con FOR UPDATE SKIP LOCKED (ver
+    confirmations.py).
+    """
+    
+    STATUS_CHOICES = [
+        ('QUEUED', 'En cola'),
+        ('CONFIRMED', 'Confirmada'),
+        ('REJECTED', 'Rechazada'),
+    ]
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='QUEUED'
+    )
+    error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    # Relaciones
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='confirmations'
+    )
+    
+    class Meta:
+        verbose_name = "Confirmación de Orden"
+        verbose_name_plural = "Confirmaciones de Órdenes"
+        constraints = [
+            # Una orden no se encola dos veces mientras espera
+            models.UniqueConstraint(
+                fields=['order'],
+                condition=models.Q(status='QUEUED'),
+                name='unique_queued_order_confirmation'
+            )
+        ]
+        indexes = [
+            # Orden de llegada de la cola
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='QUEUED'),
+                name='orderconfirmation_queue_idx'
+            ),
         ]
     
     def __str__(self):
-        return f"Pago {self.method} - ${self.amount} - Orden {self.order.id}" 
\ No newline at end of file
+        return f"Confirmación {self.order_id}: {self.status}"
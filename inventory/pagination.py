@@ -0,0 +1,122 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.utils.urls import remove_query_param
+
+
+def keyset_filter(ordering, values):
+    """Filas posteriores a la posición values según ordering (comparación de tuplas)"""
+    condition = Q()
+    for index, field in enumerate(ordering):
+        equal = {name.lstrip('-'): value for name, value in zip(ordering[:index], values)}
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{field.lstrip("-")}__{lookup}': values[index]})
+
+    # Cota redundante sobre la primera columna: permite un range scan del índice
+    first = ordering[0].lstrip('-')
+    bound = 'lte' if ordering[0].startswith('-') else 'gte'
+    return Q(**{f'{first}__{bound}': values[0]}) & condition
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Paginación por cursor con keyset compuesto: el cursor guarda los valores
+    de todas las columnas de ordering (la última debe ser única) y la página
+    siguiente se filtra por comparación de tuplas. A diferencia de
+    CursorPagination, los empates en la primera columna no se resuelven con
+    OFFSET, que DRF limita a offset_cutoff y repite páginas pasado ese límite.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [_invert(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        try:
+            if self.cursor is not None:
+                queryset = queryset.filter(keyset_filter(ordering, self.cursor.position))
+            results = list(queryset[:self.page_size + 1])
+        except (ValidationError, ValueError, TypeError):
+            # Valores del cursor que no corresponden al tipo de las columnas
+            raise NotFound(self.invalid_cursor_message)
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Página vacía al retroceder: se vuelve al inicio
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    def _position(self, instance):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            values.append(instance[name] if isinstance(instance, dict) else getattr(instance, name))
+        # str conserva los microsegundos de los datetime
+        return json.dumps(values, default=str)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            position = json.loads(cursor.position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """
+    Paginación por cursor (keyset) sobre (created_at, id): el cursor guarda
+    ambos valores y la página siguiente se filtra con
+    (created_at, id) < (%s, %s). No ejecuta COUNT(*) ni OFFSET, por lo que
+    el costo de una página no depende de su profundidad ni de cuántas filas
+    comparten created_at; se apoya en el índice (created_at, id).
+    """
+    ordering = ('-created_at', '-id')
+
+
+class UpdatedAtCursorPagination(CreatedAtCursorPagination):
+    """Paginación por cursor sobre (updated_at, id) para registros que se modifican"""
+    ordering = ('-updated_at', '-id')
+
+
+class LowStockCursorPagination(KeysetCursorPagination):
+    """Paginación por cursor del resumen de stock sobre el índice (total_qty, product)"""
+    ordering = ('total_qty', 'product_id')
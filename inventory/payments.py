@@ -0,0 +1,66 @@
+"""
+Confirmación de pagos en bloque
+
+Un proveedor de pagos liquida miles de pagos a la vez: confirm_payments
+hace la transición PENDING -> CONFIRMED de todos con un único
+UPDATE ... RETURNING y clasifica el resto con una sola consulta, en lugar de
+un get_object() y un save() por pago.
+"""
+import uuid
+
+from django.db import connection, transaction
+
+from .cache import bump_tables
+from .models import Payment
+
+
+CONFIRM_PAYMENTS_SQL = """
+UPDATE inventory_payment
+SET status = 'CONFIRMED'
+WHERE id = ANY(%s::uuid[]) AND status = 'PENDING'
+RETURNING id
+"""
+
+
+def _parse_id(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def confirm_payments(payment_ids):
+    """
+    Confirma los pagos pendientes de payment_ids en una sola sentencia.
+
+    Retorna un resultado por id recibido (sin repetidos, en el orden
+    recibido): {'id', 'outcome'} con outcome 'confirmed', 'not_pending'
+    (con el estado actual en 'status'), 'not_found' o 'invalid_id'.
+    """
+    requested = list(dict.fromkeys(str(payment_id) for payment_id in payment_ids))
+    parsed = {payment_id: _parse_id(payment_id) for payment_id in requested}
+    valid_ids = [str(value) for value in parsed.values() if value is not None]
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CONFIRM_PAYMENTS_SQL, [valid_ids])
+            confirmed = {row[0] for row in cursor.fetchall()}
+        if confirmed:
+            # El UPDATE crudo no emite señales
+            bump_tables('inventory_payment')
+
+    remaining = [value for value in parsed.values() if value is not None and value not in confirmed]
+    current = dict(Payment.objects.filter(pk__in=remaining).values_list('id', 'status')) if remaining else {}
+
+    results = []
+    for payment_id in requested:
+        value = parsed[payment_id]
+        if value is None:
+            results.append({'id': payment_id, 'outcome': 'invalid_id'})
+        elif value in confirmed:
+            results.append({'id': payment_id, 'outcome': 'confirmed'})
+        elif value in current:
+            results.append({'id': payment_id, 'outcome': 'not_pending', 'status': current[value]})
+        else:
+            results.append({'id': payment_id, 'outcome': 'not_found'})
+    return results
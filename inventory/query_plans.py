@@ -0,0 +1,335 @@
+"""
+Planes compilados para el método get_related
+
+Los clientes envían pocas formas de consulta distintas (joins, filtros por
+campo, proyección y ordenamiento) con valores que cambian en cada petición.
+La forma normalizada se compila una sola vez en un QueryPlan y se guarda en
+un LRU acotado; por petición solo se extraen los valores de los filtros.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+
+# Path de relación desde cada modelo base hacia los modelos relacionados
+RELATION_PATHS = {
+    # Desde Product
+    'product': {
+        'brand': 'brand',
+        'category': 'category',
+        'warehouse': 'stocks__warehouse',
+        'stock': 'stocks',
+        'customer': 'order_items__order__customer',
+        'order': 'order_items__order',
+        'orderitem': 'order_items',
+        'payment': 'order_items__order__payment'
+    },
+    # Desde Brand
+    'brand': {
+        'product': 'products',
+        'customer': 'products__order_items__order__customer',
+        'order': 'products__order_items__order',
+        'warehouse': 'products__stocks__warehouse'
+    },
+    # Desde Customer
+    'customer': {
+        'order': 'orders',
+        'product': 'orders__items__product',
+        'brand': 'orders__items__product__brand',
+        'payment': 'orders__payment'
+    },
+    # Desde Order
+    'order': {
+        'customer': 'customer',
+        'product': 'items__product',
+        'brand': 'items__product__brand',
+        'orderitem': 'items',
+        'payment': 'payment'
+    },
+    # Desde Stock
+    'stock': {
+        'product': 'product',
+        'warehouse': 'warehouse',
+        'brand': 'product__brand',
+        'category': 'product__category'
+    },
+    # Desde Warehouse
+    'warehouse': {
+        'product': 'stocks__product',
+        'stock': 'stocks',
+        'brand': 'stocks__product__brand'
+    },
+    # Desde Payment
+    'payment': {
+        'order': 'order',
+        'customer': 'order__customer',
+        'product': 'order__items__product'
+    }
+}
+
+
+# Mapeo de nombres de modelo en fields[...] a atributos de relación
+RELATION_ATTRS = {
+    'brand': 'brand',
+    'category': 'category',
+    'warehouse': 'warehouse',
+    'product': 'product',
+    'customer': 'customer',
+    'order': 'order',
+    'payment': 'payment',
+    'stocks': 'stocks',
+    'items': 'items'
+}
+
+
+def get_relation_path(model, model_name):
+    """Obtiene el path de relación para un modelo dado basado en el modelo base"""
+    current_paths = RELATION_PATHS.get(model.__name__.lower(), {})
+    target_model = model_name.lower()
+    return current_paths.get(target_model, target_model)
+
+
+def is_select_related_path(model, field_path):
+    """Determina si un path debe usar select_related o prefetch_related"""
+    current_model = model
+
+    for part in field_path.split('__'):
+        try:
+            field = current_model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return False
+
+        if field.many_to_many or field.one_to_many:
+            return False  # Usar prefetch_related
+        if field.related_model is None:
+            return True  # Campo normal, usar select_related
+        current_model = field.related_model
+
+    return True
+
+
+def get_column_names(model, names):
+    """Nombres de los campos si todos son columnas del modelo, o None"""
+    try:
+        fields = [model._meta.get_field(name) for name in names]
+    except FieldDoesNotExist:
+        return None
+    if not all(field.concrete for field in fields):
+        return None
+    return {field.name for field in fields}
+
+
+def get_projection(model, names):
+    """Columnas a cargar con .only(): las pedidas, la PK y las FKs para poder navegar relaciones"""
+    columns = get_column_names(model, names)
+    if columns is None:
+        return None
+    columns.add(model._meta.pk.name)
+    columns.update(field.name for field in model._meta.concrete_fields if field.is_relation)
+    return columns
+
+
+def convert_filter_value(value):
+    """Convierte valores de filtro a tipos apropiados"""
+    if value.lower() == 'true':
+        return True
+    elif value.lower() == 'false':
+        return False
+    elif value.isdigit():
+        return int(value)
+    else:
+        return value
+
+
+def parse_query_shape(query_params):
+    """
+    Normaliza los parámetros de get_related.
+
+    Retorna (shape, filter_values): shape es una tupla hashable que identifica
+    la forma de la consulta sin los valores de los filtros, que se devuelven
+    por separado en el mismo orden que los filtros de la forma.
+    """
+    joins = tuple(
+        join.strip() for join in query_params.get('join', '').split(',') if join.strip()
+    )
+    ordering = tuple(
+        field.strip() for field in query_params.get('ordering', '').split(',') if field.strip()
+    )
+    distinct = query_params.get('distinct', '').lower() == 'true'
+
+    filters = []
+    filter_values = []
+    fields = []
+    for param_name, param_value in query_params.items():
+        if param_name.startswith('filter[') and param_name.endswith(']'):
+            # Parsear filtros: campo__lookup=valor,campo2=valor2
+            model_name = param_name[7:-1].lower()
+            for filter_expr in param_value.split(','):
+                if '=' in filter_expr:
+                    field_lookup, value = filter_expr.split('=', 1)
+                    filters.append((model_name, field_lookup))
+                    filter_values.append(convert_filter_value(value))
+        elif param_name.startswith('fields[') and param_name.endswith(']'):
+            model_name = param_name[7:-1].lower()
+            fields.append(
+                (model_name, tuple(field.strip() for field in param_value.split(',')))
+            )
+
+    shape = (joins, tuple(filters), ordering, distinct, tuple(sorted(fields)))
+    return shape, filter_values
+
+
+class QueryPlan:
+    """Forma de consulta de get_related ya resuelta contra los modelos"""
+
+    def __init__(self, model, shape):
+        joins, filters, ordering, distinct, fields = shape
+        main_model_name = model.__name__.lower()
+
+        self.select_related = [join for join in joins if is_select_related_path(model, join)]
+        self.prefetch_related = [join for join in joins if join not in self.select_related]
+
+        # Construir el filtro con prefijo del modelo relacionado si es necesario
+        self.filter_keys = [
+            field_lookup if model_name == main_model_name
+            else f"{get_relation_path(model, model_name)}__{field_lookup}"
+            for model_name, field_lookup in filters
+        ]
+        self.ordering = list(ordering)
+        self.distinct = distinct
+        self.fields = dict(fields)
+
+        self.only = None
+        self.prefetch_projections = {}
+        if getattr(settings, 'GET_RELATED_PROJECTION', True):
+            self._compile_projection(model, main_model_name)
+
+    def _compile_projection(self, model, main_model_name):
+        """
+        Traduce fields[...] a .only() sobre el modelo base y a Prefetch con
+        .only() para las relaciones múltiples. Solo aplica cuando el modelo
+        base tiene campos explícitos (sin ellos se usa el serializer completo)
+        y todos los campos pedidos son columnas; si no, se cargan filas completas.
+        """
+        main_fields = self.fields.get(main_model_name)
+        only = get_projection(model, main_fields) if main_fields else None
+        if only is None:
+            return
+
+        # Relaciones directas: restringir columnas si nadie navega más allá de ellas
+        for join in self.select_related:
+            related_fields = self.fields.get(join)
+            nested = any(other.startswith(f"{join}__") for other in self.select_related)
+            if '__' in join or not related_fields or nested:
+                continue
+            related_model = model._meta.get_field(join).related_model
+            columns = get_column_names(related_model, related_fields)
+            if columns is not None:
+                only.update(f"{join}__{column}" for column in columns)
+
+        # Relaciones múltiples: Prefetch con queryset proyectado
+        for attr, related_fields in self.fields.items():
+            if attr not in RELATION_ATTRS:
+                continue
+            if not any(join == attr or join.startswith(f"{attr}__") for join in self.prefetch_related):
+                continue
+            try:
+                relation = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                continue
+            if not (relation.one_to_many or relation.many_to_many):
+                continue
+            columns = get_projection(relation.related_model, related_fields)
+            if columns is not None:
+                self.prefetch_projections[attr] = (relation.related_model, sorted(columns))
+
+        self.only = sorted(only)
+
+    def apply(self, queryset, filter_values):
+        """Aplica el plan sobre el queryset base con los valores de la petición"""
+        if self.only is not None:
+            # Con proyección explícita solo se cargan los JOINs pedidos
+            queryset = queryset.select_related(None).prefetch_related(None).only(*self.only)
+
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+
+        if self.prefetch_related:
+            lookups = [
+                Prefetch(attr, queryset=related_model._default_manager.only(*columns))
+                for attr, (related_model, columns) in self.prefetch_projections.items()
+            ]
+            lookups.extend(
+                join for join in self.prefetch_related
+                if join not in self.prefetch_projections
+            )
+            queryset = queryset.prefetch_related(*lookups)
+
+        for filter_key, value in zip(self.filter_keys, filter_values):
+            queryset = queryset.filter(**{filter_key: value})
+
+        if self.ordering:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.distinct:
+            queryset = queryset.distinct()
+
+        return queryset
+
+
+class PlanCache:
+    """LRU acotado y thread-safe de planes compilados con estadísticas de uso"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_plan(self, model, shape):
+        key = (model._meta.label_lower, shape)
+
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+
+        # Compilar fuera del lock; dos hilos pueden compilar la misma forma
+        plan = QueryPlan(model, shape)
+
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+                self.evictions += 1
+
+        return plan
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._plans),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+plan_cache = PlanCache(getattr(settings, 'GET_RELATED_PLAN_CACHE_SIZE', 256))
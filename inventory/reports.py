@@ -0,0 +1,273 @@
+"""
+Resumen de ventas por producto y día para el top de productos más vendidos
+
+inventory_productdailysales se actualiza de forma incremental en la misma
+transacción que confirma las órdenes (y al salir una orden de CONFIRMED o
+eliminarse, ver signals.py), de modo que el top de cualquier rango
+de fechas se calcula sobre una fila por producto y día en lugar de recorrer
+todos los items de órdenes confirmadas. rebuild_daily_sales lo recalcula
+desde cero (o para un rango) como tarea periódica de reconciliación.
+
+El resumen de stock por producto lo mantienen triggers de inventory_stock y
+de inventory_stockmovement sobre la posición actual; rebuild_stock_summary y stock_summary_mismatches sirven para reconciliarlo.
+"""
+from datetime import date, timedelta
+
+from django.db import connection, connections, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+
+from .cache import bump_tables
+from .db_routers import read_alias
+from .ledger import with_positions
+from .models import ProductDailySales, ProductStockSummary, Stock
+from .sql_functions import REBUILD_STOCK_SUMMARY_SQL
+
+
+# Tablas que lee cada reporte: sus escrituras invalidan el caché del reporte
+REPORT_TABLES = {
+    'products_by_brand_customer': (
+        'inventory_product', 'inventory_brand', 'inventory_category',
+        'inventory_orderitem', 'inventory_order', 'inventory_customer',
+    ),
+    'payments_by_product_quantity': (
+        'inventory_payment', 'inventory_order', 'inventory_customer',
+        'inventory_orderitem', 'inventory_product',
+    ),
+    'stock_analysis': (
+        'inventory_stock', 'inventory_stockmovement', 'inventory_warehouse', 'inventory_product',
+        'inventory_brand', 'inventory_category',
+    ),
+    'top_selling': (
+        'inventory_productdailysales', 'inventory_product', 'inventory_brand', 'inventory_category',
+    ),
+}
+
+
+# Suma al resumen (sign = 1) o resta de él (sign = -1) las ventas de las
+# órdenes indicadas, según sus items actuales
+RECORD_SALES_SQL = """
+INSERT INTO inventory_productdailysales
+    (id, created_at, product_id, day, quantity_sold, order_count, revenue, unit_price_sum)
+SELECT
+    gen_random_uuid(), now(), oi.product_id, o.created_at::DATE,
+    %(sign)s * SUM(oi.qty), %(sign)s * COUNT(DISTINCT o.id),
+    %(sign)s * SUM(oi.qty * oi.unit_price), %(sign)s * SUM(oi.unit_price)
+FROM inventory_orderitem oi
+INNER JOIN inventory_order o ON o.id = oi.order_id
+WHERE o.id = ANY(%(order_ids)s::uuid[])
+GROUP BY oi.product_id, o.created_at::DATE
+ORDER BY oi.product_id, o.created_at::DATE
+ON CONFLICT (product_id, day) DO UPDATE SET
+    quantity_sold = inventory_productdailysales.quantity_sold + EXCLUDED.quantity_sold,
+    order_count = inventory_productdailysales.order_count + EXCLUDED.order_count,
+    revenue = inventory_productdailysales.revenue + EXCLUDED.revenue,
+    unit_price_sum = inventory_productdailysales.unit_price_sum + EXCLUDED.unit_price_sum
+"""
+
+# Días que quedaron sin ventas tras restar: no deben contar en el promedio
+DELETE_EMPTY_SALES_SQL = """
+DELETE FROM inventory_productdailysales
+WHERE order_count <= 0 AND product_id IN (
+    SELECT oi.product_id FROM inventory_orderitem oi WHERE oi.order_id = ANY(%(order_ids)s::uuid[])
+)
+"""
+
+# Recalcula el resumen de un rango [start, end) de created_at desde las órdenes confirmadas
+REBUILD_SALES_SQL = """
+INSERT INTO inventory_productdailysales
+    (id, created_at, product_id, day, quantity_sold, order_count, revenue, unit_price_sum)
+SELECT
+    gen_random_uuid(), now(), oi.product_id, o.created_at::DATE,
+    SUM(oi.qty), COUNT(DISTINCT o.id), SUM(oi.qty * oi.unit_price), SUM(oi.unit_price)
+FROM inventory_orderitem oi
+INNER JOIN inventory_order o ON o.id = oi.order_id
+WHERE
+    o.status = 'CONFIRMED'
+    AND (%(start)s::DATE IS NULL OR o.created_at >= %(start)s::DATE)
+    AND (%(end)s::DATE IS NULL OR o.created_at < %(end)s::DATE)
+GROUP BY oi.product_id, o.created_at::DATE
+"""
+
+
+def _apply_sales(order_ids, sign):
+    params = {'order_ids': [str(order_id) for order_id in order_ids], 'sign': sign}
+    with connection.cursor() as cursor:
+        cursor.execute(RECORD_SALES_SQL, params)
+        if sign < 0:
+            cursor.execute(DELETE_EMPTY_SALES_SQL, params)
+    bump_tables('inventory_productdailysales')
+
+
+def record_confirmed_sales(order_ids):
+    """
+    Acumula en el resumen diario las ventas de órdenes que pasaron a CONFIRMED.
+    Se llama después de allocate_stock: las confirmaciones que comparten
+    productos ya quedaron serializadas por su advisory lock (ledger.lock_products).
+    """
+    if order_ids:
+        _apply_sales(order_ids, 1)
+
+
+def remove_confirmed_sales(order_ids):
+    """Resta del resumen diario las ventas de órdenes que dejan de estar CONFIRMED (o se eliminan)"""
+    if order_ids:
+        _apply_sales(order_ids, -1)
+
+
+def rebuild_daily_sales(start_date=None, end_date=None):
+    """
+    Recalcula el resumen entre start_date y end_date (inclusive); sin fechas,
+    reconstruye la tabla completa. Retorna las filas de resumen generadas.
+    """
+    end = end_date + timedelta(days=1) if end_date else None
+    with transaction.atomic():
+        stale = ProductDailySales.objects.all()
+        if start_date:
+            stale = stale.filter(day__gte=start_date)
+        if end_date:
+            stale = stale.filter(day__lte=end_date)
+        stale.delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SALES_SQL, {'start': start_date, 'end': end})
+            bump_tables('inventory_productdailysales')
+            return cursor.rowcount
+
+
+def rebuild_stock_summary():
+    """Recalcula el resumen de stock de todos los productos; retorna las filas generadas"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(REBUILD_STOCK_SUMMARY_SQL)
+        return cursor.rowcount
+
+
+def stock_summary_mismatches():
+    """
+    Productos cuyo resumen difiere de la suma de sus posiciones (foto +
+    movimientos pendientes): {product_id: (esperado, actual)}
+    """
+    expected = {
+        row['product_id']: (row['total_qty'], row['total_reserved'], row['warehouse_count'])
+        for row in with_positions(Stock.objects.all()).values('product_id').annotate(
+            total_qty=Sum('position_qty'),
+            total_reserved=Sum('position_reserved'),
+            warehouse_count=Count('id', filter=Q(position_qty__gt=0)),
+        )
+    }
+    actual = {
+        product_id: (total_qty, total_reserved, warehouse_count)
+        for product_id, total_qty, total_reserved, warehouse_count in ProductStockSummary.objects.values_list(
+            'product_id', 'total_qty', 'total_reserved', 'warehouse_count'
+        )
+    }
+    return {
+        product_id: (expected.get(product_id), actual.get(product_id))
+        for product_id in expected.keys() | actual.keys()
+        if expected.get(product_id) != actual.get(product_id)
+    }
+
+
+def top_selling_queryset(start_date=None, end_date=None):
+    """
+    Ranking de productos más vendidos entre start_date y end_date (inclusive)
+    calculado sobre el resumen diario. Mismas columnas y orden que la función
+    SQL get_top_selling_products.
+    """
+    sales = ProductDailySales.objects.filter(product__is_active=True)
+    if start_date:
+        sales = sales.filter(day__gte=start_date)
+    if end_date:
+        sales = sales.filter(day__lte=end_date)
+
+    return sales.values(
+        'product_id',
+        product_name=F('product__name'),
+        product_sku=F('product__sku'),
+        brand_name=F('product__brand__name'),
+        category_name=F('product__category__name'),
+    ).annotate(
+        total_quantity_sold=Sum('quantity_sold'),
+        total_orders=Sum('order_count'),
+        total_revenue=Sum('revenue'),
+        avg_unit_price=ExpressionWrapper(
+            Sum('unit_price_sum') / Sum('order_count'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+    ).order_by('-total_quantity_sold', '-total_revenue')
+
+
+def get_top_selling_products(limit=10, start_date=None, end_date=None):
+    """Top limit de top_selling_queryset como lista de dicts"""
+    return list(top_selling_queryset(start_date, end_date)[:limit])
+
+
+def run_report_function(function, params):
+    """
+    Ejecuta una función SQL de sql_functions.py y retorna sus filas como dicts.
+    El cursor crudo no pasa por el router: se usa el alias de lectura de la petición.
+    """
+    placeholders = ', '.join(['%s'] * len(params))
+    with connections[read_alias()].cursor() as cursor:
+        cursor.execute(f'SELECT * FROM {function}({placeholders})', params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _parse_int(query_params, name, default):
+    try:
+        return int(query_params.get(name, default))
+    except ValueError:
+        raise ValueError(f'{name} debe ser un entero')
+
+
+def _parse_date(query_params, name):
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} debe tener formato YYYY-MM-DD')
+
+
+def build_report(name, query_params):
+    """
+    Parámetros normalizados y función de cálculo de un reporte a partir del
+    query string. Lanza ValueError con el mensaje para el cliente si los
+    parámetros son inválidos.
+    """
+    if name == 'products_by_brand_customer':
+        brand = query_params.get('brand', '').strip()
+        # La función compara el email exacto (cu.email = ...): no se cambia su caso
+        customer_email = query_params.get('customer_email', '').strip()
+        if not brand or not customer_email:
+            raise ValueError('brand y customer_email son requeridos')
+        params = {'brand': brand, 'customer_email': customer_email}
+        return params, lambda: run_report_function(
+            'get_products_by_brand_and_customer', [brand, customer_email]
+        )
+
+    if name == 'payments_by_product_quantity':
+        sku = query_params.get('sku', '').strip()
+        if not sku:
+            raise ValueError('sku es requerido')
+        min_quantity = _parse_int(query_params, 'min_quantity', 1)
+        params = {'sku': sku, 'min_quantity': min_quantity}
+        return params, lambda: run_report_function(
+            'get_payments_by_product_quantity', [sku, min_quantity]
+        )
+
+    if name == 'stock_analysis':
+        warehouse = query_params.get('warehouse', '').strip() or None
+        min_stock = _parse_int(query_params, 'min_stock', 0)
+        params = {'warehouse': warehouse, 'min_stock': min_stock}
+        return params, lambda: run_report_function('get_stock_analysis', [warehouse, min_stock])
+
+    if name == 'top_selling':
+        limit = max(1, min(_parse_int(query_params, 'limit', 10), 1000))
+        start_date = _parse_date(query_params, 'start_date')
+        end_date = _parse_date(query_params, 'end_date')
+        params = {'limit': limit, 'start_date': start_date, 'end_date': end_date}
+        return params, lambda: get_top_selling_products(limit, start_date, end_date)
+
+    raise ValueError(f'Reporte desconocido: {name}')
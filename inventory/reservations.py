@@ -0,0 +1,205 @@
+"""
+Motor de reservas de stock basado en sentencias SQL set-based
+
+La asignación de una demanda completa se resuelve en una sola sentencia
+INSERT ... SELECT que registra movimientos RESERVATION en el libro de stock
+(ver ledger.py), alimentada por una función de ventana sobre la posición de
+cada bodega (foto de inventory_stock más movimientos pendientes). Las
+asignaciones del mismo producto se serializan con un advisory lock en lugar
+de bloquear y reescribir sus filas de stock.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .cache import bump_tables
+from .ledger import lock_products
+from .models import Order, OrderItem, Product
+
+
+# Reparte la demanda de cada producto entre sus bodegas, priorizando las de
+# mayor cantidad (mismo criterio que el algoritmo anterior fila a fila). Cada
+# fila de demanda (orden, producto) ocupa un tramo de la demanda acumulada
+# del producto, en el orden recibido, y cada bodega un tramo del disponible
+# acumulado: lo reservado es la intersección de ambos tramos.
+ALLOCATE_STOCK_SQL = """
+WITH demand AS (
+    SELECT
+        d.order_id,
+        d.product_id,
+        d.qty,
+        SUM(d.qty) OVER (PARTITION BY d.product_id ORDER BY d.position) AS demand_end
+    FROM unnest(%(order_ids)s::uuid[], %(product_ids)s::uuid[], %(quantities)s::integer[])
+        WITH ORDINALITY AS d(order_id, product_id, qty, position)
+),
+positions AS (
+    SELECT p.product_id, p.warehouse_id, SUM(p.qty) AS qty, SUM(p.reserved) AS reserved
+    FROM (
+        SELECT product_id, warehouse_id, qty, reserved
+        FROM inventory_stock
+        WHERE product_id = ANY(%(product_ids)s::uuid[])
+        UNION ALL
+        SELECT product_id, warehouse_id, qty_delta, reserved_delta
+        FROM inventory_stockmovement
+        WHERE product_id = ANY(%(product_ids)s::uuid[]) AND compacted_at IS NULL
+    ) p
+    GROUP BY p.product_id, p.warehouse_id
+),
+supply AS (
+    SELECT
+        product_id,
+        warehouse_id,
+        qty - reserved AS available,
+        SUM(qty - reserved) OVER (
+            PARTITION BY product_id
+            ORDER BY qty DESC, warehouse_id
+        ) AS supply_end
+    FROM positions
+    WHERE qty > reserved
+),
+allocation AS (
+    SELECT
+        d.order_id,
+        d.product_id,
+        s.warehouse_id,
+        LEAST(d.demand_end, s.supply_end)
+            - GREATEST(d.demand_end - d.qty, s.supply_end - s.available) AS to_reserve
+    FROM
+        demand d
+        INNER JOIN supply s ON s.product_id = d.product_id
+    WHERE
+        d.demand_end - d.qty < s.supply_end
+        AND s.supply_end - s.available < d.demand_end
+)
+INSERT INTO inventory_stockmovement
+    (id, created_at, kind, qty_delta, reserved_delta, note, order_id, product_id, warehouse_id)
+SELECT
+    gen_random_uuid(), NOW(), 'RESERVATION', 0, a.to_reserve, '', a.order_id, a.product_id, a.warehouse_id
+FROM allocation a
+RETURNING product_id, warehouse_id, reserved_delta
+"""
+
+
+class OrderNotPendingError(Exception):
+    """La orden ya no está pendiente de confirmación"""
+
+
+def shortage_message(shortages, names):
+    """Detalle de faltantes {product_id: unidades}, con el nombre de cada producto si está en names"""
+    return '; '.join(
+        f"Stock insuficiente para {names.get(product_id, product_id)}. Faltantes: {missing}"
+        for product_id, missing in shortages.items()
+    )
+
+
+class InsufficientStockError(Exception):
+    """No hay stock suficiente para cubrir la demanda de uno o más productos"""
+
+    def __init__(self, shortages, names=None):
+        # Los nombres los resuelve quien lanza el error: construirlo no consulta la base de datos
+        self.shortages = shortages
+        super().__init__(shortage_message(shortages, names or {}))
+
+
+def allocate_stock(demand, order_id=None):
+    """
+    Reserva stock para una demanda {product_id: qty} de forma atómica.
+
+    Retorna la lista de asignaciones (product_id, warehouse_id, qty).
+    """
+    return allocate_orders([
+        (order_id, product_id, qty) for product_id, qty in demand.items()
+    ])
+
+
+def allocate_orders(demand_rows):
+    """
+    Reserva stock para filas de demanda (order_id, product_id, qty) de
+    forma atómica y en una sola sentencia. Entre filas del mismo producto
+    tiene prioridad la que aparece primero.
+
+    Toma el lock de los productos involucrados (en orden de id para evitar
+    deadlocks entre confirmaciones concurrentes) y registra la asignación
+    completa como movimientos de reserva de cada orden. Si algún producto
+    queda con faltantes se revierte todo y se lanza InsufficientStockError.
+
+    Retorna la lista de asignaciones (product_id, warehouse_id, qty).
+    """
+    demand_rows = [
+        (str(order_id) if order_id else None, str(product_id), qty)
+        for order_id, product_id, qty in demand_rows
+        if qty > 0
+    ]
+    if not demand_rows:
+        return []
+
+    demand = defaultdict(int)
+    for _, product_id, qty in demand_rows:
+        demand[product_id] += qty
+    product_ids = sorted(demand)
+
+    with transaction.atomic():
+        lock_products(product_ids)
+
+        with connection.cursor() as cursor:
+            cursor.execute(ALLOCATE_STOCK_SQL, {
+                'order_ids': [order_id for order_id, _, _ in demand_rows],
+                'product_ids': [product_id for _, product_id, _ in demand_rows],
+                'quantities': [qty for _, _, qty in demand_rows],
+            })
+            allocations = [
+                (str(product_id), str(warehouse_id), qty)
+                for product_id, warehouse_id, qty in cursor.fetchall()
+            ]
+
+        reserved = defaultdict(int)
+        for product_id, _, qty in allocations:
+            reserved[product_id] += qty
+
+        shortages = {
+            product_id: demand[product_id] - reserved[product_id]
+            for product_id in product_ids
+            if reserved[product_id] < demand[product_id]
+        }
+        if shortages:
+            names = {
+                str(product_id): name
+                for product_id, name in Product.objects.filter(pk__in=shortages).values_list('id', 'name')
+            }
+            raise InsufficientStockError(shortages, names)
+
+        bump_tables('inventory_stockmovement')
+
+    return allocations
+
+
+def get_order_demand(order_ids):
+    """Demanda agregada por producto de un conjunto de órdenes"""
+    return dict(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list('product_id')
+        .annotate(total_qty=Sum('qty'))
+        .values_list('product_id', 'total_qty')
+    )
+
+
+def confirm_order(order):
+    """
+    Confirma una orden reservando el stock de todos sus items en una sola
+    transacción. La fila de la orden se bloquea para que dos confirmaciones
+    simultáneas de la misma orden no reserven dos veces.
+    """
+    with transaction.atomic():
+        locked = Order.objects.select_for_update().only('id', 'status').get(pk=order.pk)
+        if locked.status != 'PENDING':
+            raise OrderNotPendingError('Solo se pueden confirmar órdenes pendientes')
+
+        allocate_stock(get_order_demand([order.pk]), order_id=order.pk)
+
+        # La señal post_save de Order suma la orden al resumen diario de ventas
+        locked.status = 'CONFIRMED'
+        locked.save(update_fields=['status'])
+
+    order.status = 'CONFIRMED'
+    return order
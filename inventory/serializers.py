@@ -1,10 +1,93 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch, Sum, prefetch_related_objects
 from rest_framework import serializers
+from .cache import bump_tables
+from .ledger import (
+    MANUAL_KINDS, InvalidMovementError, get_available_by_product, record_movement, with_positions
+)
 from .models import (
     Brand, Category, Product, Warehouse, 
-    Stock, Customer, Order, OrderItem, Payment
+    Stock, StockMovement, Customer, Order, OrderConfirmation, OrderItem, Payment
 )
 
 
+# Claves del contexto compartidas por los validadores de una misma petición
+PREFETCHED_KEY = 'prefetched_related'
+AVAILABLE_STOCK_KEY = 'available_stock'
+
+
+def _to_pk(model, value):
+    """pk normalizado de un valor recibido, o None si no es una cadena válida"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return model._meta.pk.to_python(value)
+    except DjangoValidationError:
+        return None
+
+
+class BatchPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que resuelve desde los objetos precargados en el
+    contexto por prefetch_related_fields; los pk no precargados (o con otro
+    formato) se consultan como siempre
+    """
+    
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        prefetched = self.context.get(PREFETCHED_KEY, {}).get(model, {})
+        pk = _to_pk(model, data)
+        if pk not in prefetched:
+            return super().to_internal_value(data)
+        if prefetched[pk] is None:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+
+def prefetch_related_fields(serializer, rows):
+    """
+    Precarga en el contexto, con una consulta por campo, los objetos a los
+    que apuntan los BatchPrimaryKeyRelatedField de serializer en todas las
+    filas, incluidas las listas anidadas (items de cada orden)
+    """
+    prefetched = serializer.context.setdefault(PREFETCHED_KEY, {})
+    rows = [row for row in rows if isinstance(row, dict)]
+    
+    for name, field in serializer.fields.items():
+        if field.read_only:
+            continue
+        if isinstance(field, BatchPrimaryKeyRelatedField):
+            queryset = field.get_queryset()
+            known = prefetched.setdefault(queryset.model, {})
+            pks = {_to_pk(queryset.model, row.get(name)) for row in rows} - {None} - known.keys()
+            if pks:
+                found = queryset.in_bulk(pks)
+                known.update({pk: found.get(pk) for pk in pks})
+        elif isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.Serializer):
+            nested = [item for row in rows if isinstance(row.get(name), list) for item in row[name]]
+            prefetch_related_fields(field.child, nested)
+
+
+def get_cached_availability(context, product_ids):
+    """get_available_by_product que solo consulta los productos aún no vistos en el contexto"""
+    cache = context.setdefault(AVAILABLE_STOCK_KEY, {})
+    missing = set(product_ids) - cache.keys()
+    if missing:
+        available = get_available_by_product(missing)
+        cache.update({product_id: available.get(product_id, 0) for product_id in missing})
+    return {product_id: cache[product_id] for product_id in product_ids}
+
+
+class PrefetchingListSerializer(serializers.ListSerializer):
+    """ListSerializer (many=True) que precarga las relaciones de todos los elementos antes de validarlos"""
+    
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            prefetch_related_fields(self.child, data)
+        return super().to_internal_value(data)
+
+
 class BrandSerializer(serializers.ModelSerializer):
     products_count = serializers.SerializerMethodField()
     
@@ -14,6 +97,9 @@ class BrandSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_products_count(self, obj):
+        # Anotado por el ViewSet; la consulta solo aplica a instancias sin anotar
+        if hasattr(obj, 'products_count'):
+            return obj.products_count
         return obj.products.filter(is_active=True).count()
 
 
@@ -26,6 +112,9 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_products_count(self, obj):
+        # Anotado por el ViewSet; la consulta solo aplica a instancias sin anotar
+        if hasattr(obj, 'products_count'):
+            return obj.products_count
         return obj.products.filter(is_active=True).count()
 
 
@@ -43,7 +132,11 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_total_stock(self, obj):
-        return sum(stock.qty for stock in obj.stocks.all())
+        if hasattr(obj, 'total_stock'):
+            return obj.total_stock or 0
+        # Resumen mantenido por triggers; usar select_related('stock_summary')
+        summary = getattr(obj, 'stock_summary', None)
+        return summary.total_qty if summary else 0
 
 
 class WarehouseSerializer(serializers.ModelSerializer):
@@ -55,14 +148,20 @@ class WarehouseSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_total_products(self, obj):
-        return obj.stocks.filter(qty__gt=0).count()
+        if hasattr(obj, 'total_products'):
+            return obj.total_products
+        return with_positions(obj.stocks.all()).filter(position_qty__gt=0).count()
 
 
 class StockSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
     warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
-    available_qty = serializers.ReadOnlyField()
+    # Posición actual (foto + movimientos pendientes) si el queryset la anotó
+    # con ledger.with_positions; si no, la foto compactada
+    qty = serializers.SerializerMethodField()
+    reserved = serializers.SerializerMethodField()
+    available_qty = serializers.SerializerMethodField()
     
     class Meta:
         model = Stock
@@ -72,6 +171,49 @@ class StockSerializer(serializers.ModelSerializer):
             'warehouse', 'warehouse_name', 'available_qty'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def get_qty(self, obj):
+        return getattr(obj, 'position_qty', obj.qty)
+    
+    def get_reserved(self, obj):
+        return getattr(obj, 'position_reserved', obj.reserved)
+    
+    def get_available_qty(self, obj):
+        return self.get_qty(obj) - self.get_reserved(obj)
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+    warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
+    kind = serializers.ChoiceField(choices=MANUAL_KINDS)
+    # Unidades del movimiento; los deltas se derivan del tipo
+    quantity = serializers.IntegerField(write_only=True)
+    
+    class Meta:
+        model = StockMovement
+        fields = [
+            'id', 'kind', 'quantity', 'qty_delta', 'reserved_delta', 'note',
+            'created_at', 'compacted_at',
+            'product', 'product_sku', 'warehouse', 'warehouse_name', 'order'
+        ]
+        read_only_fields = ['id', 'qty_delta', 'reserved_delta', 'created_at', 'compacted_at']
+    
+    def validate(self, data):
+        quantity = data['quantity']
+        if data['kind'] == 'ADJUSTMENT':
+            if quantity == 0:
+                raise serializers.ValidationError({'quantity': 'Un ajuste debe ser distinto de cero'})
+        elif quantity <= 0:
+            raise serializers.ValidationError({'quantity': 'Debe ser mayor que cero'})
+        if data['kind'] == 'RELEASE' and data.get('order') is None:
+            raise serializers.ValidationError({'order': 'Una liberación debe indicar la orden que reservó'})
+        return data
+    
+    def create(self, validated_data):
+        try:
+            return record_movement(**validated_data)
+        except InvalidMovementError as error:
+            raise serializers.ValidationError({'quantity': str(error)})
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -84,19 +226,23 @@ class CustomerSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_orders_count(self, obj):
+        if hasattr(obj, 'orders_count'):
+            return obj.orders_count
         return obj.orders.count()
     
     def get_total_spent(self, obj):
-        return sum(
-            payment.amount for payment in 
-            Payment.objects.filter(order__customer=obj, status='CONFIRMED')
-        )
+        if hasattr(obj, 'total_spent'):
+            return obj.total_spent
+        return Payment.objects.filter(
+            order__customer=obj, status='CONFIRMED'
+        ).aggregate(total=Sum('amount'))['total'] or 0
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
     total_price = serializers.ReadOnlyField()
+    serializer_related_field = BatchPrimaryKeyRelatedField
     
     class Meta:
         model = OrderItem
@@ -105,13 +251,18 @@ class OrderItemSerializer(serializers.ModelSerializer):
             'product', 'product_name', 'product_sku', 'total_price'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = PrefetchingListSerializer
     
     def validate(self, data):
+        # Dentro de una orden la disponibilidad se valida en bloque (OrderCreateSerializer)
+        if self.parent is not None:
+            return data
+        
         # Validar que haya stock disponible
         product = data['product']
         qty = data['qty']
         
-        total_stock = sum(stock.available_qty for stock in product.stocks.all())
+        total_stock = get_cached_availability(self.context, [product.pk])[product.pk]
         if qty > total_stock:
             raise serializers.ValidationError(
                 f"No hay suficiente stock. Disponible: {total_stock}, Solicitado: {qty}"
@@ -137,25 +288,100 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class OrderConfirmationSerializer(serializers.ModelSerializer):
+    order_status = serializers.CharField(source='order.status', read_only=True)
+    
+    class Meta:
+        model = OrderConfirmation
+        fields = ['id', 'order', 'status', 'error', 'created_at', 'processed_at', 'order_status']
+        read_only_fields = fields
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
+    serializer_related_field = BatchPrimaryKeyRelatedField
     
     class Meta:
         model = Order
         fields = ['customer', 'items']
+        list_serializer_class = PrefetchingListSerializer
     
-    def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
+    @classmethod
+    def prefetch(cls, orders_data, context):
+        """
+        Precarga clientes, productos y su disponible de varias órdenes para
+        validarlas por separado compartiendo context: tres consultas en total
+        """
+        prefetch_related_fields(cls(context=context), orders_data)
+        products = context[PREFETCHED_KEY].get(Product, {})
+        get_cached_availability(context, [pk for pk, product in products.items() if product is not None])
+    
+    def validate_items(self, items):
+        # Agrupar la demanda por producto y validar disponibilidad con una sola consulta
+        demand = {}
+        products = {}
+        for item in items:
+            product = item['product']
+            if product.pk in products:
+                raise serializers.ValidationError(
+                    f"El producto {product.sku} está repetido en la orden"
+                )
+            products[product.pk] = product
+            demand[product.pk] = item['qty']
         
-        for item_data in items_data:
-            # Si no se especifica unit_price, usar el precio del producto
-            if 'unit_price' not in item_data:
-                item_data['unit_price'] = item_data['product'].price
-            
-            OrderItem.objects.create(order=order, **item_data)
+        available = get_cached_availability(self.context, demand)
+        errors = [
+            f"No hay suficiente stock de {products[product_id].sku}. "
+            f"Disponible: {available.get(product_id, 0)}, Solicitado: {qty}"
+            for product_id, qty in demand.items()
+            if qty > available.get(product_id, 0)
+        ]
+        if errors:
+            raise serializers.ValidationError(errors)
         
+        return items
+    
+    def create(self, validated_data):
+        order = self.bulk_insert([validated_data])[0]
+        # La respuesta lista los items con su producto: una consulta para todos
+        prefetch_related_objects(
+            [order], Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
         return order
+    
+    @staticmethod
+    def bulk_insert(orders_data):
+        """
+        Inserta varias órdenes validadas con sus items usando bulk_create.
+        Los precios salen de los productos ya resueltos y los totales se
+        calculan en memoria, por lo que no hay consultas por item.
+        """
+        orders = []
+        items = []
+        for data in orders_data:
+            data = dict(data)
+            items_data = data.pop('items')
+            order = Order(**data)
+            
+            for item_data in items_data:
+                item_data = dict(item_data)
+                # Si no se especifica unit_price, usar el precio del producto
+                if not item_data.get('unit_price'):
+                    item_data['unit_price'] = item_data['product'].price
+                items.append(OrderItem(order=order, **item_data))
+                
+                order.total_amount += item_data['qty'] * item_data['unit_price']
+                order.total_items += item_data['qty']
+            
+            orders.append(order)
+        
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(items)
+            # bulk_create no emite señales: se invalida el caché de reportes aquí
+            bump_tables('inventory_order', 'inventory_orderitem')
+        
+        return orders
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,99 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_tables
+from .models import (
+    Brand, Category, Customer, Order, OrderItem, Payment, Product, ProductDailySales, Stock, StockMovement, Warehouse,
+)
+from .reports import record_confirmed_sales, remove_confirmed_sales
+
+
+VERSIONED_MODELS = (
+    Brand, Category, Product, Warehouse, Stock, StockMovement, Customer, Order, OrderItem, Payment,
+    ProductDailySales,
+)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_previous_order(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Orden guardada del item antes de escribirlo, para recalcular también la anterior si cambia"""
+    instance._previous_order_id = None
+    if raw or instance._state.adding or (update_fields is not None and 'order' not in update_fields):
+        return
+    instance._previous_order_id = (
+        OrderItem.objects.filter(pk=instance.pk).values_list('order_id', flat=True).first()
+    )
+
+
+def _is_cascade_from_order(origin):
+    """El borrado empezó en una orden (instancia o queryset): sus items caen con ella"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Order
+    return isinstance(origin, Order)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def update_order_totals(sender, instance, origin=None, **kwargs):
+    """
+    Mantiene los totales desnormalizados de la orden al escribir sus items.
+    Si el item cambió de orden se recalculan ambas; en el borrado en cascada
+    de una orden no se recalcula nada.
+    """
+    if _is_cascade_from_order(origin):
+        return
+    order_ids = {instance.order_id, getattr(instance, '_previous_order_id', None)} - {None}
+    updated = Order.objects.filter(pk__in=order_ids).recalculate_totals()
+
+    # Mantener sincronizada la instancia de la orden si ya está en memoria
+    if updated and OrderItem.order.is_cached(instance):
+        instance.order.refresh_from_db(fields=['total_amount', 'total_items'])
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_status(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Estado guardado de la orden antes de escribirla, para detectar si entra o sale de CONFIRMED"""
+    instance._previous_status = None
+    if raw or instance._state.adding or (update_fields is not None and 'status' not in update_fields):
+        return
+    instance._previous_status = (
+        Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def sync_daily_sales(sender, instance, created, raw=False, **kwargs):
+    """
+    Mantiene el resumen diario de ventas cuando una orden pasa a CONFIRMED
+    (confirm_order) o deja de estarlo (cancelación o cambio de estado por
+    PATCH o el admin). Las confirmaciones en lote usan update() y lo
+    actualizan ellas mismas.
+    """
+    previous = getattr(instance, '_previous_status', None)
+    if created or raw or previous is None or previous == instance.status:
+        return
+    if instance.status == 'CONFIRMED':
+        record_confirmed_sales([instance.pk])
+    elif previous == 'CONFIRMED':
+        remove_confirmed_sales([instance.pk])
+
+
+@receiver(pre_delete, sender=Order)
+def remove_deleted_sales(sender, instance, **kwargs):
+    """Resta las ventas de una orden confirmada antes de que se borren sus items en cascada"""
+    if instance.status == 'CONFIRMED':
+        remove_confirmed_sales([instance.pk])
+
+
+def bump_table_version(sender, **kwargs):
+    """Invalida los reportes cacheados que leen la tabla del modelo escrito"""
+    tables = [sender._meta.db_table]
+    if sender is OrderItem:
+        # recalculate_totals actualiza la orden con queryset.update(), que no emite señales
+        tables.append(Order._meta.db_table)
+    bump_tables(*tables)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_table_version, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+    post_delete.connect(bump_table_version, sender=model, dispatch_uid=f'bump_version_delete_{model.__name__}')
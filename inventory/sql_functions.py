@@ -48,7 +48,8 @@ BEGIN
         INNER JOIN inventory_order o ON oi.order_id = o.id
         INNER JOIN inventory_customer cu ON o.customer_id = cu.id
     WHERE 
-        b.name ILIKE '%' || brand_name_param || '%'
+        -- Misma expresión que el índice GIN de trigramas brand_name_trgm
+        UPPER(b.name) LIKE UPPER('%' || brand_name_param || '%')
         AND cu.email = customer_email_param
         AND p.is_active = true
         AND b.is_active = true
@@ -145,13 +146,25 @@ BEGIN
         p.price AS product_price,
         (s.qty * p.price) AS stock_value
     FROM 
-        inventory_stock s
+        inventory_stock st
+        -- Posición actual: foto más movimientos pendientes de compactar
+        CROSS JOIN LATERAL (
+            SELECT
+                (st.qty + COALESCE(SUM(m.qty_delta), 0))::INTEGER AS qty,
+                (st.reserved + COALESCE(SUM(m.reserved_delta), 0))::INTEGER AS reserved,
+                st.product_id,
+                st.warehouse_id
+            FROM inventory_stockmovement m
+            WHERE m.product_id = st.product_id AND m.warehouse_id = st.warehouse_id
+              AND m.compacted_at IS NULL
+        ) s
         INNER JOIN inventory_warehouse w ON s.warehouse_id = w.id
         INNER JOIN inventory_product p ON s.product_id = p.id
         INNER JOIN inventory_brand b ON p.brand_id = b.id
         INNER JOIN inventory_category cat ON p.category_id = cat.id
     WHERE 
-        (warehouse_name_param IS NULL OR w.name ILIKE '%' || warehouse_name_param || '%')
+        -- Misma expresión que el índice GIN de trigramas warehouse_name_trgm
+        (warehouse_name_param IS NULL OR UPPER(w.name) LIKE UPPER('%' || warehouse_name_param || '%'))
         AND s.qty >= min_stock
         AND p.is_active = true
     ORDER BY 
@@ -199,8 +212,9 @@ BEGIN
     WHERE 
         o.status = 'CONFIRMED'
         AND p.is_active = true
-        AND (start_date IS NULL OR o.created_at::DATE >= start_date)
-        AND (end_date IS NULL OR o.created_at::DATE <= end_date)
+        -- Rango sobre la columna sin convertir para poder usar el índice (status, created_at)
+        AND (start_date IS NULL OR o.created_at >= start_date)
+        AND (end_date IS NULL OR o.created_at < end_date + 1)
     GROUP BY 
         p.id, p.name, p.sku, b.name, c.name
     ORDER BY 
@@ -210,6 +224,243 @@ END;
 $$ LANGUAGE plpgsql;
 """
 
+# Mantiene inventory_productstocksummary al escribir inventory_stock. Los
+# triggers son por sentencia con tablas de transición: un UPDATE o COPY de
+# muchas filas aplica un solo delta agregado por producto, en orden de
+# product_id para que las transacciones concurrentes bloqueen en el mismo orden.
+# compact_movements marca su sentencia con inventory.compacting_movements: la
+# compactación pasa a la foto movimientos que el resumen ya incluye.
+STOCK_SUMMARY_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION sync_product_stock_summary()
+RETURNS TRIGGER AS $$
+DECLARE
+    deltas TEXT;
+BEGIN
+    IF current_setting('inventory.compacting_movements', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    deltas := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT product_id, qty, reserved, (qty > 0)::INT AS stocked FROM new_stock'
+        WHEN 'DELETE' THEN
+            'SELECT product_id, -qty, -reserved, -(qty > 0)::INT FROM old_stock'
+        ELSE
+            'SELECT product_id, qty, reserved, (qty > 0)::INT AS stocked FROM new_stock
+             UNION ALL
+             SELECT product_id, -qty, -reserved, -(qty > 0)::INT FROM old_stock'
+    END;
+
+    IF TG_OP = 'DELETE' THEN
+        -- Sin upsert: si el producto se está eliminando su resumen ya no existe
+        EXECUTE format($sql$
+            UPDATE inventory_productstocksummary s SET
+                total_qty = s.total_qty + d.qty,
+                total_reserved = s.total_reserved + d.reserved,
+                warehouse_count = s.warehouse_count + d.stocked,
+                updated_at = now()
+            FROM (
+                SELECT product_id, SUM(qty) AS qty, SUM(reserved) AS reserved, SUM(stocked) AS stocked
+                FROM (%s) AS delta (product_id, qty, reserved, stocked)
+                GROUP BY product_id
+            ) d
+            WHERE s.product_id = d.product_id
+        $sql$, deltas);
+    ELSE
+        EXECUTE format($sql$
+            INSERT INTO inventory_productstocksummary
+                (id, created_at, updated_at, product_id, total_qty, total_reserved, warehouse_count)
+            SELECT gen_random_uuid(), now(), now(), product_id, SUM(qty), SUM(reserved), SUM(stocked)
+            FROM (%s) AS delta (product_id, qty, reserved, stocked)
+            GROUP BY product_id
+            -- Los UPDATE que solo tocan updated_at no reescriben el resumen
+            HAVING SUM(qty) <> 0 OR SUM(reserved) <> 0 OR SUM(stocked) <> 0 OR %L = 'INSERT'
+            ORDER BY product_id
+            ON CONFLICT (product_id) DO UPDATE SET
+                total_qty = inventory_productstocksummary.total_qty + EXCLUDED.total_qty,
+                total_reserved = inventory_productstocksummary.total_reserved + EXCLUDED.total_reserved,
+                warehouse_count = inventory_productstocksummary.warehouse_count + EXCLUDED.warehouse_count,
+                updated_at = now()
+        $sql$, deltas, TG_OP);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS stock_summary_insert ON inventory_stock;
+DROP TRIGGER IF EXISTS stock_summary_update ON inventory_stock;
+DROP TRIGGER IF EXISTS stock_summary_delete ON inventory_stock;
+
+CREATE TRIGGER stock_summary_insert
+    AFTER INSERT ON inventory_stock
+    REFERENCING NEW TABLE AS new_stock
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_product_stock_summary();
+
+CREATE TRIGGER stock_summary_update
+    AFTER UPDATE ON inventory_stock
+    REFERENCING OLD TABLE AS old_stock NEW TABLE AS new_stock
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_product_stock_summary();
+
+CREATE TRIGGER stock_summary_delete
+    AFTER DELETE ON inventory_stock
+    REFERENCING OLD TABLE AS old_stock
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_product_stock_summary();
+"""
+
+DROP_STOCK_SUMMARY_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS stock_summary_insert ON inventory_stock;
+DROP TRIGGER IF EXISTS stock_summary_update ON inventory_stock;
+DROP TRIGGER IF EXISTS stock_summary_delete ON inventory_stock;
+DROP FUNCTION IF EXISTS sync_product_stock_summary();
+"""
+
+# Mantiene el resumen al registrar movimientos, de modo que refleja la
+# posición actual (foto + movimientos pendientes) sin esperar a la
+# compactación. warehouse_count compara la posición de cada bodega antes y
+# después del movimiento; la posición se lee bajo el mismo advisory lock por
+# producto que ledger.lock_products. Las posiciones nuevas reciben su fila de
+# foto en cero para que /stocks/ las liste desde el primer movimiento.
+STOCK_MOVEMENT_SUMMARY_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION sync_stock_summary_from_movements()
+RETURNS TRIGGER AS $$
+DECLARE
+    deltas TEXT;
+    positions TEXT;
+BEGIN
+    -- Los movimientos ya compactados están sumados a la foto
+    deltas := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT product_id, warehouse_id, qty_delta, reserved_delta FROM new_movements
+             WHERE compacted_at IS NULL'
+        ELSE
+            'SELECT product_id, warehouse_id, -qty_delta, -reserved_delta FROM old_movements
+             WHERE compacted_at IS NULL'
+    END;
+
+    EXECUTE format($sql$
+        SELECT pg_advisory_xact_lock(hashtextextended(locked.product_id::text, 0))
+        FROM (
+            SELECT DISTINCT product_id
+            FROM (%s) AS delta (product_id, warehouse_id, qty, reserved)
+            ORDER BY product_id
+        ) locked
+    $sql$, deltas);
+
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format($sql$
+            INSERT INTO inventory_stock (id, created_at, updated_at, qty, reserved, product_id, warehouse_id)
+            SELECT gen_random_uuid(), now(), now(), 0, 0, product_id, warehouse_id
+            FROM (
+                SELECT DISTINCT product_id, warehouse_id
+                FROM (%s) AS delta (product_id, warehouse_id, qty, reserved)
+            ) new_positions
+            ORDER BY product_id, warehouse_id
+            ON CONFLICT ON CONSTRAINT unique_product_warehouse_stock DO NOTHING
+        $sql$, deltas);
+    END IF;
+
+    -- Delta por posición y cantidad de la posición después de la sentencia
+    positions := format($sql$
+        SELECT d.product_id, d.qty, d.reserved, pos.qty AS position_qty
+        FROM (
+            SELECT product_id, warehouse_id, SUM(qty) AS qty, SUM(reserved) AS reserved
+            FROM (%s) AS delta (product_id, warehouse_id, qty, reserved)
+            GROUP BY product_id, warehouse_id
+        ) d
+        CROSS JOIN LATERAL (
+            SELECT COALESCE(SUM(position_rows.qty), 0) AS qty
+            FROM (
+                SELECT st.qty FROM inventory_stock st
+                WHERE st.product_id = d.product_id AND st.warehouse_id = d.warehouse_id
+                UNION ALL
+                SELECT m.qty_delta FROM inventory_stockmovement m
+                WHERE m.product_id = d.product_id AND m.warehouse_id = d.warehouse_id
+                  AND m.compacted_at IS NULL
+            ) AS position_rows (qty)
+        ) pos
+    $sql$, deltas);
+
+    IF TG_OP = 'DELETE' THEN
+        -- Sin upsert: si el producto se está eliminando su resumen ya no existe
+        EXECUTE format($sql$
+            UPDATE inventory_productstocksummary s SET
+                total_qty = s.total_qty + d.qty,
+                total_reserved = s.total_reserved + d.reserved,
+                warehouse_count = s.warehouse_count + d.stocked,
+                updated_at = now()
+            FROM (
+                SELECT product_id, SUM(qty) AS qty, SUM(reserved) AS reserved,
+                       SUM((position_qty > 0)::INT - (position_qty - qty > 0)::INT) AS stocked
+                FROM (%s) AS changed
+                GROUP BY product_id
+            ) d
+            WHERE s.product_id = d.product_id
+        $sql$, positions);
+    ELSE
+        EXECUTE format($sql$
+            INSERT INTO inventory_productstocksummary
+                (id, created_at, updated_at, product_id, total_qty, total_reserved, warehouse_count)
+            SELECT gen_random_uuid(), now(), now(), product_id, SUM(qty), SUM(reserved),
+                   SUM((position_qty > 0)::INT - (position_qty - qty > 0)::INT)
+            FROM (%s) AS changed
+            GROUP BY product_id
+            ORDER BY product_id
+            ON CONFLICT (product_id) DO UPDATE SET
+                total_qty = inventory_productstocksummary.total_qty + EXCLUDED.total_qty,
+                total_reserved = inventory_productstocksummary.total_reserved + EXCLUDED.total_reserved,
+                warehouse_count = inventory_productstocksummary.warehouse_count + EXCLUDED.warehouse_count,
+                updated_at = now()
+        $sql$, positions);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS stock_summary_movement_insert ON inventory_stockmovement;
+DROP TRIGGER IF EXISTS stock_summary_movement_delete ON inventory_stockmovement;
+
+CREATE TRIGGER stock_summary_movement_insert
+    AFTER INSERT ON inventory_stockmovement
+    REFERENCING NEW TABLE AS new_movements
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_stock_summary_from_movements();
+
+CREATE TRIGGER stock_summary_movement_delete
+    AFTER DELETE ON inventory_stockmovement
+    REFERENCING OLD TABLE AS old_movements
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_stock_summary_from_movements();
+"""
+
+DROP_STOCK_MOVEMENT_SUMMARY_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS stock_summary_movement_insert ON inventory_stockmovement;
+DROP TRIGGER IF EXISTS stock_summary_movement_delete ON inventory_stockmovement;
+DROP FUNCTION IF EXISTS sync_stock_summary_from_movements();
+"""
+
+# Recalcula el resumen de stock desde cero (backfill y reconciliación) sobre
+# la posición de cada producto y bodega: foto más movimientos pendientes
+REBUILD_STOCK_SUMMARY_SQL = """
+DELETE FROM inventory_productstocksummary;
+
+INSERT INTO inventory_productstocksummary
+    (id, created_at, updated_at, product_id, total_qty, total_reserved, warehouse_count)
+SELECT
+    gen_random_uuid(), now(), now(), product_id,
+    SUM(qty), SUM(reserved), COUNT(*) FILTER (WHERE qty > 0)
+FROM (
+    SELECT product_id, warehouse_id, SUM(qty) AS qty, SUM(reserved) AS reserved
+    FROM (
+        SELECT product_id, warehouse_id, qty, reserved FROM inventory_stock
+        UNION ALL
+        SELECT product_id, warehouse_id, qty_delta, reserved_delta FROM inventory_stockmovement
+        WHERE compacted_at IS NULL
+    ) AS position_rows (product_id, warehouse_id, qty, reserved)
+    GROUP BY product_id, warehouse_id
+) positions
+GROUP BY product_id;
+"""
+
 # SQL para eliminar las funciones (usado en migración reversa)
 DROP_FUNCTIONS_SQL = """
 DROP FUNCTION IF EXISTS get_products_by_brand_and_customer(VARCHAR, VARCHAR);
@@ -0,0 +1,66 @@
+"""
+Respuestas JSON en streaming para listados grandes
+
+El queryset se recorre con .iterator(chunk_size=...) y se serializa por
+bloques, de modo que la memoria del worker no crece con el número de filas.
+"""
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+DEFAULT_CHUNK_SIZE = getattr(settings, 'STREAMING_CHUNK_SIZE', 500)
+
+
+def get_stream_format(request):
+    """Formato de streaming solicitado con ?stream=json|ndjson, o None"""
+    stream_format = request.query_params.get('stream', '').lower()
+    return stream_format if stream_format in STREAM_FORMATS else None
+
+
+def iter_chunks(queryset, chunk_size):
+    """Recorre el queryset en bloques sin cachear los resultados"""
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _encode(row):
+    return json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def stream_queryset(queryset, serialize, stream_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Construye un StreamingHttpResponse con el queryset serializado por bloques.
+
+    serialize recibe una lista de instancias y retorna una lista de dicts.
+    El formato 'json' produce un arreglo JSON y 'ndjson' un objeto por línea.
+    """
+    def generate():
+        if stream_format == 'ndjson':
+            for chunk in iter_chunks(queryset, chunk_size):
+                yield ''.join(f'{_encode(row)}\n' for row in serialize(chunk))
+            return
+
+        yield '['
+        separator = ''
+        for chunk in iter_chunks(queryset, chunk_size):
+            rows = serialize(chunk)
+            if rows:
+                yield separator + ','.join(_encode(row) for row in rows)
+                separator = ','
+        yield ']'
+
+    return StreamingHttpResponse(generate(), content_type=STREAM_FORMATS[stream_format])
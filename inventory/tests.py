@@ -0,0 +1,863 @@
+import io
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .cache import bump_tables
+from .db_routers import (
+    REPLICA_ALIAS, STICKY_COOKIE, ReplicaRoutingMiddleware, mark_written, read_alias, route_reads
+)
+from .confirmations import enqueue_confirmation, process_confirmation_batch
+from .imports import import_catalog
+from .ledger import InvalidMovementError, compact_movements, get_availability, record_movement
+from .models import (
+    Brand, Category, Customer, Order, OrderConfirmation, OrderItem, Payment, Product, Stock,
+    StockMovement, Warehouse
+)
+from .payments import confirm_payments
+from .reports import get_top_selling_products, run_report_function, stock_summary_mismatches
+from .reservations import InsufficientStockError, allocate_orders, allocate_stock, confirm_order
+
+
+REPLICA_CONFIGURED = REPLICA_ALIAS in settings.DATABASES
+POSTGRESQL = connection.vendor == 'postgresql'
+
+
+@mock.patch('inventory.db_routers.replica_configured', return_value=True)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Decisión de enrutamiento y cookie de read-your-writes, sin consultar la base de datos"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _call(self, request, view=None, status=200):
+        seen = {}
+
+        def get_response(request):
+            if view is not None:
+                view()
+            seen['alias'] = read_alias()
+            return HttpResponse(status=status)
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return seen['alias'], response
+
+    def test_outside_request_reads_primary(self, replica_configured):
+        self.assertEqual(read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_safe_request_reads_replica(self, replica_configured):
+        alias, response = self._call(self.factory.get('/api/v1/brands/'))
+        self.assertEqual(alias, REPLICA_ALIAS)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_write_pins_request_to_primary(self, replica_configured):
+        with route_reads(True):
+            self.assertEqual(read_alias(), REPLICA_ALIAS)
+            mark_written()
+            self.assertEqual(read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_unsafe_request_sets_sticky_cookie(self, replica_configured):
+        # Sin pasar por db_for_write, como los COPY o UPDATE crudos
+        alias, response = self._call(self.factory.post('/api/v1/payments/confirm-bulk/'))
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_failed_unsafe_request_does_not_set_cookie(self, replica_configured):
+        _, response = self._call(self.factory.post('/api/v1/orders/'), status=400)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_raw_write_in_safe_request_sets_cookie(self, replica_configured):
+        # Las rutas de SQL crudo invalidan el caché con bump_tables
+        view = lambda: bump_tables('inventory_payment')  # noqa: E731
+        with mock.patch('inventory.cache.transaction.on_commit'):
+            alias, response = self._call(self.factory.get('/api/v1/brands/'), view=view)
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_sticky_cookie_reads_primary(self, replica_configured):
+        request = self.factory.get('/api/v1/brands/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        alias, _ = self._call(request)
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+
+
+@skipUnless(REPLICA_CONFIGURED, 'Requiere la réplica configurada (DB_REPLICA_HOST)')
+class ReplicaAliasTests(TestCase):
+    """
+    Consultas por alias con la réplica como espejo del primario (TEST MIRROR).
+    El espejo es otra conexión: no ve los datos sin confirmar del TestCase,
+    así que se comparan alias y número de consultas, no resultados.
+    """
+
+    databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS} if REPLICA_CONFIGURED else {DEFAULT_DB_ALIAS}
+
+    def _queries(self, method, url, **extra):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            response = getattr(self.client, method)(url, **extra)
+        return response, len(primary), len(replica)
+
+    def test_list_reads_from_replica(self):
+        response, primary, replica = self._queries('get', '/api/v1/stocks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_write_goes_to_primary_and_pins_client(self):
+        response, primary, replica = self._queries(
+            'post', '/api/v1/brands/', data={'name': 'Acme'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        # El cliente de test reenvía la cookie: la siguiente lectura va al primario
+        response, primary, replica = self._queries('get', '/api/v1/stocks/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_querysets_outside_requests_use_primary(self):
+        self.assertEqual(Brand.objects.all().db, DEFAULT_DB_ALIAS)
+        with route_reads(True):
+            self.assertEqual(Brand.objects.all().db, REPLICA_ALIAS)
+
+
+@mock.patch('inventory.views.CONDITIONAL_GET_ENABLED', False)
+@mock.patch('inventory.db_routers.replica_configured', return_value=False)
+class AnnotatedViewSetQueryCountTests(TestCase):
+    """
+    Los agregados de list, retrieve y get_related salen de anotaciones: el
+    número de consultas no depende de cuántas filas o relaciones haya
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouses = [Warehouse.objects.create(name=f'Bodega {index}', city='Lima') for index in range(3)]
+        cls.brands = [Brand.objects.create(name=f'Marca {index}') for index in range(3)]
+        cls.categories = [Category.objects.create(name=f'Categoría {index}') for index in range(3)]
+        cls.customers = [
+            Customer.objects.create(full_name=f'Cliente {index}', email=f'cliente{index}@example.com')
+            for index in range(3)
+        ]
+        for index, (brand, category) in enumerate(zip(cls.brands, cls.categories)):
+            for number in range(4):
+                product = Product.objects.create(
+                    name=f'Producto {index}-{number}', sku=f'SKU-{index}-{number}',
+                    price=Decimal('5.00'), brand=brand, category=category
+                )
+                for warehouse in cls.warehouses:
+                    Stock.objects.create(product=product, warehouse=warehouse, qty=10)
+        for customer in cls.customers:
+            for _ in range(2):
+                order = Order.objects.create(customer=customer)
+                OrderItem.objects.create(order=order, product=product, qty=1, unit_price=Decimal('5.00'))
+                Payment.objects.create(order=order, method='CARD', amount=Decimal('5.00'), status='CONFIRMED')
+
+    def _assert_queries(self, url, expected):
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_brands(self, replica_configured):
+        data = self._assert_queries('/api/v1/brands/', 2)
+        self.assertEqual({row['products_count'] for row in data['results']}, {4})
+        self._assert_queries(f'/api/v1/brands/{self.brands[0].pk}/', 1)
+        self._assert_queries('/api/v1/brands/get_related/', 1)
+
+    def test_categories(self, replica_configured):
+        data = self._assert_queries('/api/v1/categories/', 2)
+        self.assertEqual({row['products_count'] for row in data['results']}, {4})
+        self._assert_queries(f'/api/v1/categories/{self.categories[0].pk}/', 1)
+        self._assert_queries('/api/v1/categories/get_related/', 1)
+
+    def test_warehouses(self, replica_configured):
+        data = self._assert_queries('/api/v1/warehouses/', 2)
+        self.assertEqual({row['total_products'] for row in data['results']}, {12})
+        self._assert_queries(f'/api/v1/warehouses/{self.warehouses[0].pk}/', 1)
+        self._assert_queries('/api/v1/warehouses/get_related/', 1)
+
+    def test_customers(self, replica_configured):
+        data = self._assert_queries('/api/v1/customers/', 2)
+        self.assertEqual(
+            {(row['orders_count'], Decimal(str(row['total_spent']))) for row in data['results']},
+            {(2, Decimal('10'))}
+        )
+        self._assert_queries(f'/api/v1/customers/{self.customers[0].pk}/', 1)
+        self._assert_queries('/api/v1/customers/get_related/', 1)
+
+
+@mock.patch('inventory.db_routers.replica_configured', return_value=False)
+class OrderBulkCreateTests(TestCase):
+    """POST /orders/bulk/: inserción en bloque con errores por índice"""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Acme')
+        category = Category.objects.create(name='Audio')
+        warehouse = Warehouse.objects.create(name='Central', city='Lima')
+        cls.customer = Customer.objects.create(full_name='Ana', email='ana@example.com')
+        cls.products = [
+            Product.objects.create(
+                name=f'Producto {index}', sku=f'SKU-{index}', price=Decimal('10.50') + index,
+                brand=brand, category=category
+            )
+            for index in range(3)
+        ]
+        for product in cls.products:
+            Stock.objects.create(product=product, warehouse=warehouse, qty=10)
+
+    def _order(self, *items):
+        return {
+            'customer': str(self.customer.pk),
+            'items': [
+                {'product': str(product.pk), 'qty': qty, 'unit_price': str(product.price)}
+                for product, qty in items
+            ],
+        }
+
+    def _post(self, orders):
+        return self.client.post('/api/v1/orders/bulk/', orders, content_type='application/json')
+
+    def test_all_valid_returns_created(self, replica_configured):
+        first, second, third = self.products
+        response = self._post([
+            self._order((first, 2), (second, 1)),
+            self._order((third, 4)),
+        ])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        created = response.json()['created']
+        self.assertEqual([row['index'] for row in created], [0, 1])
+        self.assertEqual(response.json()['errors'], [])
+        self.assertEqual(
+            [(Decimal(str(row['total_amount'])), row['total_items']) for row in created],
+            [(Decimal('32.50'), 3), (Decimal('50.00'), 4)]
+        )
+
+    def test_totals_match_recalculate_totals(self, replica_configured):
+        first, second, third = self.products
+        response = self._post([
+            self._order((first, 3), (second, 2), (third, 1)),
+            self._order((second, 5)),
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+
+        orders = Order.objects.filter(pk__in=[row['id'] for row in response.json()['created']])
+        self.assertFalse(orders.with_inconsistent_totals().exists())
+        stored = dict(orders.values_list('id', 'total_amount'))
+        orders.recalculate_totals()
+        self.assertEqual(dict(orders.values_list('id', 'total_amount')), stored)
+
+    def test_partial_failure_returns_multi_status(self, replica_configured):
+        first, second, _ = self.products
+        response = self._post([
+            self._order((first, 1)),
+            self._order((second, 11)),
+        ])
+
+        self.assertEqual(response.status_code, 207, response.content)
+        self.assertEqual([row['index'] for row in response.json()['created']], [0])
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertIn('No hay suficiente stock de SKU-1', str(response.json()['errors'][0]['errors']))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_all_invalid_returns_bad_request(self, replica_configured):
+        first, _, _ = self.products
+        response = self._post([
+            self._order((first, 11)),
+            {'customer': str(self.customer.pk), 'items': [{'product': 'no-existe', 'qty': 1, 'unit_price': '1.00'}]},
+        ])
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()['created'], [])
+        self.assertEqual([error['index'] for error in response.json()['errors']], [0, 1])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self._post({'customer': str(self.customer.pk)}).status_code, 400)
+
+    def test_repeated_product_is_rejected(self, replica_configured):
+        first, second, _ = self.products
+        response = self._post([
+            self._order((first, 1), (second, 1), (first, 2)),
+            self._order((second, 1)),
+        ])
+
+        self.assertEqual(response.status_code, 207, response.content)
+        self.assertIn('El producto SKU-0 está repetido en la orden', str(response.json()['errors'][0]['errors']))
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+    def test_queries_do_not_depend_on_items(self, replica_configured):
+        # Cliente, productos y disponible de todo el lote, savepoint, dos bulk_create y release
+        for orders, products in ((1, self.products[:1]), (6, self.products)):
+            with self.subTest(orders=orders, products=len(products)):
+                with self.assertNumQueries(7):
+                    response = self._post([
+                        self._order(*((product, 1) for product in products)) for _ in range(orders)
+                    ])
+                self.assertEqual(response.status_code, 201, response.content)
+
+    def test_create_queries_do_not_depend_on_items(self, replica_configured):
+        # Lo mismo que el lote más una consulta para los items (con su producto) de la respuesta
+        for products in (self.products[:1], self.products):
+            with self.subTest(products=len(products)):
+                with self.assertNumQueries(8):
+                    response = self.client.post(
+                        '/api/v1/orders/', self._order(*((product, 2) for product in products)),
+                        content_type='application/json'
+                    )
+                self.assertEqual(response.status_code, 201, response.content)
+                self.assertEqual(
+                    sorted(item['product_sku'] for item in response.json()['items']),
+                    [product.sku for product in products]
+                )
+
+
+@skipUnless(POSTGRESQL, 'El resumen diario y las funciones SQL requieren PostgreSQL')
+class DailySalesSummaryTests(TestCase):
+    """El top calculado sobre el resumen diario coincide con la función SQL get_top_selling_products"""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Acme')
+        category = Category.objects.create(name='Audio')
+        warehouse = Warehouse.objects.create(name='Central', city='Lima')
+        cls.customer = Customer.objects.create(full_name='Ana', email='ana@example.com')
+        cls.products = [
+            Product.objects.create(
+                name=f'Producto {index}', sku=f'SKU-{index}', price=Decimal('10.00') + index,
+                brand=brand, category=category
+            )
+            for index in range(3)
+        ]
+        for product in cls.products:
+            Stock.objects.create(product=product, warehouse=warehouse, qty=1000)
+
+    def _order(self, *quantities):
+        order = Order.objects.create(customer=self.customer)
+        for product, qty in zip(self.products, quantities):
+            OrderItem.objects.create(order=order, product=product, qty=qty, unit_price=product.price + qty)
+        return order
+
+    def assert_matches_function(self):
+        def rows(results):
+            return sorted(
+                (
+                    row['product_id'], row['total_quantity_sold'], row['total_orders'],
+                    row['total_revenue'], round(row['avg_unit_price'], 2),
+                )
+                for row in results
+            )
+
+        expected = run_report_function('get_top_selling_products', [100, None, None])
+        self.assertEqual(rows(get_top_selling_products(100)), rows(expected))
+
+    def test_confirm_order(self):
+        confirm_order(self._order(3, 1))
+        confirm_order(self._order(2, 1, 5))
+        self._order(7, 7, 7)
+        self.assert_matches_function()
+
+    def test_confirmation_batch(self):
+        for quantities in ((1, 2), (4,), (1, 3, 3)):
+            enqueue_confirmation(self._order(*quantities))
+        process_confirmation_batch()
+        self.assert_matches_function()
+
+    def test_status_changes_through_api(self):
+        canceled = self._order(3, 1)
+        confirm_order(canceled)
+        pending = self._order(2, 2, 2)
+
+        for order, new_status in ((canceled, 'CANCELED'), (pending, 'CONFIRMED')):
+            response = self.client.patch(
+                f'/api/v1/orders/{order.pk}/', {'status': new_status}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assert_matches_function()
+
+    def test_delete_confirmed_order(self):
+        kept = self._order(1, 1)
+        deleted = self._order(5, 5, 5)
+        confirm_order(kept)
+        confirm_order(deleted)
+        deleted.delete()
+        self.assert_matches_function()
+
+
+class StockLedgerTests(TestCase):
+    """Validación de movimientos, compactación y posición a una fecha del libro de stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Parlante', sku='SKU-LEDGER', price=Decimal('10.00'),
+            brand=Brand.objects.create(name='Acme'), category=Category.objects.create(name='Audio')
+        )
+        cls.warehouse = Warehouse.objects.create(name='Central', city='Lima')
+        cls.order = Order.objects.create(
+            customer=Customer.objects.create(full_name='Ana', email='ana@example.com')
+        )
+
+    def _move(self, kind, qty_delta=0, reserved_delta=0, **extra):
+        return StockMovement.objects.create(
+            product=self.product, warehouse=self.warehouse, kind=kind,
+            qty_delta=qty_delta, reserved_delta=reserved_delta, **extra
+        )
+
+    def _position(self, at=None):
+        availability = get_availability(self.product, at)
+        return availability['qty'], availability['reserved']
+
+    @skipUnless(POSTGRESQL, 'El lock por producto usa pg_advisory_xact_lock')
+    def test_release_larger_than_held_is_rejected(self):
+        self._move('RECEIPT', qty_delta=10)
+        self._move('RESERVATION', reserved_delta=3, order=self.order)
+
+        with self.assertRaises(InvalidMovementError):
+            record_movement(self.product, self.warehouse, 'RELEASE', 4, order=self.order)
+        record_movement(self.product, self.warehouse, 'RELEASE', 3, order=self.order)
+
+        self.assertEqual(self._position(), (10, 0))
+        self.assertEqual(StockMovement.objects.filter(kind='RELEASE').count(), 1)
+
+    @skipUnless(POSTGRESQL, 'El lock por producto usa pg_advisory_xact_lock')
+    def test_movements_below_reserved_are_rejected(self):
+        self._move('RECEIPT', qty_delta=10)
+        self._move('RESERVATION', reserved_delta=8, order=self.order)
+
+        # El despacho consume reserva: no puede superar lo reservado
+        with self.assertRaises(InvalidMovementError):
+            record_movement(self.product, self.warehouse, 'SHIPMENT', 9)
+        # Un ajuste no puede dejar qty por debajo de reserved
+        with self.assertRaises(InvalidMovementError):
+            record_movement(self.product, self.warehouse, 'ADJUSTMENT', -3)
+
+        self.assertEqual(self._position(), (10, 8))
+
+    @skipUnless(POSTGRESQL, 'La compactación y el resumen de stock usan SQL de PostgreSQL')
+    def test_compaction_keeps_positions(self):
+        other = Warehouse.objects.create(name='Norte', city='Trujillo')
+        Stock.objects.create(product=self.product, warehouse=self.warehouse, qty=20)
+        self._move('RECEIPT', qty_delta=5)
+        self._move('RESERVATION', reserved_delta=4, order=self.order)
+        self._move('SHIPMENT', qty_delta=-1, reserved_delta=-1, order=self.order)
+        StockMovement.objects.create(
+            product=self.product, warehouse=other, kind='RECEIPT', qty_delta=7
+        )
+        before = get_availability(self.product)
+        self.assertEqual(stock_summary_mismatches(), {})
+
+        self.assertEqual(compact_movements(), (4, 2))
+
+        self.assertEqual(get_availability(self.product), before)
+        self.assertFalse(StockMovement.objects.filter(compacted_at__isnull=True).exists())
+        self.assertEqual(
+            list(Stock.objects.order_by('warehouse__name').values_list('qty', 'reserved')),
+            [(24, 3), (7, 0)]
+        )
+        self.assertEqual(stock_summary_mismatches(), {})
+
+    def test_position_at_matches_history(self):
+        now = timezone.now()
+        times = [now - timedelta(hours=hours) for hours in (3, 2, 1)]
+        # Recepción ya compactada en la foto, luego movimientos pendientes
+        Stock.objects.create(product=self.product, warehouse=self.warehouse, qty=10)
+        self._move('RECEIPT', qty_delta=10, created_at=times[0], compacted_at=times[0])
+        self._move('RECEIPT', qty_delta=5, created_at=times[1])
+        self._move('RESERVATION', reserved_delta=4, order=self.order, created_at=times[2])
+        self._move('ADJUSTMENT', qty_delta=-3, created_at=times[2])
+
+        self.assertEqual(self._position(times[0] - timedelta(minutes=1)), (0, 0))
+        self.assertEqual(self._position(times[0] + timedelta(minutes=1)), (10, 0))
+        self.assertEqual(self._position(times[1] + timedelta(minutes=1)), (15, 0))
+        self.assertEqual(self._position(times[2] + timedelta(minutes=1)), (12, 4))
+        self.assertEqual(self._position(), (12, 4))
+
+
+@skipUnless(POSTGRESQL, 'La asignación de stock usa SQL de PostgreSQL')
+class AllocateOrdersTests(TestCase):
+    """Reparto de la demanda entre bodegas con la sentencia de ALLOCATE_STOCK_SQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Acme')
+        category = Category.objects.create(name='Audio')
+        cls.product, cls.other = [
+            Product.objects.create(
+                name=f'Producto {index}', sku=f'SKU-{index}', price=Decimal('10.00'),
+                brand=brand, category=category
+            )
+            for index in range(2)
+        ]
+        # Cantidades desordenadas respecto al nombre: la prioridad es por qty
+        cls.small, cls.large, cls.medium = [
+            Warehouse.objects.create(name=name, city='Lima') for name in ('A', 'B', 'C')
+        ]
+        for warehouse, qty in ((cls.small, 3), (cls.large, 10), (cls.medium, 5)):
+            Stock.objects.create(product=cls.product, warehouse=warehouse, qty=qty)
+        Stock.objects.create(product=cls.other, warehouse=cls.small, qty=50)
+
+        customer = Customer.objects.create(full_name='Ana', email='ana@example.com')
+        cls.first, cls.second = [Order.objects.create(customer=customer) for _ in range(2)]
+
+    def _reservations(self):
+        return sorted(
+            StockMovement.objects.filter(kind='RESERVATION').values_list(
+                'order_id', 'warehouse__name', 'reserved_delta'
+            )
+        )
+
+    def test_splits_across_warehouses_largest_first(self):
+        allocations = allocate_stock({self.product.pk: 14}, order_id=self.first.pk)
+
+        self.assertEqual(
+            sorted(allocations),
+            sorted([
+                (str(self.product.pk), str(self.large.pk), 10),
+                (str(self.product.pk), str(self.medium.pk), 4),
+            ])
+        )
+        self.assertEqual(self._reservations(), [(self.first.pk, 'B', 10), (self.first.pk, 'C', 4)])
+
+    def test_demand_rows_of_same_product_in_order(self):
+        allocate_orders([
+            (self.first.pk, self.product.pk, 4),
+            (self.second.pk, self.product.pk, 8),
+        ])
+
+        # La primera fila ocupa el inicio de la bodega más grande; la segunda sigue
+        self.assertEqual(
+            self._reservations(),
+            sorted([
+                (self.first.pk, 'B', 4),
+                (self.second.pk, 'B', 6),
+                (self.second.pk, 'C', 2),
+            ])
+        )
+
+    def test_shortage_rolls_back_every_reservation(self):
+        with self.assertRaises(InsufficientStockError) as raised:
+            allocate_orders([
+                (self.first.pk, self.other.pk, 5),
+                (self.first.pk, self.product.pk, 12),
+                (self.second.pk, self.product.pk, 8),
+            ])
+
+        self.assertEqual(raised.exception.shortages, {str(self.product.pk): 2})
+        self.assertIn('Producto 0', str(raised.exception))
+        self.assertEqual(self._reservations(), [])
+
+
+@skipUnless(POSTGRESQL, 'La asignación de stock usa SQL y advisory locks de PostgreSQL')
+class ConcurrentConfirmationTests(TransactionTestCase):
+    """Dos confirmaciones simultáneas sobre el mismo SKU no venden más de lo disponible"""
+
+    def setUp(self):
+        product = Product.objects.create(
+            name='Parlante', sku='SKU-HOT', price=Decimal('10.00'),
+            brand=Brand.objects.create(name='Acme'), category=Category.objects.create(name='Audio')
+        )
+        Stock.objects.create(product=product, warehouse=Warehouse.objects.create(name='Central', city='Lima'), qty=5)
+        customer = Customer.objects.create(full_name='Ana', email='ana@example.com')
+        self.orders = []
+        for _ in range(2):
+            order = Order.objects.create(customer=customer)
+            OrderItem.objects.create(order=order, product=product, qty=3, unit_price=Decimal('10.00'))
+            self.orders.append(order)
+
+    def test_same_sku_is_not_oversold(self):
+        barrier = threading.Barrier(len(self.orders))
+        outcomes = []
+
+        def confirm(order):
+            try:
+                barrier.wait()
+                confirm_order(order)
+                outcomes.append('confirmed')
+            except InsufficientStockError:
+                outcomes.append('shortage')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=confirm, args=(order,)) for order in self.orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['confirmed', 'shortage'])
+        self.assertEqual(
+            StockMovement.objects.filter(kind='RESERVATION').aggregate(total=Sum('reserved_delta'))['total'], 3
+        )
+        self.assertEqual(Order.objects.filter(status='CONFIRMED').count(), 1)
+
+
+class ConfirmationQueueMixin:
+    """Producto con 5 unidades en una bodega y órdenes de un solo item encoladas"""
+
+    def create_catalog(self):
+        self.product = Product.objects.create(
+            name='Parlante', sku='SKU-HOT', price=Decimal('10.00'),
+            brand=Brand.objects.create(name='Acme'), category=Category.objects.create(name='Audio')
+        )
+        Stock.objects.create(product=self.product, warehouse=Warehouse.objects.create(name='Central', city='Lima'), qty=5)
+        self.customer = Customer.objects.create(full_name='Ana', email='ana@example.com')
+
+    def enqueue(self, qty):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, product=self.product, qty=qty, unit_price=Decimal('10.00'))
+        return enqueue_confirmation(order)
+
+    def statuses(self, requests):
+        return [OrderConfirmation.objects.get(pk=request.pk).status for request in requests]
+
+
+@skipUnless(POSTGRESQL, 'La asignación de stock usa SQL y advisory locks de PostgreSQL')
+class ConfirmationBatchTests(ConfirmationQueueMixin, TestCase):
+    """El worker acepta en orden de llegada y nunca deja un lote en cola por falta de stock"""
+
+    def setUp(self):
+        self.create_catalog()
+
+    def test_accepts_in_arrival_order_while_stock_lasts(self):
+        requests = [self.enqueue(qty) for qty in (3, 3, 2)]
+
+        self.assertEqual(process_confirmation_batch(), {'confirmed': 2, 'rejected': 1})
+        self.assertEqual(self.statuses(requests), ['CONFIRMED', 'REJECTED', 'CONFIRMED'])
+        self.assertIn('Stock insuficiente para Parlante', OrderConfirmation.objects.get(pk=requests[1].pk).error)
+        self.assertEqual(
+            sorted(Order.objects.values_list('status', flat=True)), ['CONFIRMED', 'CONFIRMED', 'PENDING']
+        )
+
+    def test_rejects_orders_no_longer_pending(self):
+        canceled, pending = self.enqueue(1), self.enqueue(1)
+        Order.objects.filter(pk=canceled.order_id).update(status='CANCELED')
+
+        self.assertEqual(process_confirmation_batch(), {'confirmed': 1, 'rejected': 1})
+        self.assertEqual(self.statuses([canceled, pending]), ['REJECTED', 'CONFIRMED'])
+        self.assertEqual(
+            OrderConfirmation.objects.get(pk=canceled.pk).error, 'Solo se pueden confirmar órdenes pendientes'
+        )
+        self.assertFalse(StockMovement.objects.filter(order_id=canceled.order_id).exists())
+
+    def test_failed_joint_allocation_falls_back_to_each_order(self):
+        requests = [self.enqueue(qty) for qty in (2, 3)]
+        calls = []
+
+        # La asignación conjunta y la de la segunda orden fallan (ej: otro reparto entre bodegas)
+        def allocate(demand_rows):
+            calls.append(demand_rows)
+            if len(calls) == 1 or demand_rows[0][0] == requests[1].order_id:
+                raise InsufficientStockError({str(self.product.pk): 1}, {str(self.product.pk): 'Parlante'})
+            return allocate_orders(demand_rows)
+
+        with mock.patch('inventory.confirmations.allocate_orders', side_effect=allocate):
+            self.assertEqual(process_confirmation_batch(), {'confirmed': 1, 'rejected': 1})
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.statuses(requests), ['CONFIRMED', 'REJECTED'])
+        self.assertIn('Stock insuficiente para Parlante', OrderConfirmation.objects.get(pk=requests[1].pk).error)
+        self.assertEqual(
+            list(StockMovement.objects.filter(kind='RESERVATION').values_list('order_id', flat=True)),
+            [requests[0].order_id]
+        )
+
+
+@skipUnless(POSTGRESQL, 'SKIP LOCKED requiere PostgreSQL')
+class ConfirmationWorkerLockingTests(ConfirmationQueueMixin, TransactionTestCase):
+    """Dos workers no toman la misma solicitud: la bloqueada se salta hasta que se libera"""
+
+    def setUp(self):
+        self.create_catalog()
+
+    def test_locked_request_is_skipped(self):
+        held, free = self.enqueue(1), self.enqueue(1)
+        locked = threading.Event()
+        release = threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    list(OrderConfirmation.objects.select_for_update().filter(pk=held.pk))
+                    locked.set()
+                    release.wait(timeout=10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(timeout=10))
+            self.assertEqual(process_confirmation_batch(), {'confirmed': 1, 'rejected': 0})
+            self.assertEqual(self.statuses([held, free]), ['QUEUED', 'CONFIRMED'])
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(process_confirmation_batch(), {'confirmed': 1, 'rejected': 0})
+        self.assertEqual(self.statuses([held, free]), ['CONFIRMED', 'CONFIRMED'])
+
+
+@skipUnless(POSTGRESQL, 'La confirmación en bloque usa un UPDATE con uuid[] de PostgreSQL')
+class PaymentBulkConfirmationTests(TestCase):
+    """Un UPDATE para todos los pagos y un resultado por id recibido"""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(full_name='Ana', email='ana@example.com')
+        cls.pending, cls.other_pending, cls.failed = [
+            Payment.objects.create(
+                order=Order.objects.create(customer=customer), method='CARD',
+                amount=Decimal('10.00'), status=payment_status
+            )
+            for payment_status in ('PENDING', 'PENDING', 'FAILED')
+        ]
+
+    def test_outcome_per_id(self):
+        missing = '00000000-0000-0000-0000-000000000000'
+        with mock.patch('inventory.payments.bump_tables') as bump:
+            results = confirm_payments([str(self.pending.pk), str(self.failed.pk), missing, 'abc'])
+
+        self.assertEqual(results, [
+            {'id': str(self.pending.pk), 'outcome': 'confirmed'},
+            {'id': str(self.failed.pk), 'outcome': 'not_pending', 'status': 'FAILED'},
+            {'id': missing, 'outcome': 'not_found'},
+            {'id': 'abc', 'outcome': 'invalid_id'},
+        ])
+        bump.assert_called_once_with('inventory_payment')
+        self.assertEqual(
+            dict(Payment.objects.values_list('id', 'status')),
+            {self.pending.pk: 'CONFIRMED', self.other_pending.pk: 'PENDING', self.failed.pk: 'FAILED'}
+        )
+
+    def test_duplicate_id_is_reported_once(self):
+        results = confirm_payments([str(self.pending.pk), str(self.failed.pk), str(self.pending.pk)])
+
+        self.assertEqual(results, [
+            {'id': str(self.pending.pk), 'outcome': 'confirmed'},
+            {'id': str(self.failed.pk), 'outcome': 'not_pending', 'status': 'FAILED'},
+        ])
+
+    def test_nothing_confirmed_does_not_bump(self):
+        with mock.patch('inventory.payments.bump_tables') as bump:
+            confirm_payments([str(self.failed.pk)])
+        bump.assert_not_called()
+
+    def test_confirm_bulk_endpoint(self):
+        with mock.patch('inventory.payments.bump_tables') as bump:
+            response = self.client.post(
+                '/api/v1/payments/confirm-bulk/',
+                {'ids': [str(self.pending.pk), str(self.other_pending.pk), str(self.failed.pk)]},
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['confirmed'], 2)
+        self.assertEqual(
+            [result['outcome'] for result in response.json()['results']],
+            ['confirmed', 'confirmed', 'not_pending']
+        )
+        bump.assert_called_once_with('inventory_payment')
+
+    def test_confirm_bulk_rejects_empty_list(self):
+        response = self.client.post('/api/v1/payments/confirm-bulk/', {'ids': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(POSTGRESQL, 'La importación copia a staging con COPY de PostgreSQL')
+class ImportCatalogTests(TestCase):
+    """Cada línea rechazada se reporta con su número y motivo sin detener el resto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Acme')
+        category = Category.objects.create(name='Audio')
+        cls.product, cls.reserved_product = [
+            Product.objects.create(
+                name=f'Producto {index}', sku=f'SKU-{index}', price=Decimal('10.00'),
+                brand=brand, category=category
+            )
+            for index in range(2)
+        ]
+        cls.central = Warehouse.objects.create(name='Central', city='Lima')
+        cls.north_lima = Warehouse.objects.create(name='Norte', city='Lima')
+        cls.north_cusco = Warehouse.objects.create(name='Norte', city='Cusco')
+        cls.south = Warehouse.objects.create(name='Sur', city='Arequipa')
+        Stock.objects.create(product=cls.product, warehouse=cls.central, qty=10)
+        Stock.objects.create(product=cls.reserved_product, warehouse=cls.central, qty=10, reserved=4)
+        Stock.objects.create(product=cls.reserved_product, warehouse=cls.north_lima, qty=2)
+
+    def _import(self, kind, content, file_format='csv'):
+        return import_catalog(kind, io.BytesIO(content.encode()), file_format=file_format)
+
+    def _errors(self, result):
+        return [(error['line'], error['error']) for error in result['errors']]
+
+    def test_product_errors_per_line(self):
+        result = self._import('products', (
+            'sku,name,price,brand,category\n'
+            'NEW-1,Nuevo,12.50,Acme,Audio\n'
+            'SKU-0,Renombrado,11.00,Acme,Audio\n'
+            'NEW-2,Precio malo,abc,Acme,Audio\n'
+            'NEW-1,Repetido,1.00,Acme,Audio\n'
+            'NEW-3,Sin marca,1.00,Otra,Audio\n'
+        ))
+
+        self.assertEqual(
+            (result['total'], result['inserted'], result['updated'], result['error_count']), (5, 1, 1, 3)
+        )
+        self.assertEqual(self._errors(result), [
+            (4, 'Precio inválido: abc'),
+            (5, 'Registro duplicado en el archivo (primera aparición en la línea 2)'),
+            (6, 'Marca inexistente: Otra'),
+        ])
+        self.assertEqual(Product.objects.get(sku='NEW-1').name, 'Nuevo')
+        self.assertEqual(Product.objects.get(sku='SKU-0').name, 'Renombrado')
+
+    def test_unparseable_lines(self):
+        result = self._import('products', (
+            '{"sku": "NEW-1", "name": "Nuevo", "price": "5", "brand": "Acme", "category": "Audio"}\n'
+            'no es json\n'
+            '[1, 2]\n'
+        ), file_format='ndjson')
+
+        self.assertEqual((result['inserted'], result['error_count']), (1, 2))
+        self.assertEqual(self._errors(result), [(2, 'JSON inválido'), (3, 'Se esperaba un objeto JSON')])
+
+    def test_stock_errors_and_adjustments(self):
+        result = self._import('stock', (
+            'sku,warehouse,qty\n'
+            'SKU-0,Central,10\n'
+            'SKU-0,Norte,5\n'
+            'SKU-1,Central,3\n'
+            'SKU-0,Sur,7\n'
+            f'SKU-1,{self.north_lima.pk},6\n'
+            'SKU-0,Sur,8\n'
+        ))
+
+        self.assertEqual(
+            (result['total'], result['inserted'], result['updated'], result['error_count']), (6, 1, 1, 3)
+        )
+        self.assertEqual(self._errors(result), [
+            (3, 'Nombre de bodega ambiguo, use el id: Norte'),
+            (4, 'La cantidad es menor que lo ya reservado: 3'),
+            (7, 'Registro duplicado en el archivo (primera aparición en la línea 5)'),
+        ])
+        # La línea sin cambios (SKU-0 en Central) no registra movimiento
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list('kind', 'product__sku', 'warehouse_id', 'qty_delta')),
+            sorted([
+                ('ADJUSTMENT', 'SKU-0', self.south.pk, 7),
+                ('ADJUSTMENT', 'SKU-1', self.north_lima.pk, 4),
+            ])
+        )
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     BrandViewSet, CategoryViewSet, ProductViewSet, 
-    WarehouseViewSet, StockViewSet, CustomerViewSet,
-    OrderViewSet, OrderItemViewSet, PaymentViewSet
+    WarehouseViewSet, StockViewSet, StockMovementViewSet, CustomerViewSet,
+    OrderViewSet, OrderConfirmationViewSet, OrderItemViewSet, PaymentViewSet, ReportViewSet
 )
 
 # Crear router para las APIs
@@ -13,11 +14,29 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'warehouses', WarehouseViewSet)
 router.register(r'stocks', StockViewSet)
+router.register(r'stock-movements', StockMovementViewSet)
 router.register(r'customers', CustomerViewSet)
 router.register(r'orders', OrderViewSet)
+router.register(r'order-confirmations', OrderConfirmationViewSet)
 router.register(r'order-items', OrderItemViewSet)
 router.register(r'payments', PaymentViewSet)
+router.register(r'reports', ReportViewSet, basename='reports')
+
+# Caminos de lectura async para ASGI (ver async_views.py)
+async_urlpatterns = [
+    path('reports/<str:name>/', async_views.report, name='async-report'),
+]
+for resource in async_views.RESOURCES:
+    async_urlpatterns += [
+        path(f'{resource}/', async_views.resource_list, {'resource': resource},
+             name=f'async-{resource}-list'),
+        path(f'{resource}/get_related/', async_views.get_related, {'resource': resource},
+             name=f'async-{resource}-get-related'),
+        path(f'{resource}/<uuid:pk>/', async_views.resource_detail, {'resource': resource},
+             name=f'async-{resource}-detail'),
+    ]
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
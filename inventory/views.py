@@ -1,31 +1,176 @@
-from django.db.models import Q, F, Count, Sum, Prefetch
+from decimal import Decimal
+from django.db.models import Q, F, Count, Sum, Prefetch, OuterRef, Subquery, DecimalField
+from django.db.models.functions import Coalesce, Greatest
 from django.apps import apps
-from rest_framework import viewsets, status
+from django.contrib.postgres.search import TrigramSimilarity
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.serializers import ValidationError
+from rest_framework.reverse import reverse
 import logging
 
 from .models import (
     Brand, Category, Product, Warehouse, 
-    Stock, Customer, Order, OrderItem, Payment
+    Stock, StockMovement, Customer, Order, OrderConfirmation, OrderItem, Payment, ProductStockSummary
 )
 from .serializers import (
     BrandSerializer, CategorySerializer, ProductSerializer, 
-    WarehouseSerializer, StockSerializer, CustomerSerializer,
-    OrderSerializer, OrderCreateSerializer, OrderItemSerializer, 
+    WarehouseSerializer, StockSerializer, StockMovementSerializer, CustomerSerializer,
+    OrderSerializer, OrderConfirmationSerializer, OrderCreateSerializer, OrderItemSerializer, 
     PaymentSerializer
 )
+from .query_plans import RELATION_ATTRS, parse_query_shape, plan_cache
+from .metrics import registry
+from .pagination import CreatedAtCursorPagination, LowStockCursorPagination, UpdatedAtCursorPagination
+from .streaming import DEFAULT_CHUNK_SIZE, get_stream_format, stream_queryset
+from .imports import IMPORT_FORMATS, get_import_format, import_catalog
+from .cache import (
+    CONDITIONAL_GET_ENABLED, REPORT_CACHE_CONTROL, cached_report, get_cached_response,
+    get_last_modified, get_versions, response_etag, store_response
+)
+from .confirmations import enqueue_confirmation
+from .db_routers import consistent_reads
+from .payments import confirm_payments
+from .ledger import get_availability, with_positions
+from .reports import REPORT_TABLES, build_report
+from .reservations import (
+    confirm_order, OrderNotPendingError, InsufficientStockError
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _subquery_count(queryset, outer_field):
+    """Conteo correlacionado por fila, independiente de los JOINs del queryset externo"""
+    counts = queryset.filter(**{outer_field: OuterRef('pk')}).order_by().values(outer_field)
+    return Coalesce(Subquery(counts.annotate(total=Count('pk')).values('total')), 0)
+
+
+def _subquery_sum(queryset, outer_field, field):
+    """Suma correlacionada por fila, independiente de los JOINs del queryset externo"""
+    sums = queryset.filter(**{outer_field: OuterRef('pk')}).order_by().values(outer_field)
+    return Coalesce(
+        Subquery(sums.annotate(total=Sum(field)).values('total')),
+        Decimal('0.00'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+class ConditionalGetMixin:
+    """
+    GET condicional para list y retrieve. El ETag y Last-Modified salen de
+    las versiones de las tablas que lee el endpoint (cache_tables), que se
+    incrementan con cada escritura. Si el cliente ya tiene esa versión se
+    responde 304, y si no, el cuerpo cacheado por versión y URL; en ambos
+    casos sin consultar la base de datos. Desactivado (respuesta normal) si
+    CONDITIONAL_GET_ENABLED es falso.
+    """
+    
+    cache_tables = ()
+    
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().list, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().retrieve, *args, **kwargs)
+    
+    def _conditional_response(self, request, handler, *args, **kwargs):
+        if not CONDITIONAL_GET_ENABLED:
+            return handler(request, *args, **kwargs)
+        
+        etag = response_etag(
+            self.basename, self.action, get_versions(self.cache_tables),
+            request.build_absolute_uri(), request.accepted_renderer.format
+        )
+        last_modified = get_last_modified(self.cache_tables)
+        
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = get_cached_response(etag)
+            if data is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+            else:
+                with consistent_reads(last_modified):
+                    response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                store_response(etag, response.data)
+                response['X-Cache'] = 'MISS'
+        
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # El cliente puede guardar la respuesta pero debe revalidarla en cada uso
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
 class BaseRelatedViewSet(viewsets.ModelViewSet):
     """
     ViewSet base que implementa el método get_related genérico
     para hacer JOINs parametrizables entre modelos
     """
     
+    # Filas por bloque al responder en streaming (?stream=json|ndjson)
+    stream_chunk_size = DEFAULT_CHUNK_SIZE
+    # Atributo del que get_related lee cada campo proyectado del modelo principal
+    related_field_sources = {}
+    
+    def _unpaginated_response(self, request, queryset, serializer_class):
+        """Respuesta completa, o en streaming si se solicita, para acciones sin paginar"""
+        stream_format = get_stream_format(request)
+        if stream_format:
+            return stream_queryset(
+                queryset,
+                lambda objs: serializer_class(objs, many=True).data,
+                stream_format,
+                self.stream_chunk_size
+            )
+        
+        serializer = serializer_class(queryset, many=True)
+        return Response(serializer.data)
+    
+    def _import_response(self, request, kind):
+        """
+        Importa el archivo subido en el campo 'file' (CSV o NDJSON) y reporta
+        las líneas insertadas, actualizadas y rechazadas con su motivo
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': "Se requiere un archivo en el campo 'file'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        file_format = get_import_format(upload.name, request.data.get('file_format'))
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f'Formato no soportado: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = import_catalog(kind, upload, file_format=file_format)
+        
+        if not result['error_count']:
+            response_status = status.HTTP_200_OK
+        elif result['inserted'] or result['updated']:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        
+        return Response(result, status=response_status)
+    
     @action(detail=False, methods=['get'])
     def get_related(self, request):
         """
@@ -37,49 +182,63 @@ class BaseRelatedViewSet(viewsets.ModelViewSet):
         - filter[modelo]: filtros por modelo (ej: filter[brand]=name__icontains=Samsung)
         - ordering: ordenamiento (ej: ordering=name,-created_at)
         - distinct: eliminar duplicados (ej: distinct=true)
-        - limit: limitar resultados (ej: limit=10)
+        - limit: limitar resultados (ej: limit=10); sin limit, los ViewSets con
+          paginación por cursor responden por páginas (cursor, page_size)
+        - stream: responder en streaming como arreglo JSON o NDJSON (ej: stream=ndjson)
         """
         
         try:
-            # Obtener queryset base
-            queryset = self.get_queryset()
-            
-            # Aplicar JOINs (select_related y prefetch_related)
-            join_param = request.query_params.get('join', '')
-            if join_param:
-                queryset = self._apply_joins(queryset, join_param)
+            # Obtener el plan compilado para la forma de la consulta
+            shape, filter_values = parse_query_shape(request.query_params)
+            plan = plan_cache.get_plan(self.serializer_class.Meta.model, shape)
             
-            # Aplicar filtros por modelo
-            queryset = self._apply_filters(queryset, request.query_params)
+            # Aplicar JOINs, filtros, ordenamiento y distinct del plan
+            queryset = plan.apply(self.get_queryset(), filter_values)
             
-            # Aplicar ordenamiento
-            ordering_param = request.query_params.get('ordering', '')
-            if ordering_param:
-                ordering_fields = [field.strip() for field in ordering_param.split(',')]
-                queryset = queryset.order_by(*ordering_fields)
-            
-            # Aplicar distinct si se solicita
-            if request.query_params.get('distinct', '').lower() == 'true':
-                queryset = queryset.distinct()
-            
-            # Aplicar limit si se solicita
+            # Aplicar limit si se solicita; si no, paginar por cursor cuando el ViewSet lo usa
+            paginator = None
             limit_param = request.query_params.get('limit', '')
             if limit_param and limit_param.isdigit():
                 queryset = queryset[:int(limit_param)]
+            else:
+                paginator = self._get_related_paginator(request, plan)
             
             # Log del SQL generado para debugging
-            logger.debug(f"SQL Query: {str(queryset.query)}")
+            sql_query = str(queryset.query)
+            logger.debug("SQL Query: %s", sql_query)
+            
+            # En streaming no se materializa la lista completa de resultados
+            stream_format = get_stream_format(request)
+            if stream_format:
+                return stream_queryset(
+                    queryset,
+                    lambda objs: self._serialize_related_data(objs, plan.fields),
+                    stream_format,
+                    self.stream_chunk_size
+                )
+            
+            if paginator is not None:
+                if plan.only is not None:
+                    # El cursor se calcula con las columnas de ordenamiento
+                    cursor_fields = [field.lstrip('-') for field in paginator.ordering]
+                    queryset = queryset.only(*plan.only, *cursor_fields)
+                queryset = paginator.paginate_queryset(queryset, request, view=self)
             
             # Serializar resultados
-            serialized_data = self._serialize_related_data(
-                queryset, request.query_params
-            )
+            serialized_data = self._serialize_related_data(queryset, plan.fields)
             
-            return Response({
+            response_data = {
                 'count': len(serialized_data),
                 'results': serialized_data,
-                'sql_query': str(queryset.query)  # Para comparación con función SQL
-            })
+                'sql_query': sql_query  # Para comparación con función SQL
+            }
+            if paginator is not None:
+                response_data = {
+                    'next': paginator.get_next_link(),
+                    'previous': paginator.get_previous_link(),
+                    **response_data
+                }
+            return Response(response_data)
             
         except Exception as e:
             return Response(
@@ -87,164 +246,18 @@ class BaseRelatedViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
-    def _apply_joins(self, queryset, join_param):
-        """Aplica JOINs usando select_related y prefetch_related"""
-        joins = [join.strip() for join in join_param.split(',')]
-        select_related_fields = []
-        prefetch_related_fields = []
-        
-        for join in joins:
-            if join:
-                # Determinar si es una relación ForeignKey/OneToOne o ManyToMany/reverse FK
-                if self._is_select_related_field(join):
-                    select_related_fields.append(join)
-                else:
-                    prefetch_related_fields.append(join)
-        
-        if select_related_fields:
-            queryset = queryset.select_related(*select_related_fields)
-        
-        if prefetch_related_fields:
-            queryset = queryset.prefetch_related(*prefetch_related_fields)
-        
-        return queryset
-    
-    def _is_select_related_field(self, field_path):
-        """Determina si un campo debe usar select_related o prefetch_related"""
-        model = self.serializer_class.Meta.model
-        parts = field_path.split('__')
-        current_model = model
-        
-        for part in parts:
-            try:
-                field = current_model._meta.get_field(part)
-                if hasattr(field, 'related_model'):
-                    if field.many_to_many or field.one_to_many:
-                        return False  # Usar prefetch_related
-                    current_model = field.related_model
-                else:
-                    return True  # Campo normal, usar select_related
-            except:
-                return False
-        
-        return True
-    
-    def _apply_filters(self, queryset, query_params):
-        """Aplica filtros por modelo usando el patrón filter[modelo]=campo=valor"""
-        for param_name, param_value in query_params.items():
-            if param_name.startswith('filter[') and param_name.endswith(']'):
-                # Extraer modelo del parámetro filter[modelo]
-                model_name = param_name[7:-1]  # Quitar 'filter[' y ']'
-                
-                # Parsear filtros: campo__lookup=valor,campo2=valor2
-                filters = param_value.split(',')
-                for filter_expr in filters:
-                    if '=' in filter_expr:
-                        field_lookup, value = filter_expr.split('=', 1)
-                        
-                        # Construir el filtro con prefijo del modelo si es necesario
-                        if model_name.lower() != self.serializer_class.Meta.model.__name__.lower():
-                            # Filtro para modelo relacionado
-                            filter_key = f"{self._get_relation_path(model_name)}__{field_lookup}"
-                        else:
-                            # Filtro para modelo principal
-                            filter_key = field_lookup
-                        
-                        # Convertir valores booleanos y numéricos
-                        converted_value = self._convert_filter_value(value)
-                        
-                        # Aplicar filtro
-                        filter_kwargs = {filter_key: converted_value}
-                        queryset = queryset.filter(**filter_kwargs)
-        
-        return queryset
-    
-    def _get_relation_path(self, model_name):
-        """Obtiene el path de relación para un modelo dado basado en el modelo actual"""
-        current_model = self.serializer_class.Meta.model.__name__.lower()
-        target_model = model_name.lower()
-        
-        # Mapeo dinámico basado en el modelo actual
-        relation_paths = {
-            # Desde Product
-            'product': {
-                'brand': 'brand',
-                'category': 'category',
-                'warehouse': 'stocks__warehouse',
-                'stock': 'stocks',
-                'customer': 'order_items__order__customer',
-                'order': 'order_items__order',
-                'orderitem': 'order_items',
-                'payment': 'order_items__order__payment'
-            },
-            # Desde Brand
-            'brand': {
-                'product': 'products',
-                'customer': 'products__order_items__order__customer',
-                'order': 'products__order_items__order',
-                'warehouse': 'products__stocks__warehouse'
-            },
-            # Desde Customer
-            'customer': {
-                'order': 'orders',
-                'product': 'orders__items__product',
-                'brand': 'orders__items__product__brand',
-                'payment': 'orders__payment'
-            },
-            # Desde Order
-            'order': {
-                'customer': 'customer',
-                'product': 'items__product',
-                'brand': 'items__product__brand',
-                'orderitem': 'items',
-                'payment': 'payment'
-            },
-            # Desde Stock
-            'stock': {
-                'product': 'product',
-                'warehouse': 'warehouse',
-                'brand': 'product__brand',
-                'category': 'product__category'
-            },
-            # Desde Warehouse
-            'warehouse': {
-                'product': 'stocks__product',
-                'stock': 'stocks',
-                'brand': 'stocks__product__brand'
-            },
-            # Desde Payment
-            'payment': {
-                'order': 'order',
-                'customer': 'order__customer',
-                'product': 'order__items__product'
-            }
-        }
-        
-        # Obtener el mapeo para el modelo actual
-        current_paths = relation_paths.get(current_model, {})
-        return current_paths.get(target_model, target_model)
-    
-    def _convert_filter_value(self, value):
-        """Convierte valores de filtro a tipos apropiados"""
-        if value.lower() == 'true':
-            return True
-        elif value.lower() == 'false':
-            return False
-        elif value.isdigit():
-            return int(value)
-        else:
-            return value
+    def _get_related_paginator(self, request, plan):
+        """
+        Paginador por cursor para get_related, si el ViewSet lo usa.
+        Un ordering explícito no es compatible con el cursor y mantiene
+        el comportamiento sin paginar.
+        """
+        if isinstance(self.paginator, CursorPagination) and not plan.ordering:
+            return self.paginator
+        return None
     
-    def _serialize_related_data(self, queryset, query_params):
+    def _serialize_related_data(self, queryset, model_fields):
         """Serializa los datos aplicando campos específicos por modelo"""
-        # Obtener campos específicos por modelo
-        model_fields = {}
-        for param_name, param_value in query_params.items():
-            if param_name.startswith('fields[') and param_name.endswith(']'):
-                model_name = param_name[7:-1]
-                fields = [field.strip() for field in param_value.split(',')]
-                model_fields[model_name.lower()] = fields
-        
         # Si no se especifican campos personalizados, usar serializer por defecto
         if not model_fields:
             serializer = self.get_serializer(queryset, many=True)
@@ -252,6 +265,7 @@ class BaseRelatedViewSet(viewsets.ModelViewSet):
         
         # Serialización personalizada con campos específicos
         results = []
+        serializer = self.get_serializer()
         for obj in queryset:
             obj_data = {}
             
@@ -260,11 +274,11 @@ class BaseRelatedViewSet(viewsets.ModelViewSet):
             if main_model_name in model_fields:
                 for field_name in model_fields[main_model_name]:
                     if hasattr(obj, field_name):
-                        obj_data[field_name] = getattr(obj, field_name)
+                        source = self.related_field_sources.get(field_name, field_name)
+                        obj_data[field_name] = getattr(obj, source)
             else:
                 # Usar serializer por defecto para modelo principal
-                serializer = self.get_serializer(obj)
-                obj_data.update(serializer.data)
+                obj_data.update(serializer.to_representation(obj))
             
             # Campos de modelos relacionados
             for model_name, fields in model_fields.items():
@@ -280,20 +294,7 @@ class BaseRelatedViewSet(viewsets.ModelViewSet):
     def _get_related_fields(self, obj, model_name, fields):
         """Obtiene campos específicos de modelos relacionados"""
         try:
-            # Mapeo de nombres de modelo a atributos de relación
-            relation_map = {
-                'brand': 'brand',
-                'category': 'category',
-                'warehouse': 'warehouse', 
-                'product': 'product',
-                'customer': 'customer',
-                'order': 'order',
-                'payment': 'payment',
-                'stocks': 'stocks',
-                'items': 'items'
-            }
-            
-            relation_attr = relation_map.get(model_name)
+            relation_attr = RELATION_ATTRS.get(model_name)
             if not relation_attr or not hasattr(obj, relation_attr):
                 return None
             
@@ -324,95 +325,269 @@ class BaseRelatedViewSet(viewsets.ModelViewSet):
             return None
 
 
-class BrandViewSet(BaseRelatedViewSet):
+class BrandViewSet(ConditionalGetMixin, BaseRelatedViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    cache_tables = ('inventory_brand', 'inventory_product')
+    
+    def get_queryset(self):
+        return super().get_queryset().annotate(
+            products_count=_subquery_count(Product.objects.filter(is_active=True), 'brand')
+        )
     
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
         """Obtiene todos los productos de una marca"""
         brand = self.get_object()
-        products = brand.products.filter(is_active=True)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        products = brand.products.filter(is_active=True).select_related(
+            'brand', 'category', 'stock_summary'
+        )
+        return self._unpaginated_response(request, products, ProductSerializer)
 
 
-class CategoryViewSet(BaseRelatedViewSet):
+class CategoryViewSet(ConditionalGetMixin, BaseRelatedViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_tables = ('inventory_category', 'inventory_product')
+    
+    def get_queryset(self):
+        return super().get_queryset().annotate(
+            products_count=_subquery_count(Product.objects.filter(is_active=True), 'category')
+        )
     
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
         """Obtiene todos los productos de una categoría"""
         category = self.get_object()
-        products = category.products.filter(is_active=True)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        products = category.products.filter(is_active=True).select_related(
+            'brand', 'category', 'stock_summary'
+        )
+        return self._unpaginated_response(request, products, ProductSerializer)
 
 
-class ProductViewSet(BaseRelatedViewSet):
-    queryset = Product.objects.select_related('brand', 'category').prefetch_related('stocks__warehouse')
+class ProductViewSet(ConditionalGetMixin, BaseRelatedViewSet):
+    queryset = Product.objects.select_related('brand', 'category', 'stock_summary')
     serializer_class = ProductSerializer
+    cache_tables = (
+        'inventory_product', 'inventory_brand', 'inventory_category', 'inventory_stock', 'inventory_stockmovement'
+    )
     
     @action(detail=True, methods=['get'])
     def stock(self, request, pk=None):
         """Obtiene el stock de un producto en todas las bodegas"""
         product = self.get_object()
-        stocks = product.stocks.select_related('warehouse')
-        serializer = StockSerializer(stocks, many=True)
-        return Response(serializer.data)
+        stocks = with_positions(product.stocks.select_related('warehouse'))
+        return self._unpaginated_response(request, stocks, StockSerializer)
+    
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """
+        Disponibilidad del producto por bodega calculada desde el libro de
+        movimientos: foto compactada más movimientos pendientes
+        
+        Parámetros: at (fecha ISO 8601) para la disponibilidad en ese momento
+        """
+        at = None
+        if request.query_params.get('at'):
+            try:
+                at = parse_datetime(request.query_params['at'])
+            except ValueError:
+                at = None
+            if at is None:
+                return Response(
+                    {'error': 'at debe ser una fecha ISO 8601'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+        
+        return Response(get_availability(self.get_object(), at))
     
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        """Obtiene productos con stock bajo"""
-        threshold = int(request.query_params.get('threshold', 10))
-        products = Product.objects.annotate(
-            total_stock=Sum('stocks__qty')
-        ).filter(
-            total_stock__lt=threshold,
-            is_active=True
-        ).select_related('brand', 'category')
+        """
+        Productos con stock total bajo el umbral, leídos del resumen de stock
+        
+        Parámetros: threshold (por defecto 10); paginado por cursor de menor a mayor stock
+        """
+        try:
+            threshold = int(request.query_params.get('threshold', 10))
+        except ValueError:
+            return Response(
+                {'error': 'threshold debe ser un entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        summaries = ProductStockSummary.objects.filter(
+            total_qty__lt=threshold,
+            product__is_active=True
+        ).select_related('product__brand', 'product__category')
+        serializer_class = self.get_serializer_class()
+        
+        def serialize(rows):
+            products = []
+            for summary in rows:
+                summary.product.total_stock = summary.total_qty
+                products.append(summary.product)
+            return serializer_class(products, many=True).data
+        
+        stream_format = get_stream_format(request)
+        if stream_format:
+            return stream_queryset(
+                summaries.order_by(*LowStockCursorPagination.ordering),
+                serialize,
+                stream_format,
+                self.stream_chunk_size
+            )
+        
+        paginator = LowStockCursorPagination()
+        page = paginator.paginate_queryset(summaries, request, view=self)
+        return paginator.get_paginated_response(serialize(page))
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Busca productos por subcadena en nombre o SKU (índices de trigramas)
+        y los ordena por similitud con el texto buscado
+        
+        Parámetros: q (texto a buscar), limit (por defecto 20, máximo 100)
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': "El parámetro 'q' es obligatorio"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            return Response(
+                {'error': 'limit debe ser un entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        products = list(
+            self.get_queryset().filter(
+                Q(name__icontains=query) | Q(sku__icontains=query)
+            ).annotate(
+                similarity=Greatest(
+                    TrigramSimilarity('name', query),
+                    TrigramSimilarity('sku', query)
+                )
+            ).order_by('-similarity', 'name')[:limit]
+        )
         
         serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        results = [
+            dict(row, similarity=round(product.similarity, 3))
+            for row, product in zip(serializer.data, products)
+        ]
+        return Response({'count': len(results), 'results': results})
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """Importa productos desde CSV/NDJSON (upsert por SKU)"""
+        return self._import_response(request, 'products')
 
 
-class WarehouseViewSet(BaseRelatedViewSet):
+class WarehouseViewSet(ConditionalGetMixin, BaseRelatedViewSet):
     queryset = Warehouse.objects.all()
     serializer_class = WarehouseSerializer
+    cache_tables = ('inventory_warehouse', 'inventory_stock', 'inventory_stockmovement')
+    
+    def get_queryset(self):
+        stocked = with_positions(Stock.objects.all()).filter(position_qty__gt=0)
+        return super().get_queryset().annotate(
+            total_products=_subquery_count(stocked, 'warehouse')
+        )
     
     @action(detail=True, methods=['get'])
     def stock(self, request, pk=None):
         """Obtiene todo el stock de una bodega"""
         warehouse = self.get_object()
-        stocks = warehouse.stocks.select_related('product__brand', 'product__category')
-        serializer = StockSerializer(stocks, many=True)
-        return Response(serializer.data)
+        stocks = with_positions(warehouse.stocks.select_related('product__brand', 'product__category'))
+        return self._unpaginated_response(request, stocks, StockSerializer)
 
 
 class StockViewSet(BaseRelatedViewSet):
     queryset = Stock.objects.select_related('product__brand', 'product__category', 'warehouse')
     serializer_class = StockSerializer
+    pagination_class = UpdatedAtCursorPagination
+    
+    # get_related con fields[stock] también muestra la posición actual
+    related_field_sources = {'qty': 'position_qty', 'reserved': 'position_reserved'}
+    
+    def get_queryset(self):
+        # Posición actual: la foto más los movimientos aún no compactados
+        return with_positions(super().get_queryset())
     
     @action(detail=False, methods=['get'])
     def available(self, request):
         """Obtiene stock disponible (no reservado)"""
-        stocks = self.get_queryset().filter(qty__gt=F('reserved'))
-        serializer = self.get_serializer(stocks, many=True)
-        return Response(serializer.data)
+        stocks = self.get_queryset().filter(position_qty__gt=F('position_reserved'))
+        return self._unpaginated_response(request, stocks, self.get_serializer_class())
+    
+    def _ledger_only(self, request, *args, **kwargs):
+        # La foto solo cambia al compactar el libro de movimientos
+        raise MethodNotAllowed(
+            request.method,
+            detail='El stock se modifica registrando movimientos en /stock-movements/'
+        )
+    
+    create = update = partial_update = destroy = _ledger_only
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """Importa existencias desde CSV/NDJSON (ajustes contra la posición de cada producto y bodega)"""
+        return self._import_response(request, 'stock')
+
+
+class StockMovementViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Libro de movimientos de stock: solo se agregan movimientos (recepciones,
+    liberaciones, despachos y ajustes); las reservas las registra la
+    confirmación de órdenes.
+    
+    Filtros: product, warehouse, kind, order
+    """
+    queryset = StockMovement.objects.select_related('product', 'warehouse')
+    serializer_class = StockMovementSerializer
+    pagination_class = CreatedAtCursorPagination
+    filter_fields = ('product', 'warehouse', 'kind', 'order')
+    
+    def get_queryset(self):
+        filters = {}
+        for field in self.filter_fields:
+            value = self.request.query_params.get(field)
+            if not value:
+                continue
+            try:
+                filters[field] = StockMovement._meta.get_field(field).to_python(value)
+            except DjangoValidationError:
+                raise ValidationError({field: 'Valor inválido'})
+        return super().get_queryset().filter(**filters)
 
 
 class CustomerViewSet(BaseRelatedViewSet):
-    queryset = Customer.objects.prefetch_related('orders__items__product')
+    queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     
+    def get_queryset(self):
+        return super().get_queryset().annotate(
+            orders_count=_subquery_count(Order.objects.all(), 'customer'),
+            total_spent=_subquery_sum(
+                Payment.objects.filter(status='CONFIRMED'), 'order__customer', 'amount'
+            )
+        )
+    
     @action(detail=True, methods=['get'])
     def orders(self, request, pk=None):
         """Obtiene todas las órdenes de un cliente"""
         customer = self.get_object()
         orders = customer.orders.prefetch_related('items__product')
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        return self._unpaginated_response(request, orders, OrderSerializer)
 
 
 class OrderViewSet(BaseRelatedViewSet):
@@ -422,15 +597,83 @@ class OrderViewSet(BaseRelatedViewSet):
         'payment'
     )
     serializer_class = OrderSerializer
+    pagination_class = CreatedAtCursorPagination
+    
+    # Máximo de órdenes aceptadas por petición en /orders/bulk/
+    bulk_max_orders = 500
     
     def get_serializer_class(self):
-        if self.action == 'create':
+        if self.action in ('create', 'bulk'):
             return OrderCreateSerializer
         return OrderSerializer
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Crea varias órdenes en una sola petición.
+        Las órdenes válidas se insertan en bloque y los errores se reportan
+        por índice sin afectar al resto del lote.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {'error': 'Se esperaba una lista de órdenes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(request.data) > self.bulk_max_orders:
+            return Response(
+                {'error': f'Máximo {self.bulk_max_orders} órdenes por petición'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Clientes, productos y disponible de todo el lote, compartidos entre órdenes
+        context = self.get_serializer_context()
+        OrderCreateSerializer.prefetch(request.data, context)
+        
+        valid_indexes = []
+        valid_data = []
+        errors = []
+        for index, order_data in enumerate(request.data):
+            serializer = self.get_serializer(data=order_data, context=context)
+            if serializer.is_valid():
+                valid_indexes.append(index)
+                valid_data.append(serializer.validated_data)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        
+        orders = OrderCreateSerializer.bulk_insert(valid_data) if valid_data else []
+        created = [
+            {
+                'index': index,
+                'id': order.id,
+                'total_amount': order.total_amount,
+                'total_items': order.total_items
+            }
+            for index, order in zip(valid_indexes, orders)
+        ]
+        
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        
+        return Response({'created': created, 'errors': errors}, status=response_status)
+    
+    def _confirm_async(self, request):
+        prefer = request.headers.get('Prefer', '')
+        return settings.ORDER_CONFIRMATION_ASYNC or 'respond-async' in prefer.lower()
+    
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
-        """Confirma una orden y reserva el stock"""
+        """
+        Confirma una orden y reserva el stock
+        
+        En modo asíncrono (ORDER_CONFIRMATION_ASYNC o cabecera Prefer:
+        respond-async) encola la confirmación y responde 202 con la
+        solicitud, consultable en /order-confirmations/{id}/
+        """
         order = self.get_object()
         
         if order.status != 'PENDING':
@@ -439,54 +682,54 @@ class OrderViewSet(BaseRelatedViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Verificar y reservar stock
-        try:
-            for item in order.items.all():
-                # Buscar stock disponible
-                available_stocks = Stock.objects.filter(
-                    product=item.product,
-                    qty__gt=F('reserved')
-                ).order_by('-qty')
-                
-                remaining_qty = item.qty
-                for stock in available_stocks:
-                    if remaining_qty <= 0:
-                        break
-                    
-                    available = stock.qty - stock.reserved
-                    to_reserve = min(available, remaining_qty)
-                    
-                    stock.reserved += to_reserve
-                    stock.save()
-                    
-                    remaining_qty -= to_reserve
-                
-                if remaining_qty > 0:
-                    raise ValidationError(
-                        f"Stock insuficiente para {item.product.name}. Faltantes: {remaining_qty}"
-                    )
-            
-            order.status = 'CONFIRMED'
-            order.save()
-            
-            serializer = self.get_serializer(order)
-            return Response(serializer.data)
+        if self._confirm_async(request):
+            try:
+                confirmation = enqueue_confirmation(order)
+            except OrderNotPendingError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
-        except Exception as e:
+            response = Response(
+                OrderConfirmationSerializer(confirmation).data,
+                status=status.HTTP_202_ACCEPTED
+            )
+            response['Location'] = reverse(
+                'orderconfirmation-detail', args=[confirmation.pk], request=request
+            )
+            return response
+        
+        # Verificar y reservar stock en una sola transacción
+        try:
+            confirm_order(order)
+        except (OrderNotPendingError, InsufficientStockError) as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        serializer = self.get_serializer(order)
+        return Response(serializer.data)
+
+
+class OrderConfirmationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Estado de las confirmaciones asíncronas de órdenes"""
+    queryset = OrderConfirmation.objects.select_related('order')
+    serializer_class = OrderConfirmationSerializer
+    pagination_class = CreatedAtCursorPagination
 
 
 class OrderItemViewSet(BaseRelatedViewSet):
     queryset = OrderItem.objects.select_related('order__customer', 'product__brand', 'product__category')
     serializer_class = OrderItemSerializer
+    pagination_class = CreatedAtCursorPagination
 
 
 class PaymentViewSet(BaseRelatedViewSet):
     queryset = Payment.objects.select_related('order__customer')
     serializer_class = PaymentSerializer
+    pagination_class = CreatedAtCursorPagination
+    
+    # Máximo de ids aceptados por petición en /payments/confirm-bulk/
+    bulk_max_payments = 10000
     
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
@@ -503,4 +746,102 @@ class PaymentViewSet(BaseRelatedViewSet):
         payment.save()
         
         serializer = self.get_serializer(payment)
-        return Response(serializer.data) 
\ No newline at end of file
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], url_path='confirm-bulk')
+    def confirm_bulk(self, request):
+        """
+        Confirma en una sola sentencia los pagos pendientes de una lista de ids
+        
+        Body: {"ids": [...]} o la lista directamente. Responde el resultado de
+        cada id: confirmed, not_pending (con su estado), not_found o invalid_id
+        """
+        ids = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {'error': 'Se esperaba una lista de ids de pagos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(ids) > self.bulk_max_payments:
+            return Response(
+                {'error': f'Máximo {self.bulk_max_payments} pagos por petición'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = confirm_payments(ids)
+        return Response({
+            'confirmed': sum(1 for result in results if result['outcome'] == 'confirmed'),
+            'results': results,
+        })
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """
+    Reportes de solo lectura sobre las funciones SQL y tablas de resumen.
+    
+    Cada respuesta se cachea por reporte y parámetros normalizados; las
+    escrituras en las tablas que lee el reporte la invalidan y, vencida o
+    invalidada, se sirve la copia anterior mientras se recalcula (X-Cache:
+    HIT, STALE o MISS).
+    """
+    
+    def _report_response(self, request, name):
+        try:
+            params, compute = build_report(name, request.query_params)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results, cache_status = cached_report(name, params, REPORT_TABLES[name], compute)
+        response = Response({'count': len(results), 'results': results})
+        response['X-Cache'] = cache_status
+        response['Cache-Control'] = REPORT_CACHE_CONTROL
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def products_by_brand_customer(self, request):
+        """
+        Productos de una marca comprados por un cliente (get_products_by_brand_and_customer)
+        
+        Parámetros: brand y customer_email (requeridos)
+        """
+        return self._report_response(request, 'products_by_brand_customer')
+    
+    @action(detail=False, methods=['get'])
+    def payments_by_product_quantity(self, request):
+        """
+        Pagos confirmados de órdenes con al menos min_quantity unidades de un producto
+        (get_payments_by_product_quantity)
+        
+        Parámetros: sku (requerido) y min_quantity (por defecto 1)
+        """
+        return self._report_response(request, 'payments_by_product_quantity')
+    
+    @action(detail=False, methods=['get'])
+    def stock_analysis(self, request):
+        """
+        Análisis de stock por bodega (get_stock_analysis)
+        
+        Parámetros: warehouse (opcional, búsqueda por nombre) y min_stock (por defecto 0)
+        """
+        return self._report_response(request, 'stock_analysis')
+    
+    @action(detail=False, methods=['get'])
+    def top_selling(self, request):
+        """
+        Top de productos más vendidos en un rango de fechas
+        
+        Parámetros: limit (por defecto 10, máximo 1000), start_date y end_date (YYYY-MM-DD, inclusive)
+        """
+        return self._report_response(request, 'top_selling')
+
+
+def metrics(request):
+    """Métricas por ruta en formato de texto Prometheus, solo para IPs locales"""
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        return HttpResponseForbidden()
+    
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -2,6 +2,7 @@
 Django settings for inventory_system project.
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -30,6 +31,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
 
 ]
@@ -47,6 +49,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'inventory.middleware.QueryInstrumentationMiddleware',
+    'inventory.db_routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -92,6 +96,53 @@ DATABASES = {
     }
 }
 
+# Pool de conexiones de psycopg 3 (psycopg_pool). Los tamaños son por proceso
+# worker: workers x DB_POOL_MAX_SIZE debe quedar por debajo de max_connections.
+# Sin psycopg_pool (o con DB_POOL=0) se usan conexiones persistentes con
+# verificación de salud en lugar de abrir una conexión por petición.
+if os.environ.get('DB_POOL', '1') == '1' and find_spec('psycopg_pool') is not None:
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Segundos máximos esperando una conexión libre antes de fallar
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            # Verifica cada conexión al entregarla y descarta las rotas
+            'check': ConnectionPool.check_connection,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Réplica de solo lectura (streaming replication del primario). Con
+# DB_REPLICA_HOST definido, las lecturas seguras (list/retrieve, get_related,
+# reportes) van a la réplica y las escrituras al primario; ver
+# inventory/db_routers.py. Hereda credenciales y pool del primario.
+REPLICA_DATABASE_ALIAS = 'replica'
+# Margen de retraso de la réplica: tras escribir, el cliente lee del primario
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # En los tests la réplica es la misma base que el primario
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['inventory.db_routers.PrimaryReplicaRouter']
+
+# Confirmación de órdenes por cola (POST /orders/{id}/confirm/ responde 202 y
+# process_order_confirmations las procesa por lotes). Sin activarla, un
+# cliente puede pedirla por petición con la cabecera Prefer: respond-async.
+ORDER_CONFIRMATION_ASYNC = os.environ.get('ORDER_CONFIRMATION_ASYNC', '0') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -183,4 +234,46 @@ LOGGING = {
             'handlers': ['console'],
         }
     }
-} 
\ No newline at end of file
+} 
+# Planes compilados de get_related (LRU por forma de consulta)
+GET_RELATED_PLAN_CACHE_SIZE = 256
+
+# Traducir fields[...] de get_related a .only() / Prefetch proyectados
+GET_RELATED_PROJECTION = True
+
+# Filas por bloque en las respuestas en streaming (?stream=json|ndjson)
+STREAMING_CHUNK_SIZE = 500
+
+# Instrumentación por petición (Server-Timing y /metrics)
+REQUEST_INSTRUMENTATION_ENABLED = True
+N_PLUS_ONE_THRESHOLD = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Caché de reportes (/api/reports/...): LocMem es por proceso; con varios
+# workers use Redis (REDIS_URL, requiere el paquete redis) para compartir
+# las versiones por tabla y las entradas cacheadas
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'inventory-reports',
+        }
+    }
+REPORT_CACHE_FRESH_SECONDS = 60
+REPORT_CACHE_STALE_SECONDS = 600
+
+# GET condicional del catálogo (ConditionalGetMixin): las versiones por tabla
+# deben ser compartidas por todos los workers, así que solo se activa con Redis
+# (CONDITIONAL_GET_ENABLED=1 lo fuerza, p. ej. con un único proceso)
+CONDITIONAL_GET_ENABLED = os.environ.get(
+    'CONDITIONAL_GET_ENABLED', '1' if os.environ.get('REDIS_URL') else '0'
+) == '1'
+# Cuerpos cacheados de list/retrieve del catálogo
+CONDITIONAL_GET_CACHE_SECONDS = 3600
@@ -3,10 +3,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from inventory.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('inventory.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG: